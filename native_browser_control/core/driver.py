@@ -3,25 +3,40 @@ from __future__ import annotations
 import sys
 import time
 import io
+import json
 import re
 import os
 import ctypes
 import subprocess
 import logging
-from dataclasses import dataclass
+import atexit
+import hashlib
+import random
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Any, Optional, Literal, Union, Iterable, List, Callable
 
 from pywinauto import Desktop, Application, mouse
 from pywinauto.keyboard import send_keys
 import win32con
 import win32gui
-import win32ui
 import win32clipboard
 import win32process
-from PIL import Image
+from PIL import Image, ImageStat, features
 import mss
 
+try:
+    import numpy as np
+except ImportError:  # numpy は任意依存（無い場合は純Python実装で同じ判定を行う）
+    np = None
+
 from pywinauto.findwindows import find_windows
+from pywinauto.uia_defines import IUIA, get_elem_interface
+from pywinauto.uia_element_info import UIAElementInfo
+from pywinauto.controls.uiawrapper import UIAWrapper
 
 # ロガーの設定
 # ロガーのフォーマット設定
@@ -86,6 +101,8 @@ BROWSER_CONFIG = {
             "address and search bar",
         ],
         "address_bar_control_types": ["Edit"],
+        "reload_button_title_candidates": ["Reload"],
+        "stop_button_title_candidates": ["Stop"],
     },
     "edge": {
         "title_keywords": ["Edge", "Microsoft Edge"],
@@ -103,6 +120,8 @@ BROWSER_CONFIG = {
             "address and search bar",
         ],
         "address_bar_control_types": ["Edit"],
+        "reload_button_title_candidates": ["Refresh"],
+        "stop_button_title_candidates": ["Stop"],
     },
 }
 
@@ -494,13 +513,7 @@ def connect_browser_by_index(
 
     # NativeBrowserDriverインスタンスを作成し、指定ウィンドウに接続
     driver = object.__new__(NativeBrowserDriver)
-    driver.browser = browser
-    driver._config = BROWSER_CONFIG[browser]
-    driver.current_elements = {}
-    driver.current_elements_info = {}
-    driver.current_elements_truncated = False
-    driver.app = None
-    driver.window = None
+    driver._init_state(browser)
     _enable_dpi_awareness()
     driver.connect(target_window)
 
@@ -534,6 +547,239 @@ def _set_clipboard_text(text: str) -> None:
         win32clipboard.CloseClipboard()
 
 
+def _clipboard_sequence_number() -> int:
+    """クリップボードの更新番号（内容が変わる/空にされるたびに増える。同じ文字列の再コピーでも増える）。"""
+    return int(win32clipboard.GetClipboardSequenceNumber())
+
+
+# 退避/復元の対象にする形式。GetClipboardData は遅延レンダリングの提供元（Office など）に
+# その形式の生成を強いるので、全形式ではなくテキスト・画像と代表的な登録形式だけを読む
+# （CF_TEXT などは CF_UNICODETEXT から、CF_BITMAP などは CF_DIB から OS が合成する）
+_CLIPBOARD_SAVE_FORMATS = (win32con.CF_UNICODETEXT, win32con.CF_DIB)
+_CLIPBOARD_SAVE_REGISTERED_FORMATS = ("HTML Format", "Rich Text Format", "PNG")
+# 退避するデータの合計上限（超える形式は読んだうえで捨てる）
+_CLIPBOARD_SNAPSHOT_MAX_BYTES = 16 * 1024 * 1024
+# 貼り付けの反映を Value で確認できない要素で、Ctrl+V の後にクリップボードを戻すまで待つ秒数
+_PASTE_RESTORE_DELAY_S = 0.5
+
+
+@dataclass
+class ClipboardSnapshot:
+    """退避したクリップボードの内容（形式ID -> データ）。skipped は上限超過で退避しなかった形式。"""
+
+    sequence: int
+    formats: dict[int, Any] = field(default_factory=dict)
+    skipped: list[int] = field(default_factory=list)
+
+
+def _clipboard_data_size(data: Any) -> int:
+    if isinstance(data, str):
+        return len(data) * 2
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    return 0
+
+
+def _save_clipboard(max_bytes: int = _CLIPBOARD_SNAPSHOT_MAX_BYTES) -> Optional[ClipboardSnapshot]:
+    """現在のクリップボードを対象形式だけ、合計 max_bytes まで退避する（開けなければ None）。"""
+    try:
+        sequence = _clipboard_sequence_number()
+        wanted = list(_CLIPBOARD_SAVE_FORMATS)
+        for name in _CLIPBOARD_SAVE_REGISTERED_FORMATS:
+            try:
+                wanted.append(win32clipboard.RegisterClipboardFormat(name))
+            except Exception:
+                pass
+        win32clipboard.OpenClipboard()
+    except Exception as e:
+        logger.debug(f"clipboard_save: failed to open clipboard: {e}")
+        return None
+    snapshot = ClipboardSnapshot(sequence=sequence)
+    total = 0
+    try:
+        for fmt in wanted:
+            if not win32clipboard.IsClipboardFormatAvailable(fmt):
+                continue
+            try:
+                data = win32clipboard.GetClipboardData(fmt)
+            except Exception:
+                continue
+            size = _clipboard_data_size(data)
+            if total + size > max_bytes:
+                snapshot.skipped.append(fmt)
+                continue
+            total += size
+            snapshot.formats[fmt] = data
+    finally:
+        win32clipboard.CloseClipboard()
+    if snapshot.skipped:
+        logger.debug(f"clipboard_save: skipped formats over {max_bytes} bytes: {snapshot.skipped}")
+    return snapshot
+
+
+def _restore_clipboard(snapshot: ClipboardSnapshot) -> bool:
+    """退避した内容をクリップボードに書き戻す（元が空なら空にする）。"""
+    try:
+        win32clipboard.OpenClipboard()
+    except Exception as e:
+        logger.debug(f"clipboard_restore: failed to open clipboard: {e}")
+        return False
+    try:
+        win32clipboard.EmptyClipboard()
+        for fmt, data in snapshot.formats.items():
+            try:
+                win32clipboard.SetClipboardData(fmt, data)
+            except Exception:
+                pass
+        return True
+    finally:
+        win32clipboard.CloseClipboard()
+
+
+class ClipboardTransaction:
+    """
+    ClipboardBroker が払い出す排他区間。区間内の読み書きは他の利用者と混ざらない。
+
+    preserve=True の場合、内容の退避は区間の開始時ではなく、最初に上書きする直前
+    （write_text か before_overwrite の呼び出し時）に1回だけ行う。
+    """
+
+    def __init__(self, owner: str, *, preserve: bool = False):
+        self.owner = owner
+        self.preserve = preserve
+        self.snapshot: Optional[ClipboardSnapshot] = None
+
+    def sequence(self) -> int:
+        return _clipboard_sequence_number()
+
+    def read_text(self) -> ActionResult:
+        return _get_clipboard_text()
+
+    def before_overwrite(self) -> None:
+        """これからクリップボードが上書きされる（Ctrl+C の送信など）ので、必要なら退避しておく。"""
+        if self.preserve:
+            self.preserve = False
+            self.snapshot = _save_clipboard()
+
+    def write_text(self, text: str) -> None:
+        self.before_overwrite()
+        _set_clipboard_text(text)
+
+    def restore(self) -> bool:
+        """退避した内容を書き戻す（以後は区間終了時に重ねて戻さない）。"""
+        self.preserve = False
+        snapshot, self.snapshot = self.snapshot, None
+        return _restore_clipboard(snapshot) if snapshot is not None else False
+
+    def keep(self) -> None:
+        """退避した内容を捨て、区間終了時にも書き戻さない（貼り付けの完了を確認できなかった場合など）。"""
+        self.preserve = False
+        self.snapshot = None
+
+
+class ClipboardBroker:
+    """
+    プロセス内のクリップボード利用を直列化するブローカー。
+
+    transaction() は到着順（FIFO）に排他区間を与え、preserve=True なら最初の上書き前に内容を退避して
+    終了時に復元する。同じスレッドからの入れ子の transaction() は外側の区間（同じ ClipboardTransaction）を返し、
+    復元も外側の終了時にだけ行う。
+    待ち時間や競合回数は stats() で確認できる。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue: deque[object] = deque()
+        self._holder: Optional[int] = None
+        self._depth = 0
+        self._current: Optional[ClipboardTransaction] = None
+        self._stats: dict[str, Any] = {
+            "transactions": 0,
+            "contended": 0,
+            "timeouts": 0,
+            "total_wait_s": 0.0,
+            "max_wait_s": 0.0,
+            "max_queue_length": 0,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_length"] = len(self._queue)
+            stats["held"] = self._holder is not None
+        stats["total_wait_s"] = round(stats["total_wait_s"], 3)
+        stats["max_wait_s"] = round(stats["max_wait_s"], 3)
+        return stats
+
+    def _acquire(self, owner: str, timeout_s: float) -> bool:
+        """排他区間を取得する。入れ子なら False（新規取得ではない）を返す。"""
+        me = threading.get_ident()
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            if self._holder == me:
+                self._depth += 1
+                return False
+            contended = self._holder is not None or bool(self._queue)
+            self._queue.append(ticket)
+            self._stats["max_queue_length"] = max(self._stats["max_queue_length"], len(self._queue))
+            deadline = started + max(0.0, float(timeout_s))
+            while self._holder is not None or self._queue[0] is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self._stats["timeouts"] += 1
+                    self._cond.notify_all()
+                    raise ClipboardError(
+                        f"clipboard_broker: timed out waiting for the clipboard ({owner})",
+                        code="clipboard_busy",
+                        data=self._stats_unlocked(),
+                    )
+                self._cond.wait(remaining)
+            self._queue.popleft()
+            self._holder = me
+            self._depth = 1
+            waited = time.monotonic() - started
+            self._stats["transactions"] += 1
+            self._stats["contended"] += int(contended)
+            self._stats["total_wait_s"] += waited
+            self._stats["max_wait_s"] = max(self._stats["max_wait_s"], waited)
+        if contended:
+            logger.debug(f"clipboard_broker: {owner} waited {waited:.3f}s")
+        return True
+
+    def _stats_unlocked(self) -> dict[str, Any]:
+        return {"queue_length": len(self._queue), "timeouts": self._stats["timeouts"]}
+
+    def _release(self) -> None:
+        with self._cond:
+            self._depth -= 1
+            if self._depth <= 0:
+                self._holder = None
+                self._depth = 0
+                self._cond.notify_all()
+
+    @contextmanager
+    def transaction(self, owner: str = "", *, preserve: bool = False, timeout_s: float = 30.0):
+        outermost = self._acquire(owner, timeout_s)
+        if outermost:
+            self._current = ClipboardTransaction(owner, preserve=preserve)
+        transaction = self._current
+        try:
+            yield transaction
+        finally:
+            try:
+                if outermost:
+                    self._current = None
+                    transaction.restore()
+            finally:
+                self._release()
+
+
+# プロセス内で共有するクリップボードブローカー（複数ドライバ/スレッド間の取り合いを防ぐ）
+clipboard_broker = ClipboardBroker()
+
+
 class NativeBrowserError(Exception):
     code = "native_browser_error"
 
@@ -639,23 +885,191 @@ def _get_clipboard_text() -> ActionResult:
         )
 
 
-def wait_until(
+@dataclass
+class WaitOutcome:
+    """1回の待機の結果とテレメトリ。bool 評価で成否を返す。"""
+
+    label: str
+    ok: bool
+    elapsed_s: float
+    attempts: int
+    wakeups: int = 0
+    errors: int = 0
+    last_error: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "label": self.label,
+            "ok": self.ok,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "attempts": self.attempts,
+            "wakeups": self.wakeups,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+_WAIT_TELEMETRY: deque[WaitOutcome] = deque(maxlen=256)
+
+
+def get_wait_telemetry(label: Optional[str] = None, limit: Optional[int] = None) -> list[dict[str, Any]]:
+    """直近の待機結果（新しい順）。label を指定するとその待機だけに、limit で件数を絞る。"""
+    outcomes = [
+        outcome.as_dict()
+        for outcome in reversed(_WAIT_TELEMETRY)
+        if label is None or outcome.label == label
+    ]
+    return outcomes if limit is None else outcomes[: max(0, int(limit))]
+
+
+class WaitSignal:
+    """
+    待機中のループを外部から即座に起こすための通知口。
+
+    wait_for(wake=...) には wait(timeout_s) -> bool を持つ任意のオブジェクトを渡せる
+    （UIA イベントの購読もこの形で渡す）。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def notify(self) -> None:
+        self._event.set()
+
+    def wait(self, timeout_s: float) -> bool:
+        fired = self._event.wait(max(0.0, timeout_s))
+        self._event.clear()
+        return fired
+
+
+# any_of / all_of の例外の扱い（共通）:
+# 例外を出した条件は不成立として扱い、合成結果が不成立ならその例外を送出する。
+# wait_for は送出された例外を不成立として数え、テレメトリの errors / last_error に残す。
+
+
+def any_of(*predicates: Callable[[], bool]) -> Callable[[], bool]:
+    """いずれかの条件を満たせば True（前から順に評価し、成立で打ち切る）。"""
+
+    def _any() -> bool:
+        error: Optional[Exception] = None
+        for predicate in predicates:
+            try:
+                if predicate():
+                    return True
+            except Exception as e:
+                error = e
+        if error is not None:
+            raise error
+        return False
+
+    return _any
+
+
+def all_of(*predicates: Callable[[], bool]) -> Callable[[], bool]:
+    """すべての条件を満たせば True（前から順に評価し、不成立または例外で打ち切る）。"""
+
+    def _all() -> bool:
+        for predicate in predicates:
+            if not predicate():
+                return False
+        return True
+
+    return _all
+
+
+def wait_for(
     predicate: Callable[[], bool],
     timeout_s: float = 2.0,
     interval_s: float = 0.05,
-) -> bool:
-    """条件を満たすまで待機し、timeout内に満たせなければFalseを返す。"""
+    *,
+    backoff: float = 1.0,
+    max_interval_s: Optional[float] = None,
+    jitter: float = 0.0,
+    wake: Any = None,
+    label: str = "wait",
+    swallow: tuple[type[BaseException], ...] = (Exception,),
+) -> WaitOutcome:
+    """
+    条件を満たすまで待機し、結果とテレメトリを WaitOutcome で返す。
+
+    - 時刻は time.monotonic() 基準（システム時刻の変更に影響されない）
+    - 不成立のたびに間隔を backoff 倍し max_interval_s で頭打ちにする（1.0 なら固定間隔）
+    - jitter（0〜1）で間隔を ±jitter の割合だけ揺らし、複数の待機が同期して叩くのを避ける
+    - wake（wait(timeout_s) -> bool を持つオブジェクト）があれば通知で即座に再評価し、間隔を初期値に戻す
+    - swallow に含まれる例外は不成立として数え、最後の例外をテレメトリに残す
+    """
     timeout_s = max(0.0, float(timeout_s))
     interval_s = max(0.01, float(interval_s))
-    deadline = time.time() + timeout_s
-    while time.time() <= deadline:
+    backoff = max(1.0, float(backoff))
+    if max_interval_s is None:
+        max_interval_s = interval_s * 8 if backoff > 1.0 else interval_s
+    max_interval_s = max(interval_s, float(max_interval_s))
+    jitter = min(1.0, max(0.0, float(jitter)))
+
+    started = time.monotonic()
+    deadline = started + timeout_s
+    interval = interval_s
+    attempts = wakeups = errors = 0
+    last_error: Optional[str] = None
+    ok = False
+    while True:
+        attempts += 1
         try:
             if predicate():
-                return True
-        except Exception:
-            pass
-        time.sleep(interval_s)
-    return False
+                ok = True
+                break
+        except swallow as e:
+            errors += 1
+            last_error = f"{type(e).__name__}: {e}"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        delay = interval
+        if jitter:
+            delay *= random.uniform(1.0 - jitter, 1.0 + jitter)
+        delay = min(remaining, max(0.0, delay))
+        if wake is not None and wake.wait(delay):
+            wakeups += 1
+            interval = interval_s
+        else:
+            if wake is None:
+                time.sleep(delay)
+            interval = min(max_interval_s, interval * backoff)
+
+    outcome = WaitOutcome(
+        label=label,
+        ok=ok,
+        elapsed_s=time.monotonic() - started,
+        attempts=attempts,
+        wakeups=wakeups,
+        errors=errors,
+        last_error=last_error,
+    )
+    _WAIT_TELEMETRY.append(outcome)
+    if not ok:
+        logger.debug(f"wait_for[{label}] timed out: {outcome.as_dict()}")
+    return outcome
+
+
+def wait_until(
+    predicate: Callable[[], bool],
+    timeout_s: float = 2.0,
+    interval_s: float = 0.05,
+    **kwargs: Any,
+) -> bool:
+    """条件を満たすまで待機し、timeout内に満たせなければFalseを返す（wait_for の簡易版）。"""
+    return wait_for(predicate, timeout_s, interval_s, **kwargs).ok
+
+
+def _ack_snapshot(probe: Callable[[], Any]) -> Any:
+    """確認用プローブの値。例外（ウィンドウ消滅など）も「状態」として比較できる形にする。"""
+    try:
+        return probe()
+    except Exception as e:
+        return ("error", type(e).__name__)
 
 
 @dataclass(frozen=True)
@@ -725,73 +1139,837 @@ def _launch_browser_process(config: dict[str, Any]) -> None:
     raise LaunchError("launch_browser_process: no valid browser launch configuration found")
 
 
+def _blank_kind(img: Image.Image, *, sample: int = 128, tolerance: float = 2.0) -> Optional[str]:
+    """
+    画像がほぼ単色なら種類（"black" / "white" / "uniform"）、そうでなければ None を返す。
+
+    縮小平均ではなく最近傍で sample×sample 点を間引いて取り出すので、白地に少しだけ文字がある
+    ページでも文字の画素が分散に残る。統計は ImageStat（C 実装）で計算する。
+    """
+    if max(img.size) > sample:
+        img = img.resize((min(sample, img.width), min(sample, img.height)), Image.NEAREST)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    stat = ImageStat.Stat(img)
+    if sum(stat.var) >= tolerance:
+        return None
+    mean = sum(stat.mean) / len(stat.mean)
+    # GPU 合成に失敗した PrintWindow は真っ黒（まれに真っ白）のフレームを返す
+    if mean <= 8:
+        return "black"
+    if mean >= 247:
+        return "white"
+    return "uniform"
+
+
 def _is_probably_blank(img: Image.Image) -> bool:
+    return _blank_kind(img) is not None
+
+
+@dataclass(frozen=True)
+class ScreenshotRegion:
+    """差分スクリーンショットで変化した領域（ウィンドウ相対座標）と切り出し画像。"""
+
+    left: int
+    top: int
+    right: int
+    bottom: int
+    image: Image.Image
+
+    def as_dict(self) -> dict[str, int]:
+        return {"left": self.left, "top": self.top, "right": self.right, "bottom": self.bottom}
+
+
+@dataclass
+class ScreenshotDelta:
+    """
+    前回のフレームとの差分。
+
+    changed=False なら変化なし（regions は空）。full=True は初回・サイズ変更・変化が大きい場合で、
+    regions にフレーム全体が1つ入る。
+    """
+
+    size: tuple[int, int]
+    changed: bool
+    full: bool
+    regions: list[ScreenshotRegion]
+    changed_tiles: int
+    total_tiles: int
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "size": list(self.size),
+            "changed": self.changed,
+            "full": self.full,
+            "changed_tiles": self.changed_tiles,
+            "total_tiles": self.total_tiles,
+            "regions": [region.as_dict() for region in self.regions],
+        }
+
+
+def _tile_hashes(img: Image.Image, tile: int) -> list[list[bytes]]:
+    """
+    tile×tile ピクセルごとのダイジェスト（[行][列]）。
+
+    タイル単位で連続したバイト列を取り出して1回ずつハッシュする（numpy があれば配列のスライス、
+    無ければ crop().tobytes()）。
+    """
     if img.mode != "RGB":
         img = img.convert("RGB")
-    small = img.resize((64, 64))
-    px = list(small.getdata())
+    width, height = img.size
+    pixels = np.asarray(img) if np is not None else None
+    grid: list[list[bytes]] = []
+    for top in range(0, height, tile):
+        bottom = min(height, top + tile)
+        row: list[bytes] = []
+        for left in range(0, width, tile):
+            right = min(width, left + tile)
+            if pixels is not None:
+                data = pixels[top:bottom, left:right].tobytes()
+            else:
+                data = img.crop((left, top, right, bottom)).tobytes()
+            row.append(hashlib.blake2b(data, digest_size=8).digest())
+        grid.append(row)
+    return grid
+
+
+def _changed_tile_boxes(changed: set[tuple[int, int]]) -> list[tuple[int, int, int, int]]:
+    """変化したタイル (列, 行) を4近傍で連結し、連結成分ごとの外接タイル範囲を返す。"""
+    boxes = []
+    remaining = set(changed)
+    while remaining:
+        stack = [remaining.pop()]
+        min_x = max_x = stack[0][0]
+        min_y = max_y = stack[0][1]
+        while stack:
+            x, y = stack.pop()
+            min_x, max_x = min(min_x, x), max(max_x, x)
+            min_y, max_y = min(min_y, y), max(max_y, y)
+            for neighbour in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if neighbour in remaining:
+                    remaining.remove(neighbour)
+                    stack.append(neighbour)
+        boxes.append((min_x, min_y, max_x, max_y))
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    return boxes
+
+
+_SCREENSHOT_BASELINE_LIMIT = 16  # ドライバごとに保持する screenshot_delta の比較基準の数
+
+
+def _diff_frames(
+    img: Image.Image,
+    previous: Optional[tuple[tuple[int, int], int, list[list[bytes]]]],
+    *,
+    tile: int,
+    full_threshold: float,
+) -> tuple[ScreenshotDelta, tuple[tuple[int, int], int, list[list[bytes]]]]:
+    """img を previous（サイズ, タイル幅, タイルハッシュ）と比べ、差分と次回用の基準を返す。"""
+    grid = _tile_hashes(img, tile)
+    baseline = (img.size, tile, grid)
+    total = sum(len(row) for row in grid)
+    width, height = img.size
+    full_region = ScreenshotRegion(0, 0, width, height, img)
+
+    if previous is None or previous[0] != img.size or previous[1] != tile:
+        return ScreenshotDelta(img.size, True, True, [full_region], total, total), baseline
+
+    old_grid = previous[2]
+    changed = {
+        (tx, ty)
+        for ty, row in enumerate(grid)
+        for tx, digest in enumerate(row)
+        if old_grid[ty][tx] != digest
+    }
+    if not changed:
+        return ScreenshotDelta(img.size, False, False, [], 0, total), baseline
+    if len(changed) / total >= full_threshold:
+        return ScreenshotDelta(img.size, True, True, [full_region], len(changed), total), baseline
+
+    regions = []
+    for min_x, min_y, max_x, max_y in _changed_tile_boxes(changed):
+        box = (min_x * tile, min_y * tile, min(width, (max_x + 1) * tile), min(height, (max_y + 1) * tile))
+        regions.append(ScreenshotRegion(*box, image=img.crop(box)))
+    return ScreenshotDelta(img.size, True, False, regions, len(changed), total), baseline
+
+
+@dataclass
+class CapturedFrame:
+    """連続キャプチャの1フレーム。同一内容が続いた間は repeats を増やし last_seen_at を更新する。"""
+
+    index: int
+    captured_at: float
+    last_seen_at: float
+    digest: str
+    image: Image.Image
+    repeats: int = 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "captured_at": self.captured_at,
+            "last_seen_at": self.last_seen_at,
+            "digest": self.digest,
+            "size": list(self.image.size),
+            "repeats": self.repeats,
+        }
+
+
+class FrameRecorder:
+    """
+    専用スレッドで capture() を一定間隔で呼び、フレームをリングバッファに溜める。
+
+    直前と同じ内容（ハッシュ一致）のフレームは新しく積まず repeats を数えるだけにする。
+    離れた位置に同じ内容が再び現れた場合は画像オブジェクトを共有する。
+    フレーム数が capacity、画像の合計バイト数が max_bytes を超えると古い順に捨てる。
+    index は開始からの通し番号で、古いフレームが捨てられても変わらない。
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[], Image.Image],
+        *,
+        fps: float = 2.0,
+        capacity: int = 120,
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        if fps <= 0:
+            raise InvalidInputError("frame capture: fps must be > 0", code="invalid_frame_capture")
+        self._capture = capture
+        self.fps = float(fps)
+        self.capacity = max(1, int(capacity))
+        self.max_bytes = max(1, int(max_bytes))
+        self._frames: deque[CapturedFrame] = deque()
+        self._images: dict[str, list] = {}  # digest -> [image, 参照フレーム数]
+        self._bytes = 0
+        self._next_index = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.samples = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout_s: float = 2.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout_s)
+        self._thread = None
+
+    def _run(self) -> None:
+        interval = 1.0 / self.fps
+        next_at = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.add(self._capture())
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                        self.last_error = f"{type(e).__name__}: {e}"
+                # 撮影が間に合わない場合は遅れを溜めず、次の周期から仕切り直す
+                next_at = max(next_at + interval, time.monotonic())
+                self._stop.wait(max(0.0, next_at - time.monotonic()))
+        finally:
+            # 録画スレッドごとに作られた mss インスタンスを残さない
+            screen_grabber.release_current_thread()
+
+    def add(self, img: Image.Image) -> CapturedFrame:
+        """フレームを1枚追加する（スレッド外からも呼べる）。"""
+        digest = hashlib.blake2b(img.tobytes(), digest_size=16).hexdigest()
+        now = time.time()
+        with self._lock:
+            self.samples += 1
+            if self._frames and self._frames[-1].digest == digest:
+                latest = self._frames[-1]
+                latest.repeats += 1
+                latest.last_seen_at = now
+                self.duplicates += 1
+                return latest
+            entry = self._images.get(digest)
+            if entry is None:
+                entry = self._images[digest] = [img, 0]
+                self._bytes += _image_nbytes(img)
+            else:
+                self.duplicates += 1
+            entry[1] += 1
+            frame = CapturedFrame(self._next_index, now, now, digest, entry[0])
+            self._next_index += 1
+            self._frames.append(frame)
+            while len(self._frames) > 1 and (len(self._frames) > self.capacity or self._bytes > self.max_bytes):
+                self._evict_oldest()
+            return frame
+
+    def _evict_oldest(self) -> None:
+        frame = self._frames.popleft()
+        self.dropped += 1
+        entry = self._images[frame.digest]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._images[frame.digest]
+            self._bytes -= _image_nbytes(entry[0])
+
+    def frame(self, index: int = -1) -> CapturedFrame:
+        """通し番号 index のフレーム（負数なら最新から数えた位置）を返す。"""
+        with self._lock:
+            if index < 0:
+                if -index > len(self._frames):
+                    raise InvalidInputError(f"frame capture: frame {index} not in buffer", code="frame_not_found")
+                return self._frames[index]
+            for frame in self._frames:
+                if frame.index == index:
+                    return frame
+        raise InvalidInputError(f"frame capture: frame {index} not in buffer", code="frame_not_found")
+
+    def frames(self, start: Optional[int] = None, end: Optional[int] = None) -> list[CapturedFrame]:
+        """通し番号が start 以上 end 以下のフレーム（省略時はバッファ全体）。"""
+        with self._lock:
+            return [
+                frame
+                for frame in self._frames
+                if (start is None or frame.index >= start) and (end is None or frame.index <= end)
+            ]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "fps": self.fps,
+                "capacity": self.capacity,
+                "max_bytes": self.max_bytes,
+                "started_at": self.started_at,
+                "frames": len(self._frames),
+                "unique_images": len(self._images),
+                "bytes": self._bytes,
+                "first_index": self._frames[0].index if self._frames else None,
+                "last_index": self._frames[-1].index if self._frames else None,
+                "samples": self.samples,
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+def _image_nbytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+def _difference_hash(img: Image.Image) -> int:
+    """64bit の dHash。9×8 に縮小したグレースケールで横方向の明暗差を並べたもの（カーソル点滅程度の差は数ビットに収まる）。"""
+    small = img.resize((9, 8), Image.Resampling.BOX).convert("L")
+    pixels = small.tobytes()
+    bits = 0
+    for y in range(8):
+        row = pixels[y * 9:(y + 1) * 9]
+        for x in range(8):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+
+@dataclass
+class CachedScreenshot:
+    """ScreenshotCache に登録済みのスクリーンショット（画像本体は保持しない）。"""
+
+    ref: str
+    size: tuple[int, int]
+    digest: str
+    phash: int
+    created_at: float
+    hits: int = 0
+    tiles: Optional[list[list[bytes]]] = None
+
+
+@dataclass(frozen=True)
+class ScreenshotCacheResult:
+    """check() の結果。match は "exact" / "perceptual"、未登録（今回登録した）なら None。"""
+
+    ref: str
+    match: Optional[str]
+    distance: int = 0
+    changed_tiles: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"ref": self.ref, "match": self.match, "distance": self.distance, "changed_tiles": self.changed_tiles}
+
+
+class ScreenshotCache:
+    """
+    直近のスクリーンショットの完全一致ハッシュ（blake2b）と知覚ハッシュ（dHash）を保持し、
+    同じ/ほぼ同じ画像を再送せずに参照 ID で済ませるためのキャッシュ。
+
+    既定（threshold=0）は完全一致のみ。threshold > 0 のときは、同じサイズでハミング距離が threshold 以下の
+    登録済み画像を候補にする。ただし dHash はウィンドウ全体を 9×8 に縮めた値なので、小さなエラーバナー程度の
+    変化は埋もれる。そのため tile_size ピクセル単位のタイルハッシュも比べ、異なるタイルが max_changed_tiles
+    以下（カーソルの点滅や時計の更新程度）のときだけ perceptual として一致扱いにする。
+    登録数が capacity を超えると最も長く使われていないものから捨てる。
+    """
+
+    def __init__(self, capacity: int = 32, *, tile_size: int = 32):
+        self.capacity = max(1, capacity)
+        self._entries: OrderedDict[str, CachedScreenshot] = OrderedDict()
+        self._by_digest: dict[str, str] = {}
+        self._next_ref = 1
+        self.tile_size = max(8, tile_size)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+
+    def check(
+        self,
+        img: Image.Image,
+        *,
+        threshold: int = 0,
+        max_changed_tiles: int = 2,
+    ) -> ScreenshotCacheResult:
+        """
+        img を照合し、一致しなければ登録する。ハッシュ計算はロックの外で行う。
+
+        タイルハッシュは threshold > 0 のときだけ計算する（それ以前に登録された画像は近似一致の対象外）。
+        """
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        digest = hashlib.blake2b(img.tobytes(), digest_size=16).hexdigest()
+        phash = _difference_hash(img)
+        tiles = _tile_hashes(img, self.tile_size) if threshold > 0 else None
+        with self._lock:
+            self.requests += 1
+            ref = self._by_digest.get(digest)
+            if ref is not None:
+                self.exact_hits += 1
+                return self._hit(ref, "exact", 0, 0)
+            if tiles is not None:
+                best: Optional[tuple[int, int, str]] = None
+                for entry in reversed(self._entries.values()):
+                    if entry.size != img.size or entry.tiles is None:
+                        continue
+                    distance = (entry.phash ^ phash).bit_count()
+                    if distance > threshold:
+                        continue
+                    changed = sum(
+                        a != b for old_row, new_row in zip(entry.tiles, tiles) for a, b in zip(old_row, new_row)
+                    )
+                    if changed <= max_changed_tiles and (best is None or (changed, distance) < best[:2]):
+                        best = (changed, distance, entry.ref)
+                if best is not None:
+                    self.perceptual_hits += 1
+                    return self._hit(best[2], "perceptual", best[1], best[0])
+
+            ref = f"shot-{self._next_ref}"
+            self._next_ref += 1
+            self._entries[ref] = CachedScreenshot(ref, img.size, digest, phash, time.time(), tiles=tiles)
+            self._by_digest[digest] = ref
+            while len(self._entries) > self.capacity:
+                _, evicted = self._entries.popitem(last=False)
+                self._by_digest.pop(evicted.digest, None)
+            return ScreenshotCacheResult(ref, None)
+
+    def _hit(self, ref: str, match: str, distance: int, changed_tiles: int) -> ScreenshotCacheResult:
+        entry = self._entries[ref]
+        entry.hits += 1
+        self._entries.move_to_end(ref)
+        return ScreenshotCacheResult(ref, match, distance, changed_tiles)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_digest.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.perceptual_hits
+            return {
+                "requests": self.requests,
+                "exact_hits": self.exact_hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.requests - hits,
+                "hit_rate": round(hits / self.requests, 3) if self.requests else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+class _BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ("biSize", ctypes.c_uint32),
+        ("biWidth", ctypes.c_int32),
+        ("biHeight", ctypes.c_int32),
+        ("biPlanes", ctypes.c_uint16),
+        ("biBitCount", ctypes.c_uint16),
+        ("biCompression", ctypes.c_uint32),
+        ("biSizeImage", ctypes.c_uint32),
+        ("biXPelsPerMeter", ctypes.c_int32),
+        ("biYPelsPerMeter", ctypes.c_int32),
+        ("biClrUsed", ctypes.c_uint32),
+        ("biClrImportant", ctypes.c_uint32),
+    ]
+
 
-    r = [p[0] for p in px]
-    g = [p[1] for p in px]
-    b = [p[2] for p in px]
+_GDI_API: Optional[dict[str, Any]] = None
+
+
+def _gdi_api() -> dict[str, Any]:
+    """ハンドルを切り詰めないよう型を設定した GDI/user32 関数（グローバルの windll とは別インスタンス）。"""
+    global _GDI_API
+    if _GDI_API is None:
+        gdi32 = ctypes.WinDLL("gdi32")
+        user32 = ctypes.WinDLL("user32")
+        handle = ctypes.c_void_p
+        api = {
+            "CreateCompatibleDC": gdi32.CreateCompatibleDC,
+            "CreateDIBSection": gdi32.CreateDIBSection,
+            "SelectObject": gdi32.SelectObject,
+            "DeleteObject": gdi32.DeleteObject,
+            "DeleteDC": gdi32.DeleteDC,
+            "GdiFlush": gdi32.GdiFlush,
+            "PrintWindow": user32.PrintWindow,
+        }
+        api["CreateCompatibleDC"].argtypes = [handle]
+        api["CreateCompatibleDC"].restype = handle
+        api["CreateDIBSection"].argtypes = [
+            handle,
+            ctypes.POINTER(_BITMAPINFOHEADER),
+            ctypes.c_uint,
+            ctypes.POINTER(ctypes.c_void_p),
+            handle,
+            ctypes.c_uint32,
+        ]
+        api["CreateDIBSection"].restype = handle
+        api["SelectObject"].argtypes = [handle, handle]
+        api["SelectObject"].restype = handle
+        api["DeleteObject"].argtypes = [handle]
+        api["DeleteDC"].argtypes = [handle]
+        api["PrintWindow"].argtypes = [handle, handle, ctypes.c_uint]
+        _GDI_API = api
+    return _GDI_API
+
+
+class _PrintWindowContext:
+    """
+    1つのウィンドウ用にメモリ DC と 32bpp トップダウン DIB セクションを保持し、PrintWindow を繰り返す。
+
+    DIB はウィンドウサイズが変わったときだけ作り直す。PrintWindow は DIB に直接描画するので、
+    GetBitmapBits による中間コピーは発生しない。
+    """
 
-    def var(a):
-        m = sum(a) / len(a)
-        return sum((x - m) ** 2 for x in a) / len(a)
+    def __init__(self, hwnd: int):
+        self.hwnd = hwnd
+        self.size = (0, 0)
+        self.rebuilds = 0
+        self.captures = 0
+        self._lock = threading.Lock()
+        self._dc = None
+        self._bitmap = None
+        self._previous_object = None
+        self._bits = ctypes.c_void_p()
+
+    def _release_bitmap(self) -> None:
+        api = _gdi_api()
+        if self._bitmap:
+            api["SelectObject"](self._dc, self._previous_object)
+            api["DeleteObject"](self._bitmap)
+        self._bitmap = None
+        self._previous_object = None
+        self._bits = ctypes.c_void_p()
+        self.size = (0, 0)
+
+    def _ensure(self, width: int, height: int) -> None:
+        if self._bitmap and self.size == (width, height):
+            return
+        api = _gdi_api()
+        if self._dc is None:
+            self._dc = api["CreateCompatibleDC"](None)
+            if not self._dc:
+                raise ScreenshotError("capture_printwindow: CreateCompatibleDC failed")
+        self._release_bitmap()
+        header = _BITMAPINFOHEADER()
+        header.biSize = ctypes.sizeof(_BITMAPINFOHEADER)
+        header.biWidth = width
+        header.biHeight = -height  # 負の高さ = トップダウン（行順がそのまま画像の上から下）
+        header.biPlanes = 1
+        header.biBitCount = 32
+        header.biCompression = 0  # BI_RGB
+        bits = ctypes.c_void_p()
+        bitmap = api["CreateDIBSection"](self._dc, ctypes.byref(header), 0, ctypes.byref(bits), None, 0)
+        if not bitmap or not bits.value:
+            raise ScreenshotError("capture_printwindow: CreateDIBSection failed")
+        self._previous_object = api["SelectObject"](self._dc, bitmap)
+        self._bitmap = bitmap
+        self._bits = bits
+        self.size = (width, height)
+        self.rebuilds += 1
+
+    def capture_view(self) -> tuple[memoryview, tuple[int, int]]:
+        """
+        PrintWindow で描画し、DIB のピクセル列（BGRX, 行間詰めなし）をコピーせずに返す。
 
-    return (var(r) + var(g) + var(b)) < 2.0
+        返した memoryview は次のキャプチャで上書きされるため、呼び出し側で保持しないこと。
+        """
+        rect = _get_window_rect(self.hwnd)
+        width, height = rect.width, rect.height
+        if width <= 0 or height <= 0:
+            raise ScreenshotError("capture_printwindow: invalid window size (w/h <= 0)")
+        api = _gdi_api()
+        self._ensure(width, height)
+        # 0=default, 2=PW_RENDERFULLCONTENT（Chromeでは不安定な場合あり）
+        result = api["PrintWindow"](self.hwnd, self._dc, 2)
+        api["GdiFlush"]()
+        if result != 1:
+            raise ScreenshotError("capture_printwindow: PrintWindow failed (returned 0)")
+        self.captures += 1
+        buffer = (ctypes.c_char * (width * height * 4)).from_address(self._bits.value)
+        return memoryview(buffer), (width, height)
+
+    def capture(self) -> Image.Image:
+        with self._lock:
+            view, size = self.capture_view()
+            # BGRX -> RGB の変換が唯一のコピー（バッファは次回のキャプチャで再利用される）
+            return Image.frombuffer("RGB", size, view, "raw", "BGRX", 0, 1)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._dc is None:
+                return
+            self._release_bitmap()
+            _gdi_api()["DeleteDC"](self._dc)
+            self._dc = None
+
+
+_CAPTURE_CONTEXTS: dict[int, _PrintWindowContext] = {}
+_CAPTURE_CONTEXTS_LOCK = threading.Lock()
+
+
+def _capture_context(hwnd: int) -> _PrintWindowContext:
+    """ウィンドウごとのキャプチャコンテキストを取得する（閉じたウィンドウの分はここで解放）。"""
+    with _CAPTURE_CONTEXTS_LOCK:
+        for stale in [h for h in _CAPTURE_CONTEXTS if h != hwnd and not win32gui.IsWindow(h)]:
+            _CAPTURE_CONTEXTS.pop(stale).close()
+        context = _CAPTURE_CONTEXTS.get(hwnd)
+        if context is None:
+            context = _CAPTURE_CONTEXTS[hwnd] = _PrintWindowContext(hwnd)
+        return context
+
+
+def _close_capture_contexts() -> None:
+    with _CAPTURE_CONTEXTS_LOCK:
+        for context in _CAPTURE_CONTEXTS.values():
+            context.close()
+        _CAPTURE_CONTEXTS.clear()
+
+
+atexit.register(_close_capture_contexts)
 
 
 def _capture_by_printwindow(hwnd: int) -> Image.Image:
-    rect = _get_window_rect(hwnd)
-    w, h = rect.width, rect.height
-    if w <= 0 or h <= 0:
-        raise ScreenshotError("capture_printwindow: invalid window size (w/h <= 0)")
-
-    hwnd_dc = win32gui.GetWindowDC(hwnd)
-    mfc_dc = win32ui.CreateDCFromHandle(hwnd_dc)
-    save_dc = mfc_dc.CreateCompatibleDC()
-
-    bmp = win32ui.CreateBitmap()
-    bmp.CreateCompatibleBitmap(mfc_dc, w, h)
-    save_dc.SelectObject(bmp)
-
-    # 0=default, 2=PW_RENDERFULLCONTENT（Chromeでは不安定な場合あり）
-    flags = 2
-    result = ctypes.windll.user32.PrintWindow(hwnd, save_dc.GetSafeHdc(), flags)
-
-    bmpinfo = bmp.GetInfo()
-    bmpstr = bmp.GetBitmapBits(True)
-
-    img = Image.frombuffer(
-        "RGB",
-        (bmpinfo["bmWidth"], bmpinfo["bmHeight"]),
-        bmpstr,
-        "raw",
-        "BGRX",
-        0,
-        1,
-    )
+    return _capture_context(hwnd).capture()
+
+
+_SM_CMONITORS = 80
+
+
+def _display_signature() -> tuple[int, ...]:
+    """仮想スクリーンの位置/サイズとモニター数。変われば表示構成が変わったとみなす（GetSystemMetrics のみで安価）。"""
+    try:
+        user32 = ctypes.windll.user32
+        return tuple(
+            int(user32.GetSystemMetrics(index))
+            for index in (_SM_XVIRTUALSCREEN, _SM_YVIRTUALSCREEN, _SM_CXVIRTUALSCREEN, _SM_CYVIRTUALSCREEN, _SM_CMONITORS)
+        )
+    except Exception:
+        return ()
+
+
+class ScreenGrabber:
+    """
+    mss インスタンスをスレッドごとに1つ保持して使い回す（mss はスレッドをまたいで使えない）。
+
+    モニター構成は1度だけ列挙してキャッシュし、表示構成の変化（解像度変更・モニターの抜き差し）を
+    検知したら全スレッドのインスタンスを世代ごと作り直す。複数モニターはワーカースレッドで並列に取得する。
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, max_workers)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._signature: Optional[tuple[int, ...]] = None
+        self._monitors: Optional[list[dict[str, int]]] = None
+        self._instances: list[Any] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.created = 0
+        self.invalidations = 0
+        self.grabs = 0
+
+    def _check_display(self) -> int:
+        signature = _display_signature()
+        with self._lock:
+            if signature != self._signature:
+                if self._signature is not None:
+                    self.invalidations += 1
+                self._signature = signature
+                self._generation += 1
+                self._monitors = None
+            return self._generation
+
+    def _sct(self):
+        generation = self._check_display()
+        local = self._local
+        if getattr(local, "generation", None) != generation:
+            old = getattr(local, "sct", None)
+            if old is not None:
+                _safe_win32(old.close)
+            local.sct = mss.mss()
+            local.generation = generation
+            with self._lock:
+                if old in self._instances:
+                    self._instances.remove(old)
+                self._instances.append(local.sct)
+                self.created += 1
+        return local.sct
+
+    def release_current_thread(self) -> None:
+        """呼び出し元スレッドの mss インスタンスを閉じて手放す（スレッド終了前に呼ぶ）。"""
+        local = self._local
+        sct = getattr(local, "sct", None)
+        if sct is None:
+            return
+        local.sct = None
+        local.generation = None
+        with self._lock:
+            if sct in self._instances:
+                self._instances.remove(sct)
+        _safe_win32(sct.close)
+
+    def monitors(self) -> list[dict[str, int]]:
+        """mss と同じ並び（0=仮想スクリーン全体、1以降=各モニター）のモニター矩形。"""
+        sct = self._sct()
+        with self._lock:
+            if self._monitors is None:
+                self._monitors = [dict(monitor) for monitor in sct.monitors]
+            return list(self._monitors)
+
+    def grab(self, region: dict[str, int]) -> Image.Image:
+        shot = self._sct().grab(region)
+        with self._lock:
+            self.grabs += 1
+        return Image.frombytes("RGB", shot.size, shot.rgb)
+
+    def grab_monitor(self, monitor: int) -> Image.Image:
+        monitors = self.monitors()
+        if monitor < 0 or monitor > len(monitors) - 1:
+            raise InvalidInputError(
+                "capture_full_screen: invalid monitor number "
+                f"(monitor={monitor}, available=0-{len(monitors) - 1})",
+                code="invalid_monitor",
+            )
+        return self.grab(monitors[monitor])
+
+    def grab_monitors(self, monitors: Optional[Iterable[int]] = None) -> list[tuple[dict[str, int], Image.Image]]:
+        """指定モニター（省略時は全モニター）を並列に取得し、(モニター矩形, 画像) を指定順で返す。"""
+        layout = self.monitors()
+        indices = list(monitors) if monitors is not None else list(range(1, len(layout)))
+        for monitor in indices:
+            if monitor < 1 or monitor > len(layout) - 1:
+                raise InvalidInputError(
+                    f"capture_monitors: invalid monitor number (monitor={monitor}, available=1-{len(layout) - 1})",
+                    code="invalid_monitor",
+                )
+        if len(indices) <= 1:
+            return [(layout[m], self.grab(layout[m])) for m in indices]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="screen-grab")
+            executor = self._executor
+        futures = [executor.submit(self.grab, layout[m]) for m in indices]
+        return [(layout[m], future.result()) for m, future in zip(indices, futures)]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "generation": self._generation,
+                "instances": self.created,
+                "live_instances": len(self._instances),
+                "invalidations": self.invalidations,
+                "grabs": self.grabs,
+                "monitors": len(self._monitors) - 1 if self._monitors else None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            instances, self._instances = self._instances, []
+            executor, self._executor = self._executor, None
+            self._generation += 1
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for sct in instances:
+            _safe_win32(sct.close)
+
 
-    win32gui.DeleteObject(bmp.GetHandle())
-    save_dc.DeleteDC()
-    mfc_dc.DeleteDC()
-    win32gui.ReleaseDC(hwnd, hwnd_dc)
+def _stitch_monitors(shots: list[tuple[dict[str, int], Image.Image]]) -> Image.Image:
+    """各モニターの画像を仮想スクリーン上の位置に貼り合わせる（モニター間の隙間は黒）。"""
+    left = min(monitor["left"] for monitor, _ in shots)
+    top = min(monitor["top"] for monitor, _ in shots)
+    right = max(monitor["left"] + img.width for monitor, img in shots)
+    bottom = max(monitor["top"] + img.height for monitor, img in shots)
+    canvas = Image.new("RGB", (right - left, bottom - top))
+    for monitor, img in shots:
+        canvas.paste(img, (monitor["left"] - left, monitor["top"] - top))
+    return canvas
 
-    if result != 1:
-        raise ScreenshotError("capture_printwindow: PrintWindow failed (returned 0)")
 
-    return img
+screen_grabber = ScreenGrabber()
+atexit.register(screen_grabber.close)
 
 
 def _capture_by_screen_rect(rect: Rect) -> Image.Image:
     if rect.width <= 0 or rect.height <= 0:
         raise ScreenshotError("capture_screen: invalid rect size (width/height <= 0)")
 
-    with mss.mss() as sct:
-        monitor = {"left": rect.left, "top": rect.top, "width": rect.width, "height": rect.height}
-        shot = sct.grab(monitor)
-        return Image.frombytes("RGB", shot.size, shot.rgb)
+    return screen_grabber.grab({"left": rect.left, "top": rect.top, "width": rect.width, "height": rect.height})
+
+
+def _intersect_rect(rect: Rect, bounds: Rect) -> Rect:
+    return Rect(
+        max(rect.left, bounds.left),
+        max(rect.top, bounds.top),
+        min(rect.right, bounds.right),
+        min(rect.bottom, bounds.bottom),
+    )
+
+
+def _downscale(img: Image.Image, max_dimension: Optional[int]) -> Image.Image:
+    """長辺が max_dimension を超える場合だけ縦横比を保って縮小する（整数倍の間引きを先に行い高速化）。"""
+    if not max_dimension:
+        return img
+    longest = max(img.size)
+    if longest <= max_dimension:
+        return img
+    scale = max_dimension / longest
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def _safe_win32(func: Callable[..., Any], *args: Any, default: Any = None) -> Any:
+    try:
+        return func(*args)
+    except Exception:
+        return default
 
 
 def _force_foreground(hwnd: int) -> None:
@@ -823,9 +2001,1631 @@ def _force_foreground(hwnd: int) -> None:
             pass
 
 
+# -----------------------------
+# 画像エンコード
+# -----------------------------
+ImageFormat = Literal["PNG", "JPEG", "WEBP", "auto"]
+
+_MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+_WEBP_SUPPORTED: Optional[bool] = None
+
+
+def _webp_supported() -> bool:
+    global _WEBP_SUPPORTED
+    if _WEBP_SUPPORTED is None:
+        try:
+            _WEBP_SUPPORTED = bool(features.check("webp"))
+        except Exception:
+            _WEBP_SUPPORTED = False
+    return _WEBP_SUPPORTED
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """エンコード結果。within_budget=False は最低品質でも max_bytes に収まらなかったことを示す。"""
+
+    data: bytes
+    fmt: str
+    quality: Optional[int]
+    lossless: bool
+    size: tuple[int, int]
+    within_budget: bool = True
+    attempts: int = 1
+
+    @property
+    def mime_type(self) -> str:
+        return _MIME_TYPES[self.fmt]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "format": self.fmt,
+            "quality": self.quality,
+            "lossless": self.lossless,
+            "bytes": len(self.data),
+            "size": list(self.size),
+            "within_budget": self.within_budget,
+            "attempts": self.attempts,
+        }
+
+
+def _save_image(img: Image.Image, fmt: str, *, quality: Optional[int], lossless: bool) -> bytes:
+    buf = io.BytesIO()
+    save_kwargs: dict[str, Any] = {}
+    if fmt == "JPEG":
+        save_kwargs["quality"] = int(quality)
+        save_kwargs["optimize"] = True
+    elif fmt == "WEBP":
+        if lossless:
+            # method を下げても UI 画像ではサイズ差が小さく、エンコード時間は大きく縮む
+            save_kwargs.update(lossless=True, quality=50, method=2)
+        else:
+            save_kwargs.update(quality=int(quality), method=4)
+    img.save(buf, format=fmt, **save_kwargs)
+    return buf.getvalue()
+
+
+def _is_flat_image(img: Image.Image, max_colors: int = 256) -> bool:
+    """色数が少ない（テキストと単色背景中心の）画像か。該当すれば可逆圧縮の方が小さく鮮明になりやすい。"""
+    sample = img if max(img.size) <= 256 else img.resize(
+        (max(1, img.width * 256 // max(img.size)), max(1, img.height * 256 // max(img.size))),
+        Image.Resampling.NEAREST,
+    )
+    return sample.getcolors(max_colors) is not None
+
+
+class ImageEncoder:
+    """
+    スクリーンショット用のエンコーダ。
+
+    fmt="auto" は色数の少ない画像を可逆（WebP があれば WebP、無ければ PNG）、それ以外を非可逆
+    （WebP または JPEG）で保存する。max_bytes を指定すると、収まる最大の品質を探索する。
+    探索は各回 probes 個の品質をワーカースレッドで並列に試して範囲を絞る（Pillow はエンコード中に
+    GIL を解放するので並列化が効く）。encode_many は複数画像をまとめてエンコードする。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, *, probes: int = 3):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.probes = max(1, probes)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="image-encode")
+            return self._executor
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _resolve_format(self, img: Image.Image, fmt: str) -> tuple[str, bool]:
+        """(実際のフォーマット, 可逆か) を決める。WebP 非対応環境では PNG/JPEG に置き換える。"""
+        fmt = fmt.upper() if fmt != "auto" else fmt
+        if fmt == "auto":
+            if _is_flat_image(img):
+                return ("WEBP" if _webp_supported() else "PNG"), True
+            return ("WEBP" if _webp_supported() else "JPEG"), False
+        if fmt == "WEBP" and not _webp_supported():
+            return "JPEG", False
+        if fmt not in _MIME_TYPES:
+            raise InvalidInputError(f"encode_image: unsupported format: {fmt!r}", code="invalid_format")
+        return fmt, fmt == "PNG"
+
+    def encode(
+        self,
+        img: Image.Image,
+        fmt: ImageFormat = "PNG",
+        *,
+        quality: int = 90,
+        max_bytes: Optional[int] = None,
+        min_quality: int = 10,
+    ) -> EncodedImage:
+        fmt, lossless = self._resolve_format(img, fmt)
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        quality = max(1, min(100, int(quality)))
+        data = _save_image(img, fmt, quality=None if lossless else quality, lossless=lossless)
+        result = EncodedImage(data, fmt, None if lossless else quality, lossless, img.size)
+        if max_bytes is None or len(data) <= max_bytes:
+            return result
+
+        if lossless:
+            if fmt == "PNG" and not _webp_supported():
+                lossy_fmt = "JPEG"
+            elif fmt == "PNG":
+                # 明示的に PNG が指定された場合は形式を変えない
+                return EncodedImage(data, fmt, None, True, img.size, within_budget=False)
+            else:
+                lossy_fmt = fmt
+            if lossy_fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+        else:
+            lossy_fmt = fmt
+        return self._search_quality(img, lossy_fmt, max_bytes, low=max(1, min_quality), high=quality, attempts=1)
+
+    def _search_quality(
+        self,
+        img: Image.Image,
+        fmt: str,
+        max_bytes: int,
+        *,
+        low: int,
+        high: int,
+        attempts: int,
+    ) -> EncodedImage:
+        """max_bytes に収まる最大の品質を [low, high] から探す（high は収まらないことが分かっている前提）。"""
+        pool = self._pool()
+        best: Optional[tuple[int, bytes]] = None
+        smallest: Optional[tuple[int, bytes]] = None
+        high -= 1
+        while low <= high:
+            span = high - low + 1
+            count = min(self.probes, span)
+            candidates = sorted({low + (span * (i + 1)) // (count + 1) for i in range(count)})
+            futures = {q: pool.submit(_save_image, img, fmt, quality=q, lossless=False) for q in candidates}
+            outcomes = {q: future.result() for q, future in futures.items()}
+            attempts += len(outcomes)
+            fitting = [q for q in candidates if len(outcomes[q]) <= max_bytes]
+            for q, data in outcomes.items():
+                if smallest is None or len(data) < len(smallest[1]):
+                    smallest = (q, data)
+            if fitting:
+                q = max(fitting)
+                if best is None or q > best[0]:
+                    best = (q, outcomes[q])
+                low = q + 1
+                bigger = [c for c in candidates if c > q]
+                high = min(bigger) - 1 if bigger else high
+            else:
+                high = min(candidates) - 1
+        if best is not None:
+            return EncodedImage(best[1], fmt, best[0], False, img.size, attempts=attempts)
+        if smallest is None:
+            data = _save_image(img, fmt, quality=low, lossless=False)
+            smallest = (low, data)
+            attempts += 1
+        return EncodedImage(smallest[1], fmt, smallest[0], False, img.size, within_budget=False, attempts=attempts)
+
+    def submit(self, img: Image.Image, fmt: ImageFormat = "PNG", **kwargs: Any) -> "Future[EncodedImage]":
+        return self._pool().submit(self.encode, img, fmt, **kwargs)
+
+    def encode_many(self, images: Iterable[Image.Image], fmt: ImageFormat = "PNG", **kwargs: Any) -> list[EncodedImage]:
+        images = list(images)
+        if len(images) <= 1:
+            return [self.encode(img, fmt, **kwargs) for img in images]
+        # 予算付き探索は内部でもプールを使うので、外側は呼び出しスレッドで回してデッドロックを避ける
+        if kwargs.get("max_bytes") is not None:
+            return [self.encode(img, fmt, **kwargs) for img in images]
+        return [future.result() for future in [self.submit(img, fmt, **kwargs) for img in images]]
+
+
+image_encoder = ImageEncoder()
+atexit.register(image_encoder.close)
+
+
+def _deliver_image(
+    img: Image.Image,
+    file_path: Optional[str],
+    *,
+    as_bytes: bool,
+    fmt: ImageFormat,
+    quality: int,
+    max_bytes: Optional[int],
+) -> Union[Image.Image, bytes]:
+    """screenshot 系の共通の出口。ファイル保存とバイト列化は1回のエンコード結果を共有する。"""
+    if not (file_path or as_bytes):
+        return img
+    encoded = image_encoder.encode(img, fmt, quality=quality, max_bytes=max_bytes)
+    if file_path:
+        with open(file_path, "wb") as f:
+            f.write(encoded.data)
+    return encoded.data if as_bytes else img
+
+
+# -----------------------------
+# SendInput によるキーボード入力
+# -----------------------------
+_INPUT_MOUSE = 0
+_INPUT_KEYBOARD = 1
+_KEYEVENTF_EXTENDEDKEY = 0x0001
+_KEYEVENTF_KEYUP = 0x0002
+_KEYEVENTF_UNICODE = 0x0004
+
+_ULONG_PTR = ctypes.c_size_t
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", ctypes.c_long),
+        ("dy", ctypes.c_long),
+        ("mouseData", ctypes.c_ulong),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", _ULONG_PTR),
+    ]
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", ctypes.c_ushort),
+        ("wScan", ctypes.c_ushort),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", _ULONG_PTR),
+    ]
+
+
+class _HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [
+        ("uMsg", ctypes.c_ulong),
+        ("wParamL", ctypes.c_ushort),
+        ("wParamH", ctypes.c_ushort),
+    ]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", _MOUSEINPUT), ("ki", _KEYBDINPUT), ("hi", _HARDWAREINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [("type", ctypes.c_ulong), ("u", _INPUTUNION)]
+
+
+@dataclass(frozen=True)
+class KeyEvent:
+    """SendInput 1件分のキーイベント（vk=0 かつ KEYEVENTF_UNICODE なら scan が文字コード）。"""
+
+    vk: int
+    scan: int = 0
+    flags: int = 0
+
+    @property
+    def is_up(self) -> bool:
+        return bool(self.flags & _KEYEVENTF_KEYUP)
+
+
+_VK_SHIFT = 0x10
+_VK_CONTROL = 0x11
+_VK_MENU = 0x12
+_MODIFIER_VK = {"^": _VK_CONTROL, "+": _VK_SHIFT, "%": _VK_MENU}
+_MODIFIER_VKS = frozenset(_MODIFIER_VK.values())
+
+# {NAME} 形式のキー名 -> (仮想キーコード, 拡張キーか)
+_VK_NAMES: dict[str, tuple[int, bool]] = {
+    "ENTER": (0x0D, False),
+    "TAB": (0x09, False),
+    "ESC": (0x1B, False),
+    "ESCAPE": (0x1B, False),
+    "BACKSPACE": (0x08, False),
+    "BKSP": (0x08, False),
+    "BS": (0x08, False),
+    "SPACE": (0x20, False),
+    "DELETE": (0x2E, True),
+    "DEL": (0x2E, True),
+    "INSERT": (0x2D, True),
+    "INS": (0x2D, True),
+    "HOME": (0x24, True),
+    "END": (0x23, True),
+    "PGUP": (0x21, True),
+    "PGDN": (0x22, True),
+    "UP": (0x26, True),
+    "DOWN": (0x28, True),
+    "LEFT": (0x25, True),
+    "RIGHT": (0x27, True),
+    **{f"F{i}": (0x6F + i, False) for i in range(1, 13)},
+}
+# テキスト中の制御文字は Unicode 送信では効かないアプリがあるので仮想キーで送る
+_TEXT_CONTROL_VK = {"\n": 0x0D, "\r": 0x0D, "\t": 0x09}
+
+
+def _vk_press(vk: int, extended: bool = False) -> list[KeyEvent]:
+    flags = _KEYEVENTF_EXTENDEDKEY if extended else 0
+    return [KeyEvent(vk, 0, flags), KeyEvent(vk, 0, flags | _KEYEVENTF_KEYUP)]
+
+
+def _unicode_press(ch: str) -> list[KeyEvent]:
+    events: list[KeyEvent] = []
+    # BMP 外の文字は UTF-16 サロゲートペアの2単位として送る
+    data = ch.encode("utf-16-le")
+    for i in range(0, len(data), 2):
+        unit = int.from_bytes(data[i:i + 2], "little")
+        events.append(KeyEvent(0, unit, _KEYEVENTF_UNICODE))
+        events.append(KeyEvent(0, unit, _KEYEVENTF_UNICODE | _KEYEVENTF_KEYUP))
+    return events
+
+
+def _vk_for_char(ch: str) -> int:
+    """修飾キーと組み合わせる文字の仮想キーコード（英数字以外は VkKeyScanW に委ねる）。"""
+    if ch.isascii() and ch.isalnum():
+        return ord(ch.upper())
+    code = ctypes.windll.user32.VkKeyScanW(ord(ch))
+    if code == -1 or code & 0xFF == 0xFF:
+        raise InvalidInputError(f"keyboard: cannot map character to a virtual key: {ch!r}", code="invalid_keys")
+    return code & 0xFF
+
+
+_MOUSEEVENTF_WHEEL = 0x0800
+_WHEEL_DELTA = 120
+_WHEEL_PIXELS_PER_NOTCH = 100
+_SCROLL_NO_SCROLL = -1.0  # UIA_ScrollPatternNoScroll（その軸は動かさない）
+
+
+def _scroll_position(scroll) -> dict[str, Any]:
+    return {
+        "vertical_percent": round(float(scroll.CurrentVerticalScrollPercent), 3),
+        "vertical_view_size": round(float(scroll.CurrentVerticalViewSize), 3),
+        "vertically_scrollable": bool(scroll.CurrentVerticallyScrollable),
+    }
+
+
+class SimulatedInputBackend:
+    """SendInput の代わりにイベントを記録するだけのバックエンド（テスト・ドライラン用）。"""
+
+    def __init__(self):
+        self.batches: list[list[Any]] = []
+
+    @property
+    def events(self) -> list[Any]:
+        return [event for batch in self.batches for event in batch]
+
+    def send(self, events: list[Any]) -> int:
+        self.batches.append(list(events))
+        return len(events)
+
+
+class SendInputBackend:
+    """user32.SendInput に INPUT 配列をまとめて渡すバックエンド。"""
+
+    def send(self, events: list[Any]) -> int:
+        array = (_INPUT * len(events))()
+        for slot, event in zip(array, events):
+            if isinstance(event, KeyEvent):
+                slot.type = _INPUT_KEYBOARD
+                slot.ki = _KEYBDINPUT(event.vk, event.scan, event.flags, 0, 0)
+            else:
+                slot.type = _INPUT_MOUSE
+                slot.mi = event
+        sent = ctypes.windll.user32.SendInput(len(events), array, ctypes.sizeof(_INPUT))
+        if sent != len(events):
+            # UIPI（権限の高いウィンドウ）などで入力がブロックされると途中で止まる
+            raise ActionFailedError(
+                f"SendInput: only {sent}/{len(events)} events were injected",
+                data={"sent": sent, "requested": len(events)},
+            )
+        return sent
+
+
+class KeyboardEngine:
+    """
+    テキスト/キーシーケンスを KeyEvent 列にコンパイルし、SendInput でまとめて送る。
+
+    キーシーケンスは send_keys の主要な記法に対応する:
+    ^ / + / % (Ctrl/Shift/Alt 修飾), {NAME}, {NAME n}（n 回繰り返し）, {x}（文字そのもの）, ( ) でのグループ化。
+    長い入力は chunk_size イベントごとに分割して送る（1回の SendInput が長時間ブロックしないように）。
+    compile_text / type_text は記法を解釈せず、{ENTER} や ^ も文字としてそのまま送る。
+    """
+
+    def __init__(self, backend: Any = None, *, chunk_size: int = 512):
+        self.backend = backend if backend is not None else SendInputBackend()
+        self.chunk_size = max(2, int(chunk_size))
+
+    def compile_text(self, text: str) -> list[KeyEvent]:
+        """文字列をそのまま入力するイベント列（特殊記法は解釈しない）。"""
+        events: list[KeyEvent] = []
+        for ch in text:
+            if ch in _TEXT_CONTROL_VK:
+                if ch == "\r":
+                    continue
+                events.extend(_vk_press(_TEXT_CONTROL_VK[ch]))
+            else:
+                events.extend(_unicode_press(ch))
+        return events
+
+    def compile_keys(self, keys: str) -> list[KeyEvent]:
+        """send_keys 形式のキーシーケンスをイベント列にする。"""
+        events: list[KeyEvent] = []
+        pos = 0
+        modifiers: list[int] = []
+
+        def release(mods: list[int]) -> None:
+            for vk in reversed(mods):
+                events.append(KeyEvent(vk, 0, _KEYEVENTF_KEYUP))
+
+        def emit(press: list[KeyEvent], mods: list[int]) -> None:
+            for vk in mods:
+                events.append(KeyEvent(vk, 0, 0))
+            events.extend(press)
+            release(mods)
+
+        while pos < len(keys):
+            ch = keys[pos]
+            if ch in _MODIFIER_VK:
+                modifiers.append(_MODIFIER_VK[ch])
+                pos += 1
+                continue
+            if ch == "(":
+                end = keys.find(")", pos)
+                if end < 0:
+                    raise InvalidInputError(f"keyboard: unbalanced '(' in keys: {keys!r}", code="invalid_keys")
+                for vk in modifiers:
+                    events.append(KeyEvent(vk, 0, 0))
+                for inner in keys[pos + 1:end]:
+                    events.extend(_vk_press(_vk_for_char(inner)) if modifiers else _unicode_press(inner))
+                release(modifiers)
+                modifiers = []
+                pos = end + 1
+                continue
+            if ch == "{":
+                end = keys.find("}", pos + 2)
+                if end < 0:
+                    raise InvalidInputError(f"keyboard: unbalanced '{{' in keys: {keys!r}", code="invalid_keys")
+                body = keys[pos + 1:end]
+                name, _, count = body.partition(" ")
+                repeat = int(count) if count.strip().isdigit() else 1
+                if name.upper() in _VK_NAMES:
+                    vk, extended = _VK_NAMES[name.upper()]
+                    press = _vk_press(vk, extended)
+                elif len(name) == 1:
+                    press = _vk_press(_vk_for_char(name)) if modifiers else _unicode_press(name)
+                else:
+                    raise InvalidInputError(f"keyboard: unknown key name: {{{body}}}", code="invalid_keys")
+                emit(press * repeat, modifiers)
+                modifiers = []
+                pos = end + 1
+                continue
+            if ch == "~":
+                emit(_vk_press(0x0D), modifiers)
+            elif modifiers:
+                emit(_vk_press(_vk_for_char(ch)), modifiers)
+            else:
+                events.extend(self.compile_text(ch))
+            modifiers = []
+            pos += 1
+
+        if modifiers:
+            raise InvalidInputError(f"keyboard: dangling modifier in keys: {keys!r}", code="invalid_keys")
+        return events
+
+    def send(self, events: list[Any]) -> int:
+        """
+        イベント列を chunk_size ごとに送る。キーの押下/解放がチャンク境界で分断されないよう調整する。
+
+        チャンクはキーが1つも押されていない位置で区切る。修飾キーを押したままの長い入力
+        （^{a 1000} など）でそうした位置が無い場合は、修飾キーだけが押されている位置で区切り、
+        チャンク末尾で修飾キーを解放して次のチャンクの先頭で押し直す（チャンク間で押しっぱなしにしない）。
+        """
+        sent = 0
+        start = 0
+        carried: list[int] = []  # 前のチャンク末尾で解放し、次のチャンク先頭で押し直す修飾キー
+        while start < len(events):
+            limit = min(len(events), start + max(1, self.chunk_size - 2 * len(carried)))
+            held: list[tuple[int, int]] = [(vk, 0) for vk in carried]
+            idle_end: Optional[int] = None
+            modifier_end: Optional[int] = None
+            modifier_held: list[int] = []
+            end = len(events)
+            for i in range(start, len(events)):
+                event = events[i]
+                if isinstance(event, KeyEvent):
+                    key = (event.vk, 0) if event.vk else (0, event.scan)
+                    if event.is_up:
+                        if key in held:
+                            held.remove(key)
+                    elif key not in held:
+                        held.append(key)
+                if not held:
+                    idle_end = i + 1
+                elif all(vk in _MODIFIER_VKS and not scan for vk, scan in held):
+                    modifier_end = i + 1
+                    modifier_held = [vk for vk, _ in held]
+                # 上限に達したら区切れる位置が見つかった時点で止める（見つからなければ上限を超えて探す）
+                if i + 1 >= limit and (idle_end is not None or modifier_end is not None):
+                    end = idle_end if idle_end is not None else modifier_end
+                    break
+            release = modifier_held if end < len(events) and end != idle_end else []
+            chunk = [KeyEvent(vk, 0, 0) for vk in carried] + list(events[start:end])
+            chunk.extend(KeyEvent(vk, 0, _KEYEVENTF_KEYUP) for vk in reversed(release))
+            sent += self.backend.send(chunk)
+            carried = release
+            start = end
+        return sent
+
+    def type_text(self, text: str) -> int:
+        return self.send(self.compile_text(text))
+
+    def send_keys(self, keys: str) -> int:
+        return self.send(self.compile_keys(keys))
+
+
+# -----------------------------
+# 入力マクロ
+# -----------------------------
+_MOUSEEVENTF_MOVE = 0x0001
+_MOUSEEVENTF_LEFTDOWN = 0x0002
+_MOUSEEVENTF_LEFTUP = 0x0004
+_MOUSEEVENTF_RIGHTDOWN = 0x0008
+_MOUSEEVENTF_RIGHTUP = 0x0010
+_MOUSEEVENTF_VIRTUALDESK = 0x4000
+_MOUSEEVENTF_ABSOLUTE = 0x8000
+_SM_XVIRTUALSCREEN, _SM_YVIRTUALSCREEN, _SM_CXVIRTUALSCREEN, _SM_CYVIRTUALSCREEN = 76, 77, 78, 79
+
+_MACRO_CLICK_BUTTONS = ("left", "right", "double")
+_MACRO_CONDITIONS = ("url_changed", "title_changed", "url_contains", "title_contains", "ready")
+_MACRO_MAX_STEPS = 500
+_MACRO_MAX_WAIT_S = 60.0  # wait / wait_for 1手順あたりの上限秒数
+
+
+@dataclass(frozen=True)
+class _MacroClick:
+    """ウィンドウ相対座標のクリック（実行時にスクリーン座標の MOUSEINPUT へ展開する）。"""
+
+    x: int
+    y: int
+    button: str = "left"
+
+
+@dataclass(frozen=True)
+class _MacroOp:
+    kind: Literal["input", "paste", "sleep", "wait_for"]
+    items: tuple[Any, ...] = ()
+    text: str = ""
+    seconds: float = 0.0
+    condition: str = ""
+    value: Optional[str] = None
+    step: int = 0
+
+
+def _mouse_click_inputs(screen_x: int, screen_y: int, button: str) -> list[_MOUSEINPUT]:
+    """スクリーン座標へ移動してクリックする MOUSEINPUT 列（仮想デスクトップ全体で正規化）。"""
+    user32 = ctypes.windll.user32
+    left = user32.GetSystemMetrics(_SM_XVIRTUALSCREEN)
+    top = user32.GetSystemMetrics(_SM_YVIRTUALSCREEN)
+    width = max(1, user32.GetSystemMetrics(_SM_CXVIRTUALSCREEN) - 1)
+    height = max(1, user32.GetSystemMetrics(_SM_CYVIRTUALSCREEN) - 1)
+    nx = int(round((screen_x - left) * 65535 / width))
+    ny = int(round((screen_y - top) * 65535 / height))
+    move = _MOUSEINPUT(nx, ny, 0, _MOUSEEVENTF_MOVE | _MOUSEEVENTF_ABSOLUTE | _MOUSEEVENTF_VIRTUALDESK, 0, 0)
+    if button == "right":
+        down_up = [_MOUSEEVENTF_RIGHTDOWN, _MOUSEEVENTF_RIGHTUP]
+    else:
+        down_up = [_MOUSEEVENTF_LEFTDOWN, _MOUSEEVENTF_LEFTUP] * (2 if button == "double" else 1)
+    return [move] + [_MOUSEINPUT(0, 0, 0, flag, 0, 0) for flag in down_up]
+
+
+class InputMacro:
+    """
+    キー/テキスト/クリック/待機の手順を検証済みの実行列にコンパイルしたもの。
+
+    連続する入力系の手順（keys / text / click）は1つの入力バッチにまとめ、実行時に
+    SendInput へ一度に流す。待機系（wait / wait_for）と paste はバッチの区切りになる。
+
+    手順の形式（dict）:
+      {"type": "keys", "keys": "^l"}                 send_keys 形式のキーシーケンス
+      {"type": "text", "text": "..."}                 文字列をそのまま入力
+      {"type": "paste", "text": "..."}                クリップボード経由で貼り付け
+      {"type": "click", "x": 10, "y": 20, "button": "left|right|double"}  ウィンドウ相対座標
+      {"type": "wait", "seconds": 0.2}                固定待機
+      {"type": "wait_for", "condition": "url_changed|title_changed|url_contains|title_contains|ready",
+       "value": "...", "timeout_s": 5.0}             条件待機（changed はマクロ開始時点との比較）
+
+    wait の seconds と wait_for の timeout_s は 0〜_MACRO_MAX_WAIT_S 秒に制限する。
+    """
+
+    def __init__(self, ops: list[_MacroOp], step_count: int):
+        self.ops = ops
+        self.step_count = step_count
+
+    @property
+    def batch_count(self) -> int:
+        return sum(1 for op in self.ops if op.kind == "input")
+
+    @classmethod
+    def compile(cls, steps: Iterable[dict[str, Any]], *, keyboard: KeyboardEngine) -> "InputMacro":
+        steps = list(steps)
+        if not steps:
+            raise InvalidInputError("input_macro: steps must not be empty", code="invalid_macro")
+        if len(steps) > _MACRO_MAX_STEPS:
+            raise InvalidInputError(
+                f"input_macro: too many steps ({len(steps)} > {_MACRO_MAX_STEPS})", code="invalid_macro"
+            )
+
+        ops: list[_MacroOp] = []
+        pending: list[Any] = []
+        pending_step = 0
+
+        def flush() -> None:
+            nonlocal pending
+            if pending:
+                ops.append(_MacroOp("input", items=tuple(pending), step=pending_step))
+                pending = []
+
+        for number, step in enumerate(steps):
+            def invalid(reason: str) -> InvalidInputError:
+                return InvalidInputError(
+                    f"input_macro: step {number}: {reason}", code="invalid_macro", data={"step": number}
+                )
+
+            if not isinstance(step, dict):
+                raise invalid("each step must be an object")
+            kind = step.get("type")
+            try:
+                if kind in ("keys", "text", "click"):
+                    if not pending:
+                        pending_step = number
+                    if kind == "keys":
+                        pending.extend(keyboard.compile_keys(str(step["keys"])))
+                    elif kind == "text":
+                        pending.extend(keyboard.compile_text(str(step["text"])))
+                    else:
+                        button = step.get("button", "left")
+                        if button not in _MACRO_CLICK_BUTTONS:
+                            raise invalid(f"button must be one of {list(_MACRO_CLICK_BUTTONS)}")
+                        pending.append(_MacroClick(int(step["x"]), int(step["y"]), button))
+                elif kind == "paste":
+                    flush()
+                    ops.append(_MacroOp("paste", text=str(step["text"]), step=number))
+                elif kind == "wait":
+                    flush()
+                    seconds = float(step["seconds"])
+                    if not 0 <= seconds <= _MACRO_MAX_WAIT_S:
+                        raise invalid(f"seconds must be between 0 and {_MACRO_MAX_WAIT_S:g}")
+                    ops.append(_MacroOp("sleep", seconds=seconds, step=number))
+                elif kind == "wait_for":
+                    flush()
+                    condition = step.get("condition")
+                    if condition not in _MACRO_CONDITIONS:
+                        raise invalid(f"condition must be one of {list(_MACRO_CONDITIONS)}")
+                    value = step.get("value")
+                    if condition.endswith("_contains") and not value:
+                        raise invalid(f"condition '{condition}' requires value")
+                    timeout_s = float(step.get("timeout_s", 5.0))
+                    if not 0 <= timeout_s <= _MACRO_MAX_WAIT_S:
+                        raise invalid(f"timeout_s must be between 0 and {_MACRO_MAX_WAIT_S:g}")
+                    ops.append(
+                        _MacroOp(
+                            "wait_for",
+                            condition=condition,
+                            value=None if value is None else str(value),
+                            seconds=timeout_s,
+                            step=number,
+                        )
+                    )
+                else:
+                    raise invalid(f"unknown step type: {kind!r}")
+            except KeyError as e:
+                raise invalid(f"missing field {e}") from e
+            except (TypeError, ValueError) as e:
+                raise invalid(str(e)) from e
+            except InvalidInputError as e:
+                if e.code == "invalid_macro":
+                    raise
+                raise invalid(str(e)) from e
+        flush()
+        return cls(ops, len(steps))
+
+
+# -----------------------------
+# バックグラウンド入力（前面化しない操作）
+# -----------------------------
+InputMode = Literal["foreground", "background"]
+_INPUT_MODES: tuple[str, ...] = ("foreground", "background")
+_RENDER_WIDGET_CLASS = "Chrome_RenderWidgetHostHWND"
+
+
+def _find_render_widget(hwnd: int) -> Optional[int]:
+    """Chrome/Edge のページ描画用子ウィンドウ（キー入力の受け口）を探す。"""
+    found: list[int] = []
+
+    def _visit(child: int, _: Any) -> bool:
+        if win32gui.GetClassName(child) == _RENDER_WIDGET_CLASS:
+            found.append(child)
+            return False
+        return True
+
+    try:
+        win32gui.EnumChildWindows(hwnd, _visit, None)
+    except Exception:
+        # コールバックで列挙を打ち切ると pywin32 は例外を送出する
+        pass
+    return found[0] if found else None
+
+
+def _post_text(hwnd: int, text: str) -> int:
+    """
+    WM_CHAR をページ描画ウィンドウへ PostMessage して文字を送る（前面化しない）。
+
+    描画ウィンドウ内でフォーカスを持つ要素に入力される。改行は Enter として送る。
+    """
+    target = _find_render_widget(hwnd)
+    if target is None:
+        raise ActionFailedError("post_text: render widget window not found", data={"hwnd": hwnd})
+    sent = 0
+    for ch in text.replace("\r\n", "\n"):
+        if ch == "\n":
+            win32gui.PostMessage(target, win32con.WM_KEYDOWN, win32con.VK_RETURN, 0)
+            win32gui.PostMessage(target, win32con.WM_CHAR, 0x0D, 0)
+            win32gui.PostMessage(target, win32con.WM_KEYUP, win32con.VK_RETURN, 0xC0000000)
+            sent += 1
+            continue
+        data = ch.encode("utf-16-le")
+        for i in range(0, len(data), 2):
+            win32gui.PostMessage(target, win32con.WM_CHAR, int.from_bytes(data[i:i + 2], "little"), 0)
+        sent += 1
+    return sent
+
+
+def _activate_by_pattern(element) -> str:
+    """Invoke → SelectionItem → Toggle → ExpandCollapse の順に、使えるパターンで要素を操作する。"""
+    errors = []
+    for name, action in (
+        ("invoke", lambda: element.iface_invoke.Invoke()),
+        ("select", lambda: element.iface_selection_item.Select()),
+        ("toggle", lambda: element.iface_toggle.Toggle()),
+        ("expand", lambda: element.iface_expand_collapse.Expand()),
+    ):
+        try:
+            action()
+            return name
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise ActionFailedError("activate_by_pattern: no usable pattern (" + "; ".join(errors) + ")")
+
+
+# -----------------------------
+# UIA CacheRequest による一括取得
+# -----------------------------
+# 論理名 -> (UIA プロパティID名, Cached* 属性名。None は GetCachedPropertyValue で読む)
+_UIA_CACHE_PROPERTIES: dict[str, tuple[str, Optional[str]]] = {
+    "control_type": ("UIA_ControlTypePropertyId", "CachedControlType"),
+    "is_offscreen": ("UIA_IsOffscreenPropertyId", "CachedIsOffscreen"),
+    "name": ("UIA_NamePropertyId", "CachedName"),
+    "automation_id": ("UIA_AutomationIdPropertyId", "CachedAutomationId"),
+    "bounding_rectangle": ("UIA_BoundingRectanglePropertyId", "CachedBoundingRectangle"),
+    "runtime_id": ("UIA_RuntimeIdPropertyId", None),
+    "value": ("UIA_ValueValuePropertyId", None),
+}
+
+
+def _find_all_build_cache(
+    root_element,
+    properties: Iterable[str],
+    *,
+    scope: str = "descendants",
+    condition=None,
+) -> list[Any]:
+    """
+    FindAllBuildCache で指定プロパティをキャッシュ付きで一括取得する。
+
+    要素ごとに COM 往復する代わりに 1 回のクロスプロセス呼び出しで済むため、
+    大量の descendants を集計する用途で使う。戻り値は IUIAutomationElement のリスト。
+    condition 省略時は全要素（TrueCondition）。
+    """
+    iuia = IUIA()
+    request = iuia.iuia.CreateCacheRequest()
+    for prop in properties:
+        prop_id_name, _ = _UIA_CACHE_PROPERTIES[prop]
+        request.AddProperty(getattr(iuia.UIA_dll, prop_id_name))
+
+    if condition is None:
+        condition = iuia.true_condition
+    array = root_element.FindAllBuildCache(iuia.tree_scope[scope], condition, request)
+    if not array:
+        return []
+    return [array.GetElement(i) for i in range(array.Length)]
+
+
+def _read_cached_property(element, prop: str, default: Any = None) -> Any:
+    """_find_all_build_cache で取得した要素からキャッシュ済みプロパティを読む。"""
+    prop_id_name, attr = _UIA_CACHE_PROPERTIES[prop]
+    try:
+        if attr is None:
+            value = element.GetCachedPropertyValue(getattr(IUIA().UIA_dll, prop_id_name))
+        else:
+            value = getattr(element, attr)
+    except Exception:
+        return default
+    if prop == "runtime_id":
+        return _normalize_runtime_id(value) or default
+    if prop == "control_type":
+        return IUIA().known_control_type_ids.get(value, "Unknown")
+    if prop == "bounding_rectangle":
+        return (int(value.left), int(value.top), int(value.right), int(value.bottom))
+    return value
+
+
+def _normalize_runtime_id(value: Any) -> Optional[tuple[int, ...]]:
+    """RuntimeId（COM 配列/タプル）を辞書キーに使える int タプルへ正規化する。"""
+    if value is None:
+        return None
+    try:
+        runtime_id = tuple(int(v) for v in value)
+    except TypeError:
+        return None
+    return runtime_id or None
+
+
+def _build_cached_subtree(root_element, properties: Iterable[str]):
+    """
+    root 以下のサブツリーを指定プロパティ付きでキャッシュし、キャッシュ済み root を返す。
+    親子関係は GetCachedChildren() でプロセス内で辿れる（FindAll と同じく Raw ビュー）。
+    """
+    iuia = IUIA()
+    request = iuia.iuia.CreateCacheRequest()
+    for prop in properties:
+        prop_id_name, _ = _UIA_CACHE_PROPERTIES[prop]
+        request.AddProperty(getattr(iuia.UIA_dll, prop_id_name))
+    request.TreeScope = iuia.tree_scope["subtree"]
+    request.TreeFilter = iuia.true_condition
+    return root_element.BuildUpdatedCache(request)
+
+
+def _cached_children(element) -> list[Any]:
+    try:
+        array = element.GetCachedChildren()
+    except Exception:
+        return []
+    if not array:
+        return []
+    return [array.GetElement(i) for i in range(array.Length)]
+
+
+def _sample_stride(total: int, sample_size: Optional[int]) -> int:
+    """total 件から sample_size 件程度を等間隔で取るためのストライド（1=全件）。"""
+    if not sample_size or sample_size <= 0 or total <= sample_size:
+        return 1
+    return max(1, -(-total // int(sample_size)))
+
+
+def _collect_control_type_stats(
+    root_element,
+    *,
+    sample_size: Optional[int] = None,
+) -> dict[str, object]:
+    """
+    ControlType / IsOffscreen を一括取得し、可視/不可視別の種別ヒストグラムを作る。
+
+    sample_size を指定すると等間隔サンプリングで集計し、件数は total に合わせて外挿する。
+    """
+    elements = _find_all_build_cache(root_element, ("control_type", "is_offscreen"))
+    total = len(elements)
+    stride = _sample_stride(total, sample_size)
+    sampled = elements[::stride]
+    scale = (total / len(sampled)) if sampled else 0.0
+
+    visible_map: dict[str, int] = {}
+    invisible_map: dict[str, int] = {}
+    for element in sampled:
+        control_type = str(_read_cached_property(element, "control_type", "Unknown"))
+        offscreen = bool(_read_cached_property(element, "is_offscreen", True))
+        target = invisible_map if offscreen else visible_map
+        target[control_type] = target.get(control_type, 0) + 1
+
+    if stride > 1:
+        visible_map = {k: int(round(v * scale)) for k, v in visible_map.items()}
+        invisible_map = {k: int(round(v * scale)) for k, v in invisible_map.items()}
+
+    visible_total = sum(visible_map.values())
+    return {
+        "total": total,
+        "visible_total": visible_total,
+        "invisible_total": max(0, total - visible_total),
+        "visible_by_control_type": visible_map,
+        "invisible_by_control_type": invisible_map,
+        "method": "cache_request",
+        "sampled": stride > 1,
+        "sample_count": len(sampled),
+    }
+
+
+def _make_property_changed_handler(callback: Callable[[int], None]):
+    """IUIAutomationPropertyChangedEventHandler を実装した COM オブジェクトを作る。"""
+    import comtypes
+
+    interface = IUIA().ui_automation_client.IUIAutomationPropertyChangedEventHandler
+
+    class _PropertyChangedHandler(comtypes.COMObject):
+        _com_interfaces_ = [interface]
+
+        def HandlePropertyChangedEvent(self, sender, property_id, new_value):
+            # UIA のイベントスレッドから呼ばれるため、ここでは記録だけ行う
+            try:
+                callback(int(property_id))
+            except Exception:
+                pass
+
+    return _PropertyChangedHandler()
+
+
+class _PropertyChangeWatcher:
+    """
+    UIA の PropertyChanged イベントを購読し、変化があれば待機側を起こす。
+
+    登録に失敗した場合（COM 未対応環境など）は active=False のままとなり、
+    呼び出し側はポーリングへフォールバックする。with 文で登録/解除する。
+    watch() で監視対象の要素を追加でき、1つのハンドラを各要素に登録する。
+    """
+
+    def __init__(
+        self,
+        element,
+        properties: Iterable[str] = ("name", "value"),
+        *,
+        scope: str = "subtree",
+    ):
+        self._targets: list[tuple[Any, str]] = [(element, scope)] if element else []
+        self._properties = tuple(properties)
+        self._property_ids: list[int] = []
+        self._registered: list[Any] = []
+        self._handler = None
+        self._signal = WaitSignal()
+        self._lock = threading.Lock()
+        self.active = False
+        self.event_count = 0
+        self.last_event_at: Optional[float] = None
+
+    def _on_event(self, property_id: int) -> None:
+        with self._lock:
+            self.event_count += 1
+            self.last_event_at = time.monotonic()
+        self._signal.notify()
+
+    def _register(self, element, scope: str) -> bool:
+        try:
+            iuia = IUIA()
+            iuia.iuia.AddPropertyChangedEventHandler(
+                element, iuia.tree_scope[scope], None, self._handler, self._property_ids
+            )
+        except Exception as e:
+            logger.debug(f"PropertyChanged イベント登録に失敗（ポーリングで代替）: {e}")
+            return False
+        self._registered.append(element)
+        return True
+
+    def start(self) -> bool:
+        if self.active or not self._targets:
+            return self.active
+        try:
+            iuia = IUIA()
+            self._property_ids = [
+                getattr(iuia.UIA_dll, _UIA_CACHE_PROPERTIES[prop][0]) for prop in self._properties
+            ]
+            self._handler = _make_property_changed_handler(self._on_event)
+        except Exception as e:
+            logger.debug(f"PropertyChanged イベント登録に失敗（ポーリングで代替）: {e}")
+            return False
+        for element, scope in self._targets:
+            self._register(element, scope)
+        self.active = bool(self._registered)
+        if not self.active:
+            self._handler = None
+        return self.active
+
+    def watch(self, element, scope: str = "subtree") -> bool:
+        """監視対象を追加する（購読中ならその場で登録する）。"""
+        if not element:
+            return False
+        self._targets.append((element, scope))
+        return self._register(element, scope) if self.active else False
+
+    def stop(self) -> None:
+        if not self.active:
+            return
+        for element in self._registered:
+            try:
+                IUIA().iuia.RemovePropertyChangedEventHandler(element, self._handler)
+            except Exception as e:
+                logger.debug(f"PropertyChanged イベント解除に失敗: {e}")
+        self._registered = []
+        self._handler = None
+        self.active = False
+
+    def wait(self, timeout_s: float) -> bool:
+        """イベントが届くか timeout_s 経過するまで待つ。イベントで起きた場合 True。"""
+        return self._signal.wait(timeout_s)
+
+    def quiet_for(self, since: float) -> float:
+        """最後のイベント（無ければ since）からの経過秒数。"""
+        with self._lock:
+            last = self.last_event_at
+        return time.monotonic() - max(since, last or since)
+
+    def __enter__(self) -> "_PropertyChangeWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+NavigateWait = Literal["none", "committed", "title_changed", "content_stable"]
+_NAVIGATE_WAIT_STAGES: dict[str, int] = {
+    "none": 0,
+    "committed": 1,
+    "title_changed": 2,
+    "content_stable": 3,
+}
+
+
+def _document_shape(document) -> tuple[int, Optional[float]]:
+    """
+    Document 要素の軽量な形状: (直下の子要素数, 縦方向の表示割合)。
+
+    子孫をすべて列挙せずに、要素の追加（子要素数）とコンテンツの伸び縮み（ScrollPattern の
+    VerticalViewSize）を捉える。ScrollPattern を持たなければ表示割合は None。
+    """
+    iuia = IUIA()
+    children = document.FindAll(iuia.tree_scope["children"], iuia.true_condition)
+    count = int(children.Length) if children else 0
+    try:
+        view_size: Optional[float] = round(float(get_elem_interface(document, "Scroll").CurrentVerticalViewSize), 2)
+    except Exception:
+        view_size = None
+    return (count, view_size)
+
+
+def _image_fingerprint(img: Image.Image, size: int = 32) -> str:
+    """縮小グレースケール画像のダイジェスト（見た目がほぼ同じなら同じ値になりやすい）。"""
+    thumb = img.convert("L").resize((size, size))
+    # 下位ビットを落としてアンチエイリアス等の微小なノイズを吸収する
+    data = bytes(v & 0xF0 for v in thumb.tobytes())
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+ReadySignal = Literal["title", "elements", "screenshot"]
+_READY_SIGNALS: tuple[str, ...] = ("title", "elements", "screenshot")
+
+
+class _ElementGeometry:
+    """
+    スキャン時に取得した要素矩形とオフスクリーン状態の列指向スナップショット。
+
+    rects は (left, top, right, bottom) の N×4 配列。numpy があればベクトル演算、
+    無ければ同じ判定を純Pythonで行う。indices[i] が current_elements のキーに対応する。
+    """
+
+    def __init__(
+        self,
+        indices: Iterable[int],
+        rects: Iterable[tuple[int, int, int, int]],
+        offscreen: Iterable[bool],
+    ):
+        self.indices = list(indices)
+        self._positions = {index: pos for pos, index in enumerate(self.indices)}
+        if np is not None:
+            self.rects = np.asarray(list(rects), dtype=np.int32).reshape(-1, 4)
+            self.offscreen = np.asarray(list(offscreen), dtype=bool)
+        else:
+            self.rects = [tuple(r) for r in rects]
+            self.offscreen = [bool(o) for o in offscreen]
+        self._spatial_index: Optional[_SpatialGrid] = None
+
+    @classmethod
+    def empty(cls) -> "_ElementGeometry":
+        return cls([], [], [])
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __contains__(self, index: object) -> bool:
+        return index in self._positions
+
+    def rect_of(self, index: int) -> Optional[Rect]:
+        pos = self._positions.get(index)
+        if pos is None:
+            return None
+        left, top, right, bottom = (int(v) for v in self.rects[pos])
+        return Rect(left, top, right, bottom)
+
+    def spatial_index(self) -> "_SpatialGrid":
+        """矩形の一様グリッド索引（初回呼び出し時に構築してキャッシュ）。"""
+        if self._spatial_index is None:
+            self._spatial_index = _SpatialGrid(
+                self.indices,
+                [tuple(int(v) for v in r) for r in self.rects],
+            )
+        return self._spatial_index
+
+    def remap(self, mapping: dict[int, int]) -> "_ElementGeometry":
+        """旧インデックス -> 新インデックスの対応で部分集合を作る（対応の無い要素は除外）。"""
+        pairs = [(new, self._positions[old]) for old, new in mapping.items() if old in self._positions]
+        return _ElementGeometry(
+            (new for new, _ in pairs),
+            (tuple(int(v) for v in self.rects[pos]) for _, pos in pairs),
+            (bool(self.offscreen[pos]) for _, pos in pairs),
+        )
+
+    def merged(self, other: "_ElementGeometry") -> "_ElementGeometry":
+        rects = [tuple(int(v) for v in r) for r in self.rects] + [tuple(int(v) for v in r) for r in other.rects]
+        offscreen = [bool(o) for o in self.offscreen] + [bool(o) for o in other.offscreen]
+        return _ElementGeometry(self.indices + other.indices, rects, offscreen)
+
+    def passing(
+        self,
+        *,
+        min_width: Optional[int] = None,
+        min_height: Optional[int] = None,
+        only_visible: bool = False,
+        viewport: Optional[Rect] = None,
+    ) -> set[int]:
+        """
+        幾何条件を満たすインデックス集合を返す。
+        - min_width / min_height : 幅/高さがこの値より大きい（従来の rectangle() 判定と同じ）
+        - only_visible           : IsOffscreen が False
+        - viewport               : viewport 矩形と交差する
+        """
+        if not self.indices:
+            return set()
+
+        if np is not None:
+            rects = self.rects
+            widths = rects[:, 2] - rects[:, 0]
+            heights = rects[:, 3] - rects[:, 1]
+            mask = np.ones(len(self.indices), dtype=bool)
+            if min_width is not None:
+                mask &= widths > int(min_width)
+            if min_height is not None:
+                mask &= heights > int(min_height)
+            if only_visible:
+                mask &= ~self.offscreen
+            if viewport is not None:
+                mask &= (
+                    (rects[:, 0] < viewport.right)
+                    & (rects[:, 2] > viewport.left)
+                    & (rects[:, 1] < viewport.bottom)
+                    & (rects[:, 3] > viewport.top)
+                )
+            return {self.indices[pos] for pos in np.flatnonzero(mask)}
+
+        result: set[int] = set()
+        for pos, (left, top, right, bottom) in enumerate(self.rects):
+            if min_width is not None and right - left <= int(min_width):
+                continue
+            if min_height is not None and bottom - top <= int(min_height):
+                continue
+            if only_visible and self.offscreen[pos]:
+                continue
+            if viewport is not None and not (
+                left < viewport.right
+                and right > viewport.left
+                and top < viewport.bottom
+                and bottom > viewport.top
+            ):
+                continue
+            result.add(self.indices[pos])
+        return result
+
+
+class _SpatialGrid:
+    """
+    要素矩形の一様グリッド索引。
+
+    各矩形を cell_size 四方のセルに登録し、点/領域クエリは該当セルの候補だけを調べる。
+    max_cells を超えて広がる大きな矩形（ページ全体のコンテナ等）はセルに登録せず別リストで扱う。
+    """
+
+    max_rank_depth = 512
+
+    def __init__(
+        self,
+        indices: list[int],
+        rects: list[tuple[int, int, int, int]],
+        *,
+        cell_size: int = 64,
+        max_cells: int = 256,
+    ):
+        self.cell_size = max(1, int(cell_size))
+        self._rects: dict[int, tuple[int, int, int, int]] = {}
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self._large: list[int] = []
+
+        for index, rect in zip(indices, rects):
+            left, top, right, bottom = rect
+            if right <= left or bottom <= top:
+                continue
+            self._rects[index] = rect
+            cx0, cy0, cx1, cy1 = self._cell_range(left, top, right, bottom)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > max_cells:
+                self._large.append(index)
+                continue
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self._cells.setdefault((cx, cy), []).append(index)
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def _cell_range(self, left: int, top: int, right: int, bottom: int) -> tuple[int, int, int, int]:
+        size = self.cell_size
+        # right/bottom は排他的な境界なので -1 したピクセルが属するセルまで
+        return left // size, top // size, (right - 1) // size, (bottom - 1) // size
+
+    def _rank(self, hits: list[int]) -> list[int]:
+        """深さ（他のヒット矩形に含まれる数）降順、面積昇順で並べる。"""
+        rects = self._rects
+
+        def contains(outer: tuple[int, int, int, int], inner: tuple[int, int, int, int]) -> bool:
+            return (
+                outer[0] <= inner[0]
+                and outer[1] <= inner[1]
+                and outer[2] >= inner[2]
+                and outer[3] >= inner[3]
+            )
+
+        def area(index: int) -> int:
+            left, top, right, bottom = rects[index]
+            return (right - left) * (bottom - top)
+
+        if len(hits) > self.max_rank_depth:
+            # 包含判定は O(n^2) なので多数ヒット時は面積のみで並べる
+            return sorted(hits, key=lambda index: (area(index), index))
+
+        depth = {
+            index: sum(1 for other in hits if other != index and contains(rects[other], rects[index]))
+            for index in hits
+        }
+        return sorted(hits, key=lambda index: (-depth[index], area(index), index))
+
+    def at_point(self, x: int, y: int) -> list[int]:
+        """点 (x, y) を含む要素（最も深い/小さい要素が先頭）。"""
+        size = self.cell_size
+        candidates = self._cells.get((x // size, y // size), []) + self._large
+        hits = [
+            index
+            for index in candidates
+            if self._rects[index][0] <= x < self._rects[index][2]
+            and self._rects[index][1] <= y < self._rects[index][3]
+        ]
+        return self._rank(hits)
+
+    def in_region(
+        self,
+        left: int,
+        top: int,
+        right: int,
+        bottom: int,
+        *,
+        mode: Literal["inside", "intersect"] = "inside",
+    ) -> list[int]:
+        """領域内（inside=完全に含まれる / intersect=交差する）の要素。"""
+        if right <= left or bottom <= top:
+            return []
+        cx0, cy0, cx1, cy1 = self._cell_range(left, top, right, bottom)
+        seen: set[int] = set()
+        candidates: list[int] = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for index in self._cells.get((cx, cy), ()):
+                    if index not in seen:
+                        seen.add(index)
+                        candidates.append(index)
+        candidates.extend(index for index in self._large if index not in seen)
+
+        hits: list[int] = []
+        for index in candidates:
+            r_left, r_top, r_right, r_bottom = self._rects[index]
+            if mode == "inside":
+                ok = left <= r_left and top <= r_top and r_right <= right and r_bottom <= bottom
+            else:
+                ok = r_left < right and r_right > left and r_top < bottom and r_bottom > top
+            if ok:
+                hits.append(index)
+        return self._rank(hits)
+
+
+# omit_no_name=True でも名前なしのまま残す（"<Type>" 表示にする）コントロール種別
+_UNNAMED_ALLOWED_TYPES = (
+    "CheckBox",
+    "Button",
+    "RadioButton",
+    "ComboBox",
+    "ListBox",
+    "Edit",
+    "Slider",
+    "Spinner",
+    "TabItem",
+    "ToggleButton",
+    "SplitButton",
+    "MenuItem",
+    "Link",
+    "Hyperlink",
+    "Separator",
+)
+
+
+def _fetch_friendly_class(wrapper) -> str:
+    try:
+        return wrapper.friendly_class_name()
+    except Exception:
+        return wrapper.element_info.control_type
+
+
+def _fetch_automation_id(wrapper) -> str:
+    aid = wrapper.element_info.automation_id
+    return "" if aid is None else str(aid)
+
+
+def _fetch_rectangle(wrapper) -> Rect:
+    rect = wrapper.rectangle()
+    return Rect(int(rect.left), int(rect.top), int(rect.right), int(rect.bottom))
+
+
+# window_text() が UIA Name ではなく TextPattern の本文を返す（=キャッシュした Name で代用できない）種類
+_TEXT_NAME_CONTROL_TYPES = frozenset({"Edit", "Document"})
+
+
+class ElementProxy:
+    """
+    pywinauto ラッパーの属性を遅延取得し、TTL 付きでメモ化するプロキシ。
+
+    get("name") 等は初回のみ COM 経由で取得し、ttl_s 秒以内はキャッシュを返す
+    （ttl_s=None で無期限、0 でメモ化しない）。取得失敗は default を返しキャッシュしない。
+    get 以外の属性/メソッド（invoke, click_input 等）は元のラッパーに委譲する。
+    """
+
+    _FETCHERS: dict[str, Callable[[Any], Any]] = {
+        "name": lambda w: w.window_text() or "",
+        "friendly_class": _fetch_friendly_class,
+        "control_type": lambda w: w.element_info.control_type,
+        "automation_id": _fetch_automation_id,
+        "value": lambda w: w.get_value(),
+        "rectangle": _fetch_rectangle,
+        "visible": lambda w: bool(w.is_visible()),
+        "enabled": lambda w: bool(w.is_enabled()),
+        "focusable": lambda w: bool(w.is_keyboard_focusable()),
+        "runtime_id": lambda w: _normalize_runtime_id(w.element_info.runtime_id),
+    }
+
+    def __init__(
+        self,
+        wrapper: Any,
+        *,
+        ttl_s: Optional[float] = 2.0,
+        seed: Optional[dict[str, Any]] = None,
+    ):
+        self.wrapper = wrapper
+        self.ttl_s = ttl_s
+        self._memo: dict[str, tuple[Any, float]] = {}
+        if seed:
+            now = time.monotonic()
+            for prop, value in seed.items():
+                if prop in self._FETCHERS and value is not None:
+                    self._memo[prop] = (value, now)
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        if self.ttl_s is None:
+            return True
+        return (time.monotonic() - fetched_at) <= self.ttl_s
+
+    def get(self, prop: str, default: Any = None) -> Any:
+        fetcher = self._FETCHERS.get(prop)
+        if fetcher is None:
+            raise InvalidInputError(
+                f"ElementProxy.get: unknown property: {prop!r} (supported: {sorted(self._FETCHERS)})",
+                code="invalid_property",
+            )
+
+        cached = self._memo.get(prop)
+        if cached is not None and self._is_fresh(cached[1]):
+            return cached[0]
+
+        try:
+            value = fetcher(self.wrapper)
+        except Exception:
+            self._memo.pop(prop, None)
+            return default
+
+        if self.ttl_s != 0:
+            self._memo[prop] = (value, time.monotonic())
+        return value
+
+    def invalidate(self, *props: str) -> None:
+        """メモを破棄する（引数なしで全プロパティ）。要素に作用する操作の後に呼ぶ。"""
+        if not props:
+            self._memo.clear()
+            return
+        for prop in props:
+            self._memo.pop(prop, None)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("wrapper", "_memo", "ttl_s"):
+            raise AttributeError(name)
+        return getattr(self.wrapper, name)
+
+    def __repr__(self) -> str:
+        return f"ElementProxy({self.wrapper!r})"
+
+
+# -----------------------------
+# アクセシビリティツリーの圧縮アウトライン
+# -----------------------------
+# 文字数予算の上限超過時に優先して残す操作可能なコントロール種別
+_INTERACTIVE_TYPES = frozenset({
+    "Button",
+    "CheckBox",
+    "ComboBox",
+    "DataItem",
+    "Edit",
+    "Hyperlink",
+    "Link",
+    "ListItem",
+    "MenuItem",
+    "RadioButton",
+    "Slider",
+    "Spinner",
+    "SplitButton",
+    "TabItem",
+    "ToggleButton",
+    "TreeItem",
+})
+
+# max_tokens -> 文字数換算の目安（日本語混じりを考慮して控えめに見積もる）
+_CHARS_PER_TOKEN = 3
+
+
+@dataclass
+class _OutlineNode:
+    control_type: str
+    name: str = ""
+    automation_id: str = ""
+    index: Optional[int] = None
+    children: list["_OutlineNode"] = field(default_factory=list)
+    signature: int = 0
+
+    @property
+    def interactive(self) -> bool:
+        return self.control_type in _INTERACTIVE_TYPES
+
+
+@dataclass
+class _OutlineLine:
+    text: str
+    priority: int
+    parent: Optional[int]
+
+
+def _outline_from_cached_tree(cached_root, index_by_runtime_id: dict[tuple[int, ...], int]) -> _OutlineNode:
+    """_build_cached_subtree の結果を _OutlineNode の木に変換する。"""
+
+    def make(element) -> _OutlineNode:
+        runtime_id = _read_cached_property(element, "runtime_id")
+        return _OutlineNode(
+            control_type=str(_read_cached_property(element, "control_type", "Unknown")),
+            name=str(_read_cached_property(element, "name", "") or ""),
+            automation_id=str(_read_cached_property(element, "automation_id", "") or ""),
+            index=index_by_runtime_id.get(runtime_id) if runtime_id else None,
+        )
+
+    root_node = make(cached_root)
+    stack = [(cached_root, root_node)]
+    while stack:
+        element, node = stack.pop()
+        for child in _cached_children(element):
+            child_node = make(child)
+            node.children.append(child_node)
+            stack.append((child, child_node))
+    return root_node
+
+
+def _prune_outline(node: _OutlineNode) -> Optional[_OutlineNode]:
+    """current_elements に対応する要素を含まない枝を落とす。"""
+    node.children = [kept for kept in (_prune_outline(c) for c in node.children) if kept is not None]
+    if node.index is None and not node.children:
+        return None
+    return node
+
+
+def _collapse_outline(node: _OutlineNode) -> list[_OutlineNode]:
+    """
+    名前なし・非操作系の入れ物を畳む。子が 0/1 個なら子で置き換える（空なら消える）。
+    index を持つノード（current_elements の要素）は参照できるよう畳まない。
+    戻り値は node を置き換えるノード列。signature も同時に計算する。
+    """
+    node.children = [c for child in node.children for c in _collapse_outline(child)]
+    if node.index is None and not node.name and not node.interactive and len(node.children) <= 1:
+        return node.children
+    node.signature = hash((
+        node.control_type,
+        node.name,
+        node.automation_id,
+        tuple(child.signature for child in node.children),
+    ))
+    return [node]
+
+
+def _format_outline_line(node: _OutlineNode, depth: int, max_name_len: int, same: list[_OutlineNode]) -> str:
+    name = node.name.replace("\r", " ").replace("\n", " ").strip()
+    if max_name_len and len(name) > max_name_len:
+        name = name[: max(1, max_name_len - 1)] + "…"
+    index_part = f"[{node.index}] " if node.index is not None else ""
+    name_part = f" {name}" if name else ""
+    aid_part = f" [ID:{node.automation_id}]" if node.automation_id else ""
+    repeat_part = ""
+    if len(same) > 1:
+        others = [str(n.index) for n in same[1:] if n.index is not None]
+        shown = ",".join(others[:5]) + (",…" if len(others) > 5 else "")
+        repeat_part = f" ×{len(same)}" + (f" (+{shown})" if shown else "")
+    return f"{'  ' * depth}{index_part}<{node.control_type}>{name_part}{aid_part}{repeat_part}"
+
+
+def _outline_lines(nodes: list[_OutlineNode], max_name_len: int) -> list[_OutlineLine]:
+    """兄弟の連続重複（同一 signature）をまとめながら行に展開する。"""
+    lines: list[_OutlineLine] = []
+
+    def emit(siblings: list[_OutlineNode], depth: int, parent: Optional[int]) -> None:
+        i = 0
+        while i < len(siblings):
+            node = siblings[i]
+            j = i + 1
+            while j < len(siblings) and siblings[j].signature == node.signature:
+                j += 1
+            priority = 0 if node.interactive else (1 if node.name else 2)
+            lines.append(_OutlineLine(
+                _format_outline_line(node, depth, max_name_len, siblings[i:j]),
+                priority,
+                parent,
+            ))
+            emit(node.children, depth + 1, len(lines) - 1)
+            i = j
+
+    emit(nodes, 0, None)
+    return lines
+
+
+def _render_outline(
+    root: Optional[_OutlineNode],
+    *,
+    max_chars: Optional[int] = None,
+    max_name_len: int = 60,
+) -> str:
+    """
+    インデント付きアウトラインを文字数予算内で描画する。
+    予算超過時は 操作系 > 名前付き > その他 の順、同順位は文書順で行を採用し、
+    採用行の祖先行は構造維持のため必ず含める。
+    """
+    if root is None:
+        return ""
+    lines = _outline_lines(_collapse_outline(root), max_name_len)
+    total = sum(len(line.text) + 1 for line in lines)
+    if not max_chars or total <= max_chars:
+        return "\n".join(line.text for line in lines)
+
+    budget = max(0, int(max_chars) - 40)  # 省略行の表示分を確保
+    keep: set[int] = set()
+    used = 0
+    for i in sorted(range(len(lines)), key=lambda k: (lines[k].priority, k)):
+        chain: list[int] = []
+        k: Optional[int] = i
+        while k is not None and k not in keep:
+            chain.append(k)
+            k = lines[k].parent
+        cost = sum(len(lines[c].text) + 1 for c in chain)
+        if used + cost > budget:
+            continue
+        keep.update(chain)
+        used += cost
+
+    rendered = [lines[i].text for i in sorted(keep)]
+    rendered.append(f"... ({len(lines) - len(keep)} lines omitted)")
+    return "\n".join(rendered)
+
+
 class NativeBrowserDriver:
     """Chrome/Edge共通の基底クラス"""
 
+    # current_elements の要素プロパティ（name/value/rectangle 等）をメモ化する秒数
+    element_property_ttl_s: Optional[float] = 2.0
+    # type_text(method="type") やスクロールのキー送信に使うエンジン（テストでは SimulatedInputBackend に差し替え可）
+    keyboard: KeyboardEngine = KeyboardEngine()
+    # navigate / type_text(paste) / ページテキスト取得の前後で利用者のクリップボードを退避・復元する
+    preserve_clipboard: bool = True
+    # "background" では UIA パターン/ウィンドウメッセージで前面化せずに操作し、
+    # それで扱えない操作は自動的に従来の前面操作へ切り替える
+    input_mode: InputMode = "foreground"
+
     def __init__(
         self,
         browser: str = "chrome",
@@ -848,16 +3648,9 @@ class NativeBrowserDriver:
                 f"Supported: {list(BROWSER_CONFIG.keys())}",
             )
 
-        self.browser = browser
-        self._config = BROWSER_CONFIG[browser]
+        self._init_state(browser)
         _enable_dpi_awareness()
 
-        self.current_elements = {}
-        self.current_elements_info = {}
-        self.current_elements_truncated = False
-        self.app = None
-        self.window = None
-
         # 1. まずウィンドウを確実に取得する（なければ起動も含めて get_browser_window が担当）
         found_window = get_browser_window(
             browser,
@@ -877,6 +3670,39 @@ class NativeBrowserDriver:
         # 2. 取得したウィンドウ情報を元に接続する
         self.connect(found_window)
 
+    def _init_state(self, browser: str) -> None:
+        """
+        インスタンスの状態をまとめて初期化する。
+
+        __init__ と、__init__ を通らずに生成する connect_browser_by_index の両方から呼ぶので、
+        インスタンス属性を追加するときはここに書く。
+        """
+        self.browser = browser
+        self._config = BROWSER_CONFIG[browser]
+        self.current_elements = {}
+        self.current_elements_info = {}
+        self.current_elements_truncated = False
+        self.current_elements_geometry = _ElementGeometry.empty()
+        self.app = None
+        self.window = None
+        self._frame_recorder: Optional[FrameRecorder] = None
+        self.screenshot_cache = ScreenshotCache()
+        self._reset_window_state()
+
+    def _reset_window_state(self) -> None:
+        """接続先ウィンドウに紐づくキャッシュと統計（connect のたびに作り直す）。"""
+        if self._frame_recorder is not None:
+            self._frame_recorder.stop()
+        self._frame_recorder = None
+        self._address_bar = None
+        self._tab_strip = None
+        self._reload_button = None
+        self.address_bar_cache_stats = {"hit": 0, "miss": 0, "stale": 0}
+        self.ensure_visible_stats = {"fast_path": 0, "slow_path": 0, "restored": 0, "maximized": 0, "foregrounded": 0}
+        self.input_mode_stats = {"background": 0, "fallback": 0}
+        self._screenshot_baselines = {}
+        self.screenshot_cache.clear()
+
     def connect(self, target_window):
         """特定されたウィンドウのPIDとハンドルを使って確実に接続する"""
 
@@ -889,6 +3715,7 @@ class NativeBrowserDriver:
         # これにより、ElementAmbiguousError（候補が複数あるエラー）を完全に回避できる
         self.window = self.app.window(handle=target_window.handle)
         self.window.wait("visible", timeout=20)
+        self._reset_window_state()
         logger.info(f"Connected to {self.browser.capitalize()} (PID: {pid}).")
 
 
@@ -902,24 +3729,45 @@ class NativeBrowserDriver:
         foreground: bool = True,
         settle_ms: int = 150,
     ) -> None:
-        """撮影・操作の成功率を上げるために復帰/最大化/前面化する"""
+        """
+        撮影・操作の成功率を上げるために復帰/最大化/前面化する。
+
+        最小化・最大化・前面の状態を先に確認し、必要な操作だけを行う。
+        何も変える必要が無ければ settle_ms の待機も省略する（ensure_visible_stats で回数を記録）。
+        """
         hwnd = self.hwnd
         if not win32gui.IsWindow(hwnd):
             raise ExternalApiError("ensure_visible: invalid hwnd (window does not exist)")
 
-        try:
-            if win32gui.IsIconic(hwnd):
+        stats = self.ensure_visible_stats
+        iconic = _safe_win32(win32gui.IsIconic, hwnd, default=False)
+        needs_maximize = maximize and not _safe_win32(win32gui.IsZoomed, hwnd, default=False)
+        needs_foreground = foreground and _safe_win32(win32gui.GetForegroundWindow, default=0) != hwnd
+
+        if not (iconic or needs_maximize or needs_foreground):
+            stats["fast_path"] += 1
+            return
+        stats["slow_path"] += 1
+
+        if iconic:
+            stats["restored"] += 1
+            try:
                 win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-        except Exception:
-            pass
+            except Exception:
+                pass
+            # 復帰で元の最大化状態に戻ったり前面に来たりすることがあるので再確認する
+            needs_maximize = maximize and not _safe_win32(win32gui.IsZoomed, hwnd, default=False)
+            needs_foreground = foreground and _safe_win32(win32gui.GetForegroundWindow, default=0) != hwnd
 
-        if maximize:
+        if needs_maximize:
+            stats["maximized"] += 1
             try:
                 win32gui.ShowWindow(hwnd, win32con.SW_MAXIMIZE)
             except Exception:
                 pass
 
-        if foreground:
+        if needs_foreground:
+            stats["foregrounded"] += 1
             _force_foreground(hwnd)
 
         if settle_ms > 0:
@@ -939,6 +3787,83 @@ class NativeBrowserDriver:
             except Exception:
                 pass
 
+    def set_input_mode(self, mode: InputMode) -> None:
+        """入力方式を切り替える（"foreground" / "background"）。"""
+        if mode not in _INPUT_MODES:
+            raise InvalidInputError(
+                f"set_input_mode: mode must be one of {list(_INPUT_MODES)}: {mode}",
+                code="invalid_input_mode",
+            )
+        self.input_mode = mode
+
+    def _try_background(self, label: str, action: Callable[[], Any]) -> tuple[bool, Any]:
+        """
+        background モードなら action を前面化せずに試す。
+
+        成功すれば (True, 戻り値)、モードが foreground か失敗した場合は (False, None) を返し、
+        呼び出し側は前面操作にフォールバックする。
+        """
+        if self.input_mode != "background":
+            return False, None
+        try:
+            value = action()
+        except Exception as e:
+            self.input_mode_stats["fallback"] += 1
+            logger.debug(f"{label}: background input failed, falling back to foreground: {e}")
+            return False, None
+        self.input_mode_stats["background"] += 1
+        return True, value
+
+    def _focused_value_in_document(self):
+        """
+        このウィンドウのページ（Document）内でフォーカスを持つ要素の ValuePattern を返す。
+
+        背景にあるウィンドウでは GetFocusedElement（システム全体のフォーカス）が別アプリを指すので、
+        Document 配下を HasKeyboardFocus で探す。WM_CHAR はページ描画ウィンドウに送るので、
+        フォーカスがアドレスバーにある場合や、入力の反映を Value で確認できない要素は対象外とする。
+        """
+        if self._address_bar_focused():
+            raise ActionFailedError("post_text: focus is in the address bar", code="focus_outside_document")
+        iuia = IUIA()
+        document = self._find_document_element()
+        if not document:
+            raise ActionFailedError("post_text: document not found", code="focus_outside_document")
+        condition = iuia.iuia.CreatePropertyCondition(iuia.UIA_dll.UIA_HasKeyboardFocusPropertyId, True)
+        focused = document.FindFirst(iuia.tree_scope["subtree"], condition)
+        if not focused:
+            raise ActionFailedError("post_text: no focused element inside the page document", code="focus_outside_document")
+        try:
+            return get_elem_interface(focused, "Value")
+        except Exception as e:
+            raise ActionFailedError(
+                f"post_text: focused element has no Value pattern (cannot verify input): {e}",
+                code="input_not_verifiable",
+            ) from e
+
+    def _type_in_background(self, text: str) -> dict[str, Any]:
+        """
+        WM_CHAR でページ内のフォーカス要素に入力し、Value が変わったかを {"sent", "observed"} で返す。
+
+        送信前の失敗（フォーカスがページ外など）は例外にして前面操作へ切り替えさせるが、
+        送信後は投げたメッセージを取り消せないので、反映を確認できなくても例外にしない（二重入力を防ぐ）。
+        """
+        value = self._focused_value_in_document()
+        before = value.CurrentValue
+        sent = _post_text(self.hwnd, text)
+        if not text:
+            return {"sent": sent, "observed": True}
+        outcome = wait_for(
+            lambda: value.CurrentValue != before,
+            timeout_s=1.0,
+            interval_s=0.02,
+            backoff=1.5,
+            max_interval_s=0.1,
+            label="post_text",
+        )
+        if not outcome:
+            logger.warning("type_text: background input was posted but the focused value did not change")
+        return {"sent": sent, "observed": bool(outcome)}
+
     def _send_shortcut(
         self,
         action: Optional[Callable[[], None]] = None,
@@ -949,7 +3874,15 @@ class NativeBrowserDriver:
         settle_ms: int = 80,
         focus: bool = True,
         post_sleep_s: float = 0.0,
-    ) -> None:
+        ack: Optional[Callable[[], Any]] = None,
+        label: str = "shortcut",
+    ) -> Optional[WaitOutcome]:
+        """
+        キー/アクションを送る。
+
+        ack を渡すと送信前後で ack() の値を比較し、変化を観測した時点で戻る
+        （post_sleep_s はその上限になる）。ack が無ければ従来どおり post_sleep_s だけ待つ。
+        """
         self.ensure_visible(maximize=maximize, foreground=foreground, settle_ms=settle_ms)
         if focus:
             try:
@@ -957,13 +3890,87 @@ class NativeBrowserDriver:
             except Exception:
                 pass
 
+        before = _ack_snapshot(ack) if ack is not None else None
+
         if keys:
             send_keys(keys)
         if action:
             action()
 
+        if ack is not None and post_sleep_s > 0:
+            return wait_for(
+                lambda: _ack_snapshot(ack) != before,
+                timeout_s=post_sleep_s,
+                interval_s=0.02,
+                backoff=1.5,
+                max_interval_s=0.1,
+                label=f"ack:{label}",
+            )
         if post_sleep_s > 0:
             time.sleep(post_sleep_s)
+        return None
+
+    # ---- アクション完了の確認用プローブ（_send_shortcut の ack に渡す） ----
+
+    def _resolve_tab_strip(self):
+        """タブ（TabItem）を直下に持つタブ列の要素。最初の TabItem の親として1度だけ探してキャッシュする。"""
+        if self._tab_strip is None:
+            iuia = IUIA()
+            first = self.window.element_info.element.FindFirst(
+                iuia.tree_scope["descendants"],
+                iuia.build_condition(control_type="TabItem"),
+            )
+            if not first:
+                return None
+            self._tab_strip = iuia.raw_tree_walker.GetParentElement(first)
+        return self._tab_strip
+
+    def _probe_tab_count(self) -> int:
+        # ポーリングのたびにウィンドウ全体を探さず、タブ列の直下だけを数える
+        iuia = IUIA()
+        condition = iuia.build_condition(control_type="TabItem")
+        for _ in range(2):
+            strip = self._resolve_tab_strip()
+            if not strip:
+                return 0
+            try:
+                found = strip.FindAll(iuia.tree_scope["children"], condition)
+                count = int(found.Length) if found else 0
+            except Exception:
+                count = 0
+            if count:
+                return count
+            # タブ列が作り直された（要素が無効/空になった）ので探し直す
+            self._tab_strip = None
+        return 0
+
+    def _probe_title(self) -> str:
+        return self.window.window_text()
+
+    def _probe_url(self) -> str:
+        return self.get_address_bar_url()
+
+    def _probe_focused_element(self) -> tuple[int, ...]:
+        focused = IUIA().iuia.GetFocusedElement()
+        return _normalize_runtime_id(focused.GetRuntimeId())
+
+    def _find_document_element(self):
+        iuia = IUIA()
+        return self.window.element_info.element.FindFirst(
+            iuia.tree_scope["descendants"],
+            iuia.build_condition(control_type="Document"),
+        )
+
+    def _probe_document_identity(self) -> tuple[int, ...]:
+        # リロードでドキュメントのアクセシビリティツリーが作り直され RuntimeId が変わる
+        return _normalize_runtime_id(self._find_document_element().GetRuntimeId())
+
+    def _probe_document_layout(self) -> tuple[int, int]:
+        # ズームでページ内容がリフローするので、先頭要素の大きさの変化を見る
+        iuia = IUIA()
+        first = self._find_document_element().FindFirst(iuia.tree_scope["children"], iuia.true_condition)
+        rect = first.CurrentBoundingRectangle
+        return (int(rect.right - rect.left), int(rect.bottom - rect.top))
 
     def _prepare_for_read(
         self,
@@ -976,31 +3983,57 @@ class NativeBrowserDriver:
         elif settle_ms > 0:
             time.sleep(settle_ms / 1000.0)
 
+    def _clipboard_transaction(self, label: str, *, preserve: bool = False):
+        """
+        clipboard_broker の排他区間。他のドライバ/スレッドのクリップボード操作と混ざらないようにし、
+        preserve=True（かつ preserve_clipboard 有効）なら終了時に利用者の元の内容へ戻す。
+        """
+        try:
+            owner = f"{self.browser}:{self.hwnd}:{label}"
+        except Exception:
+            owner = label
+        return clipboard_broker.transaction(owner, preserve=preserve and self.preserve_clipboard)
+
     def _wait_for_clipboard_text(
         self,
-        previous_text: Optional[str],
+        previous_sequence: Optional[int],
         *,
         timeout_s: float = 0.8,
         interval_s: float = 0.05,
     ) -> ActionResult:
-        latest: dict[str, Optional[str] | bool] = {"text": None, "updated": False}
+        """
+        クリップボードの更新番号が previous_sequence から変わるまで待ち、変わったら1回だけ読む。
+
+        内容の比較はしないため、同じ文字列が再コピーされた場合も更新として扱い、
+        コピー失敗（番号が変わらない）とは区別できる。
+        """
+        latest: dict[str, Any] = {"text": None, "sequence": previous_sequence}
         last_error: ActionResult | None = None
 
         def predicate() -> bool:
             nonlocal last_error
+            sequence = _clipboard_sequence_number()
+            if previous_sequence is not None and sequence == previous_sequence:
+                return False
+            # 書き込み中は相手がクリップボードを開いているので、読めるまで再試行する
             result = _get_clipboard_text()
             if not result.ok:
                 last_error = result
                 return False
             latest["text"] = result.data
-            latest["updated"] = (
-                result.data is not None
-                if previous_text is None
-                else result.data != previous_text
-            )
+            latest["sequence"] = sequence
             return result.data is not None
 
-        ok = wait_until(predicate, timeout_s=timeout_s, interval_s=interval_s)
+        # クリップボードは他プロセスと取り合いになるため、間隔を揺らしつつ徐々に広げる
+        ok = wait_for(
+            predicate,
+            timeout_s=timeout_s,
+            interval_s=interval_s,
+            backoff=1.5,
+            max_interval_s=max(interval_s, 0.2),
+            jitter=0.2,
+            label="clipboard",
+        )
         if not ok:
             if last_error and last_error.code == "clipboard_error":
                 return ActionResult.failure(
@@ -1010,12 +4043,11 @@ class NativeBrowserDriver:
                 )
             return ActionResult.failure(
                 "timeout",
-                f"clipboard_wait: timeout after {timeout_s}s",
-                data=latest["text"],
+                f"clipboard_wait: clipboard was not updated within {timeout_s}s",
+                data={"sequence": previous_sequence},
             )
 
-        message = "clipboard_wait: updated" if latest["updated"] else "clipboard_wait: read (update not confirmed)"
-        return ActionResult.success(message, data=latest["text"])
+        return ActionResult.success("clipboard_wait: updated", data=latest["text"])
 
     def _perform_clipboard_transfer(
         self,
@@ -1023,19 +4055,26 @@ class NativeBrowserDriver:
         *,
         timeout_s: float = 0.8,
         settle_ms: int = 80,
+        preserve: bool = False,
     ) -> ActionResult:
         """
         共通のクリップボード転送処理:
             - 入力準備
-            - 事前クリップボード取得
+            - 事前のクリップボード更新番号を取得（preserve=True なら内容も退避）
             - 指定ショートカット送信
-            - クリップボード更新待機
+            - 更新番号の変化を待って1回だけ読み取り
+            - preserve=True なら読み取り後に元の内容へ戻す
         """
-        self._prepare_for_input(maximize=False, foreground=True, settle_ms=settle_ms)
-        previous_result = _get_clipboard_text()
-        previous = previous_result.data if previous_result.ok else None
-        send_keys(shortcut)
-        return self._wait_for_clipboard_text(previous, timeout_s=timeout_s, interval_s=0.05)
+        # 前面化からショートカットの反映確認までブローカーを保持し、他の利用者の前面化と交錯させない
+        with self._clipboard_transaction(shortcut, preserve=preserve) as transaction:
+            self._prepare_for_input(maximize=False, foreground=True, settle_ms=settle_ms)
+            try:
+                previous = transaction.sequence()
+            except Exception:
+                previous = None
+            transaction.before_overwrite()
+            send_keys(shortcut)
+            return self._wait_for_clipboard_text(previous, timeout_s=timeout_s, interval_s=0.02)
 
     def set_edit_text(self, index: int, text: str) -> str:
         """スキャンした要素のテキストを設定する"""
@@ -1051,11 +4090,13 @@ class NativeBrowserDriver:
                 f"set_edit_text: element not found (index={index})",
             )
 
-        elem = self.current_elements[index]
+        elem = self._element_proxy(index)
 
         try:
-            self._prepare_for_input(maximize=False, foreground=True, settle_ms=80)
-            elem.set_text(text)
+            ok, _ = self._try_background("set_edit_text", lambda: elem.iface_value.SetValue(text))
+            if not ok:
+                self._prepare_for_input(maximize=False, foreground=True, settle_ms=80)
+                elem.set_text(text)
             preview = text[:50] + ("..." if len(text) > 50 else "")
             return ActionResult.success(
                 f"set_edit_text: ok (index={index}, text={preview})",
@@ -1065,6 +4106,8 @@ class NativeBrowserDriver:
                 "action_failed",
                 f"set_edit_text: failed to set text (index={index}): {e}",
             )
+        finally:
+            elem.invalidate()
 
     def set_edit_text_or_raise(self, index: int, text: str) -> None:
         """スキャンした要素のテキストを設定する（失敗時例外）"""
@@ -1082,13 +4125,27 @@ class NativeBrowserDriver:
         foreground_before: bool = True,
         settle_ms: int = 150,
         as_bytes: bool = False,
-        fmt: Literal["PNG", "JPEG"] = "PNG",
+        fmt: ImageFormat = "PNG",
         quality: int = 90,
+        max_bytes: Optional[int] = None,
+        element_index: Optional[int] = None,
+        element_id: Optional[str] = None,
+        region: Optional[tuple[int, int, int, int]] = None,
+        padding: int = 0,
+        max_dimension: Optional[int] = None,
+        frame_max_age_s: Optional[float] = None,
     ) -> Union[Image.Image, bytes]:
         """
-        Chromeデバッグモードなしのスクショ（ウィンドウ全体）。
+        Chromeデバッグモードなしのスクショ（既定はウィンドウ全体）。
         - prefer='printwindow' : PrintWindow優先（隠れていても取れる場合あり。ただしChromeは黒画面になることがある）
         - prefer='screen'      : 画面キャプチャ優先（最も安定しがちだが、ウィンドウが見えている必要あり）
+
+        element_index（current_elements のインデックス）/ element_id（AutomationId）/
+        region（ウィンドウ相対の left, top, right, bottom）のいずれかを指定すると、その範囲だけを撮る。
+        ウィンドウが前面にあれば画面キャプチャでその範囲だけを取得し、そうでなければ PrintWindow の結果を切り抜く。
+        frame_max_age_s を指定し、連続キャプチャにその秒数以内のフレームがあれば撮影せずそこから切り抜く。
+        max_dimension を指定すると長辺がそれ以下になるよう縮小してから保存/エンコードする。
+        保存/エンコードは image_encoder で行い、fmt="WEBP" / "auto" と max_bytes（バイト数上限）を受け付ける。
         """
         if prepare_window:
             self.ensure_visible(
@@ -1097,86 +4154,572 @@ class NativeBrowserDriver:
                 settle_ms=settle_ms,
             )
 
-        hwnd = self.hwnd
-        rect = _get_window_rect(hwnd)
+        hwnd = self.hwnd
+        rect = _get_window_rect(hwnd)
+        crop = self._capture_region_rect(
+            rect,
+            element_index=element_index,
+            element_id=element_id,
+            region=region,
+            padding=padding,
+        )
+
+        img: Optional[Image.Image] = None
+        errors = []
+
+        def window_box(target: Rect) -> tuple[int, int, int, int]:
+            return (target.left - rect.left, target.top - rect.top, target.right - rect.left, target.bottom - rect.top)
+
+        def try_printwindow() -> bool:
+            nonlocal img
+            try:
+                im = _capture_by_printwindow(hwnd)
+                # 空白判定はウィンドウ全体で行う（範囲だけだと単色の要素を誤判定する）
+                blank = _blank_kind(im)
+                if blank is not None:
+                    raise ScreenshotError(
+                        f"screenshot: PrintWindow returned a blank ({blank}) image (possible GPU/occlusion issue)"
+                    )
+                img = im if crop is None else im.crop(window_box(crop))
+                return True
+            except Exception as e:
+                errors.append(f"printwindow: {e}")
+                return False
+
+        def try_screen() -> bool:
+            nonlocal img
+            try:
+                img = _capture_by_screen_rect(rect if crop is None else crop)
+                return True
+            except Exception as e:
+                errors.append(f"screen: {e}")
+                return False
+
+        if crop is not None and frame_max_age_s is not None:
+            img = self._crop_recent_frame(rect, window_box(crop), frame_max_age_s)
+
+        if img is None:
+            if crop is not None and _safe_win32(win32gui.GetForegroundWindow) == hwnd:
+                # 範囲指定時は、ウィンドウが見えていれば範囲だけの画面キャプチャの方が安い
+                prefer = "screen"
+            if prefer == "printwindow":
+                ok = try_printwindow()
+                if (not ok) and allow_fallback:
+                    ok = try_screen()
+            else:
+                ok = try_screen()
+                if (not ok) and allow_fallback:
+                    ok = try_printwindow()
+
+        if not img:
+            raise ScreenshotError("screenshot: failed to capture screenshot. " + " | ".join(errors))
+
+        img = _downscale(img, max_dimension)
+        return _deliver_image(img, file_path, as_bytes=as_bytes, fmt=fmt, quality=quality, max_bytes=max_bytes)
+
+    def _capture_region_rect(
+        self,
+        window_rect: Rect,
+        *,
+        element_index: Optional[int],
+        element_id: Optional[str],
+        region: Optional[tuple[int, int, int, int]],
+        padding: int = 0,
+    ) -> Optional[Rect]:
+        """screenshot の範囲指定をスクリーン座標の矩形に解決し、ウィンドウ内に収める（指定なしは None）。"""
+        given = [name for name, value in (("element_index", element_index), ("element_id", element_id), ("region", region)) if value is not None]
+        if not given:
+            return None
+        if len(given) > 1:
+            raise InvalidInputError(
+                f"screenshot: specify only one of element_index / element_id / region (got {given})",
+                code="invalid_region",
+            )
+
+        if element_index is not None:
+            if element_index not in self.current_elements:
+                raise ElementNotFoundError(f"screenshot: element not found (index={element_index})")
+            item = self._element_proxy(element_index)
+            # ensure_visible の最大化などで位置が変わり得るので取り直す
+            item.invalidate("rectangle")
+            target = item.get("rectangle")
+            if target is None:
+                raise ElementNotFoundError(f"screenshot: element has no rectangle (index={element_index})")
+        elif element_id is not None:
+            target = None
+            for index in self.current_elements:
+                item = self._element_proxy(index)
+                if item.get("automation_id") == element_id:
+                    item.invalidate("rectangle")
+                    target = item.get("rectangle")
+                    break
+            if target is None:
+                try:
+                    found = self.window.descendants(automation_id=element_id)
+                except Exception:
+                    found = []
+                if not found:
+                    raise ElementNotFoundError(f"screenshot: element not found (automation_id={element_id!r})")
+                target = found[0].rectangle()
+        else:
+            if len(region) != 4:
+                raise InvalidInputError("screenshot: region must be [left, top, right, bottom]", code="invalid_region")
+            left, top, right, bottom = (int(v) for v in region)
+            target = Rect(window_rect.left + left, window_rect.top + top, window_rect.left + right, window_rect.top + bottom)
+
+        pad = max(0, int(padding))
+        crop = _intersect_rect(
+            Rect(target.left - pad, target.top - pad, target.right + pad, target.bottom + pad),
+            window_rect,
+        )
+        if crop.width <= 0 or crop.height <= 0:
+            raise ScreenshotError(f"screenshot: region is outside the window ({given[0]})", code="region_out_of_window")
+        return crop
+
+    def _crop_recent_frame(
+        self,
+        window_rect: Rect,
+        box: tuple[int, int, int, int],
+        max_age_s: float,
+    ) -> Optional[Image.Image]:
+        """連続キャプチャの最新フレームが max_age_s 秒以内かつ現在のウィンドウサイズと同じなら box を切り抜く。"""
+        recorder = self._frame_recorder
+        if recorder is None:
+            return None
+        try:
+            frame = recorder.frame(-1)
+        except InvalidInputError:
+            return None
+        if time.time() - frame.last_seen_at > max_age_s:
+            return None
+        if frame.image.size != (window_rect.width, window_rect.height):
+            return None
+        return frame.image.crop(box)
+
+    def screenshot_delta(
+        self,
+        *,
+        tile_size: int = 64,
+        full_threshold: float = 0.6,
+        **screenshot_kwargs: Any,
+    ) -> ScreenshotDelta:
+        """
+        スクリーンショットを撮り、同じウィンドウ・同じ撮影範囲の前回の screenshot_delta との差分を返す。
+
+        フレームを tile_size ピクセルのタイルに分けてハッシュを比較し、変化したタイルを連結した
+        領域だけを切り出す。変化が無ければ changed=False、初回・サイズ変更・変化タイルの割合が
+        full_threshold 以上ならフレーム全体を返す。撮影オプションは screenshot() と同じ。
+        比較基準は (ウィンドウ, element_index / element_id / region / padding / max_dimension) ごとに持つ。
+        """
+        tile_size = max(8, int(tile_size))
+        img = self.screenshot(**{**screenshot_kwargs, "as_bytes": False, "file_path": None})
+        key = self._screenshot_baseline_key(screenshot_kwargs)
+        previous = self._screenshot_baselines.pop(key, None)
+        delta, baseline = _diff_frames(img, previous, tile=tile_size, full_threshold=float(full_threshold))
+        self._screenshot_baselines[key] = baseline
+        # 範囲を変えながら呼ばれても溜め込まないよう、古い基準から捨てる
+        while len(self._screenshot_baselines) > _SCREENSHOT_BASELINE_LIMIT:
+            del self._screenshot_baselines[next(iter(self._screenshot_baselines))]
+        return delta
+
+    def _screenshot_baseline_key(self, screenshot_kwargs: dict[str, Any]) -> tuple:
+        region = screenshot_kwargs.get("region")
+        return (
+            self.hwnd,
+            screenshot_kwargs.get("element_index"),
+            screenshot_kwargs.get("element_id"),
+            tuple(region) if region is not None else None,
+            int(screenshot_kwargs.get("padding") or 0),
+            screenshot_kwargs.get("max_dimension"),
+        )
+
+    def reset_screenshot_baseline(self, **screenshot_kwargs: Any) -> None:
+        """
+        screenshot_delta の比較基準を捨て、次回はフレーム全体を返すようにする。
+        撮影範囲を指定すればその範囲の基準だけ、省略すればこのウィンドウの全範囲の基準を捨てる。
+        """
+        if screenshot_kwargs:
+            self._screenshot_baselines.pop(self._screenshot_baseline_key(screenshot_kwargs), None)
+            return
+        hwnd = self.hwnd
+        for key in [key for key in self._screenshot_baselines if key[0] == hwnd]:
+            del self._screenshot_baselines[key]
+
+    def start_frame_capture(
+        self,
+        *,
+        fps: float = 2.0,
+        capacity: int = 120,
+        max_bytes: int = 512 * 1024 * 1024,
+        prefer: Literal["printwindow", "screen"] = "printwindow",
+    ) -> ActionResult:
+        """
+        ウィンドウの連続キャプチャを別スレッドで開始する（実行中なら設定を変えて開始し直す）。
+
+        スレッドはウィンドウの前面化などはせず撮影だけを行うので、ツール呼び出しを妨げない。
+        prefer='screen' はウィンドウが画面に見えている間の内容になる。
+        """
+        if prefer not in ("printwindow", "screen"):
+            raise InvalidInputError(f"frame capture: unsupported prefer={prefer!r}", code="invalid_frame_capture")
+        hwnd = self.hwnd
+        if prefer == "printwindow":
+            capture = lambda: _capture_by_printwindow(hwnd)
+        else:
+            capture = lambda: _capture_by_screen_rect(_get_window_rect(hwnd))
+        recorder = FrameRecorder(capture, fps=fps, capacity=capacity, max_bytes=max_bytes)
+        if self._frame_recorder is not None:
+            self._frame_recorder.stop()
+        self._frame_recorder = recorder
+        recorder.start()
+        return ActionResult.success("start_frame_capture: ok", data=recorder.stats())
+
+    def stop_frame_capture(self) -> ActionResult:
+        """連続キャプチャを止める。バッファ内のフレームは次の開始まで取得・書き出しできる。"""
+        recorder = self._frame_recorder
+        if recorder is None:
+            return ActionResult.failure("not_running", "stop_frame_capture: not started")
+        recorder.stop()
+        return ActionResult.success("stop_frame_capture: ok", data=recorder.stats())
+
+    def frame_capture_stats(self) -> Optional[dict[str, Any]]:
+        recorder = self._frame_recorder
+        return recorder.stats() if recorder is not None else None
+
+    def _require_frame_recorder(self) -> FrameRecorder:
+        if self._frame_recorder is None:
+            raise InvalidInputError("frame capture: not started", code="frame_capture_not_started")
+        return self._frame_recorder
+
+    def get_captured_frame(self, index: int = -1) -> CapturedFrame:
+        """通し番号 index のフレームを返す（-1 で最新）。"""
+        return self._require_frame_recorder().frame(int(index))
+
+    def export_captured_frames(
+        self,
+        directory: str,
+        *,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        fmt: ImageFormat = "PNG",
+        quality: int = 90,
+        max_bytes: Optional[int] = None,
+    ) -> ActionResult:
+        """
+        通し番号 start〜end のフレームを directory に frame_<index>.<ext> で書き出し、
+        各フレームの情報を manifest.json にまとめる。
+        max_bytes はファイル1つあたりの上限（収まる最大の品質を探索する）。
+        """
+        frames = self._require_frame_recorder().frames(start, end)
+        if not frames:
+            return ActionResult.failure("no_frames", "export_captured_frames: no frames in range", data={"start": start, "end": end})
+        os.makedirs(directory, exist_ok=True)
+        # 同じ内容のフレームは1度だけエンコード・書き出しし、manifest で同じファイルを指す
+        unique: dict[str, CapturedFrame] = {}
+        for frame in frames:
+            unique.setdefault(frame.digest, frame)
+        encoded = image_encoder.encode_many(
+            [frame.image for frame in unique.values()], fmt, quality=quality, max_bytes=max_bytes
+        )
+        written: dict[str, tuple[str, EncodedImage]] = {}
+        for frame, result in zip(unique.values(), encoded):
+            ext = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}[result.fmt]
+            path = os.path.join(directory, f"frame_{frame.index:06d}.{ext}")
+            with open(path, "wb") as f:
+                f.write(result.data)
+            written[frame.digest] = (path, result)
+        manifest = [
+            {**frame.as_dict(), "path": written[frame.digest][0], "encoding": written[frame.digest][1].as_dict()}
+            for frame in frames
+        ]
+        manifest_path = os.path.join(directory, "manifest.json")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return ActionResult.success(
+            f"export_captured_frames: {len(manifest)} frames",
+            data={"directory": directory, "manifest": manifest_path, "frames": len(manifest), "files": len(written)},
+        )
+
+    def navigate(
+        self,
+        url: str,
+        timeout_s: float = 5.0,
+        interval_s: float = 0.1,
+        *,
+        wait: NavigateWait = "committed",
+        quiet_s: float = 0.5,
+    ) -> ActionResult:
+        """
+        Ctrl+LでURLバーにフォーカスし、クリップボード経由で入力して移動。
+
+        wait で完了条件を選ぶ（後の段階は前の段階を含む）:
+          - "none": Enter 送信直後に戻る
+          - "committed": ナビゲーションが確定するまで（アドレスバーからフォーカスが外れ、かつ Document の差し替え・
+            タイトルの変化・読み込み中→完了のいずれかを観測した時点）。貼り付けた URL は Enter 前から
+            アドレスバーに表示されているので、URL の文字列だけでは確定とみなさない
+          - "title_changed": さらにウィンドウタイトルが変わるまで
+          - "content_stable": さらにページ側の変化が quiet_s 秒途絶え、読み込み中でなくなるまで
+            （読み込み中かどうかは再読み込み/中止ボタンの名前で判定。ボタンが見つからなければ判定しない）
+
+        UIA の PropertyChanged イベント（Name / Value）で待機を起こす。購読はウィンドウ自身（タイトル）・
+        アドレスバー・再読み込みボタン・Document 配下に限り、ナビゲーションで Document が作り直されたら
+        新しい Document も購読に加える。イベント登録に失敗した場合は interval_s 間隔のポーリングで同じ条件を判定する。
+        timeout_s を超えた場合は code="timeout" の ActionResult を返す（例外は送出しない）。
+        """
+        if wait not in _NAVIGATE_WAIT_STAGES:
+            raise InvalidInputError(
+                f"wait は {list(_NAVIGATE_WAIT_STAGES)} のいずれかを指定してください: {wait}",
+                data={"wait": wait},
+            )
+        stage = _NAVIGATE_WAIT_STAGES[wait]
+        watcher = _PropertyChangeWatcher(self.window.element_info.element, ("name", "value"), scope="element")
+        watched: set[tuple[int, ...]] = set()
+        loading_check = False
+        try:
+            # 前面化から Enter 送信までブローカーを保持し、途中で他の利用者に前面/クリップボードを奪われないようにする
+            with self._clipboard_transaction("navigate", preserve=True) as transaction:
+                self._prepare_for_input(maximize=False, foreground=True, settle_ms=80)
+                previous_url = self.get_address_bar_url()
+                previous_title = self.get_page_title()
+                previous_document = self._document_identity()
+                if stage > 0:
+                    button = self._resolve_reload_button()
+                    if button:
+                        loading_check = True
+                        watcher.watch(button.element_info.element, "element")
+                    self._watch_page(watcher, watched)
+                    watcher.start()
+                send_keys("^l")
+                wait_for(
+                    lambda: self.get_address_bar_url() != "Unknown",
+                    timeout_s=1.0,
+                    interval_s=0.05,
+                    label="navigate:focus_address_bar",
+                )
+                transaction.write_text(url)
+                send_keys("^v")
+                # 貼り付けが反映されてから Enter を送り、その後で元のクリップボードに戻す
+                wait_for(
+                    lambda: self.get_address_bar_url() != previous_url,
+                    timeout_s=0.5,
+                    interval_s=0.02,
+                    label="navigate:paste",
+                )
+                send_keys("{ENTER}")
+                started = time.monotonic()
+            deadline = started + max(0.0, float(timeout_s))
+            interval_s = max(0.01, float(interval_s))
+
+            commit_state: dict[str, Any] = {"loading_seen": False, "signal": None}
+
+            def _title_changed() -> bool:
+                title = self.get_page_title()
+                return bool(title) and title != previous_title
+
+            def _address_bar_released() -> bool:
+                # 入力中はアドレスバーにフォーカスが残る（読めない場合はこの条件を使わない）
+                return not self._address_bar_focused()
+
+            def _document_replaced() -> bool:
+                document = self._document_identity()
+                return document is not None and document != previous_document
+
+            def _loading_finished() -> bool:
+                loading = self._page_loading() if loading_check else None
+                if loading:
+                    commit_state["loading_seen"] = True
+                return commit_state["loading_seen"] and loading is False
+
+            def _commit_signal(name: str, predicate: Callable[[], bool]) -> Callable[[], bool]:
+                def _check() -> bool:
+                    if predicate():
+                        commit_state["signal"] = name
+                        return True
+                    return False
+
+                return _check
+
+            _committed = all_of(
+                _address_bar_released,
+                any_of(
+                    _commit_signal("document", _document_replaced),
+                    _commit_signal("title", _title_changed),
+                    _commit_signal("loading", _loading_finished),
+                ),
+            )
+
+            last_seen: dict[str, Any] = {}
+
+            def _content_stable() -> bool:
+                if loading_check and self._page_loading():
+                    last_seen.clear()
+                    return False
+                if watcher.active:
+                    return watcher.quiet_for(started) >= quiet_s
+                # ポーリング時はタイトルと URL が quiet_s 秒変わらなければ安定とみなす
+                snapshot = (self.get_page_title(), self.get_address_bar_url())
+                now = time.monotonic()
+                if last_seen.get("snapshot") != snapshot:
+                    last_seen["snapshot"] = snapshot
+                    last_seen["since"] = now
+                    return False
+                return now - last_seen["since"] >= quiet_s
+
+            # イベント購読中は通知で起きるので、取りこぼし対策のポーリングは徐々に間引く
+            wake = watcher if watcher.active else None
+            reached = "none"
+            steps = (("committed", _committed), ("title_changed", _title_changed), ("content_stable", _content_stable))
+            for name, predicate in steps[:stage]:
+                outcome = wait_for(
+                    predicate,
+                    deadline - time.monotonic(),
+                    interval_s,
+                    backoff=1.5 if wake else 1.0,
+                    max_interval_s=max(interval_s, 0.25),
+                    wake=wake,
+                    label=f"navigate:{name}",
+                )
+                if not outcome:
+                    break
+                reached = name
+                if watcher.active:
+                    # コミット後は新しいページの Document に差し替わっていることがある
+                    self._watch_page(watcher, watched)
+            elapsed = time.monotonic() - started
+            event_count = watcher.event_count
+            via = "events" if watcher.active else "polling"
+        finally:
+            watcher.stop()
+
+        data = {
+            "url": url,
+            "wait": wait,
+            "reached": reached,
+            "elapsed_s": round(elapsed, 3),
+            "via": via,
+            "event_count": event_count,
+            "loading_check": loading_check,
+            "commit_signal": commit_state["signal"] if stage > 0 else None,
+        }
+        if reached != wait:
+            return ActionResult.failure(
+                "timeout",
+                f"navigate: '{wait}' に到達する前にタイムアウトしました（到達: {reached}）",
+                data=data,
+            )
+        return ActionResult.success(f"navigate: {wait} ({elapsed:.2f}s)", data=data)
+
+    def _watch_page(self, watcher: _PropertyChangeWatcher, seen: set[tuple[int, ...]]) -> None:
+        """
+        解決済みのアドレスバーと現在の Document 配下を購読に加える。
 
-        img: Optional[Image.Image] = None
-        errors = []
+        seen は購読済み要素の RuntimeId で、作り直された要素だけを追加する
+        （ウィンドウ全体を subtree で購読するとタブ・ツールバー・ページ全体の通知でハンドラが溢れるため）。
+        """
+        if self._address_bar is not None:
+            wrapper, runtime_id = self._address_bar
+            if runtime_id and runtime_id not in seen:
+                seen.add(runtime_id)
+                watcher.watch(wrapper.element_info.element, "element")
+        try:
+            document = self._find_document_element()
+            runtime_id = _normalize_runtime_id(document.GetRuntimeId())
+        except Exception as e:
+            logger.debug(f"Document を解決できません（購読しません）: {e}")
+            return
+        if runtime_id and runtime_id not in seen:
+            seen.add(runtime_id)
+            watcher.watch(document, "subtree")
 
-        def try_printwindow() -> bool:
-            nonlocal img
-            try:
-                im = _capture_by_printwindow(hwnd)
-                if _is_probably_blank(im):
-                    raise ScreenshotError(
-                        "screenshot: PrintWindow returned a blank image (possible GPU/occlusion issue)"
-                    )
-                img = im
-                return True
-            except Exception as e:
-                errors.append(f"printwindow: {e}")
-                return False
+    def _document_identity(self) -> Optional[tuple[int, ...]]:
+        """現在の Document の RuntimeId。見つからない/読めない場合は None。"""
+        try:
+            return self._probe_document_identity() or None
+        except Exception:
+            return None
 
-        def try_screen() -> bool:
-            nonlocal img
-            try:
-                img = _capture_by_screen_rect(rect)
-                return True
-            except Exception as e:
-                errors.append(f"screen: {e}")
-                return False
+    def _address_bar_focused(self) -> Optional[bool]:
+        """キャッシュ済みのアドレスバーにキーボードフォーカスがあるか。未解決/読めない場合は None。"""
+        cached = self._address_bar
+        if cached is None:
+            return None
+        try:
+            return bool(cached[0].element_info.element.CurrentHasKeyboardFocus)
+        except Exception:
+            return None
 
-        if prefer == "printwindow":
-            ok = try_printwindow()
-            if (not ok) and allow_fallback:
-                ok = try_screen()
-        else:
-            ok = try_screen()
-            if (not ok) and allow_fallback:
-                ok = try_printwindow()
+    def _resolve_reload_button(self):
+        """
+        再読み込み/中止ボタン（読み込み中は名前が中止側に切り替わる）。
 
-        if not img:
-            raise ScreenshotError("screenshot: failed to capture screenshot. " + " | ".join(errors))
+        設定の候補名で1度だけ探し、接続中はキャッシュする（見つからなかったことも記録して探し直さない）。
+        """
+        if self._reload_button is None:
+            config = self._config
+            titles = list(config.get("reload_button_title_candidates") or []) + list(
+                config.get("stop_button_title_candidates") or []
+            )
+            self._reload_button = False
+            for title in titles:
+                try:
+                    found = self.window.descendants(control_type="Button", title=title)
+                except Exception:
+                    continue
+                if found:
+                    self._reload_button = found[0]
+                    break
+        return self._reload_button or None
+
+    def _page_loading(self) -> Optional[bool]:
+        """読み込み中なら True。ボタンが無い/読めない場合は None。"""
+        button = self._resolve_reload_button()
+        if button is None:
+            return None
+        try:
+            name = button.element_info.element.CurrentName
+        except Exception:
+            # ツールバーが作り直された場合は次回探し直す
+            self._reload_button = None
+            return None
+        return name in (self._config.get("stop_button_title_candidates") or [])
 
-        if file_path:
-            save_kwargs = {}
-            if fmt == "JPEG":
-                save_kwargs["quality"] = int(quality)
-                save_kwargs["optimize"] = True
-            img.save(file_path, format=fmt, **save_kwargs)
-
-        if as_bytes:
-            buf = io.BytesIO()
-            save_kwargs = {}
-            if fmt == "JPEG":
-                save_kwargs["quality"] = int(quality)
-                save_kwargs["optimize"] = True
-            img.save(buf, format=fmt, **save_kwargs)
-            return buf.getvalue()
+    def get_address_bar_url(self):
+        """アドレスバーからURLを取得（解決済みのアドレスバー要素はキャッシュして再利用）"""
+        self._prepare_for_read()
 
-        return img
+        cached = self._address_bar
+        if cached is not None:
+            wrapper, runtime_id = cached
+            try:
+                if _normalize_runtime_id(wrapper.element_info.runtime_id) == runtime_id:
+                    value = wrapper.get_value()
+                    self.address_bar_cache_stats["hit"] += 1
+                    return value
+            except Exception:
+                pass
+            # 要素が破棄/差し替えされた場合のみ再探索する
+            self._address_bar = None
+            self.address_bar_cache_stats["stale"] += 1
+        else:
+            self.address_bar_cache_stats["miss"] += 1
 
-    def navigate(self, url: str, timeout_s: float = 5.0, interval_s: float = 0.1):
-        """Ctrl+LでURLバーにフォーカスし、クリップボード経由で入力して移動"""
-        self._prepare_for_input(maximize=False, foreground=True, settle_ms=80)
-        previous_url = self.get_address_bar_url()
-        send_keys("^l")
-        wait_until(lambda: self.get_address_bar_url() != "Unknown", timeout_s=1.0, interval_s=0.05)
-        _set_clipboard_text(url)
-        send_keys("^v")
-        send_keys("{ENTER}")
-
-        def _url_changed() -> bool:
-            current = self.get_address_bar_url()
-            if current in ("Unknown", ""):
-                return False
-            return current != previous_url or url in current
+        for item, cacheable in self._iter_address_bar_candidates():
+            try:
+                value = item.get_value()
+            except Exception:
+                continue
+            # 最後の手段（最初に見つかった Edit）はページ内の入力欄の可能性があるのでキャッシュしない
+            runtime_id = _normalize_runtime_id(getattr(item.element_info, "runtime_id", None))
+            if cacheable and runtime_id:
+                self._address_bar = (item, runtime_id)
+            return value
 
-        wait_until(_url_changed, timeout_s=timeout_s, interval_s=interval_s)
+        return "Unknown"
 
-    def get_address_bar_url(self):
-        """アドレスバーからURLを取得"""
-        self._prepare_for_read()
+    def _iter_address_bar_candidates(self) -> Iterable[tuple[Any, bool]]:
+        """
+        アドレスバー候補を automation_id -> title -> control_type の順に (要素, キャッシュ可否) で列挙する。
+        control_type だけで拾った候補はキャッシュ不可とする。
+        """
         config = self._config
         control_types = config.get("address_bar_control_types") or ["Edit"]
         id_candidates = config.get("address_bar_automation_id_candidates") or []
@@ -1185,45 +4728,31 @@ class NativeBrowserDriver:
         for candidate_id in id_candidates:
             for control_type in control_types:
                 try:
-                    items = self.window.descendants(
+                    for item in self.window.descendants(
                         control_type=control_type,
                         automation_id=candidate_id,
-                    )
+                    ):
+                        yield item, True
                 except Exception:
                     continue
-                for item in items:
-                    try:
-                        return item.get_value()
-                    except Exception:
-                        continue
 
         for candidate_title in title_candidates:
             for control_type in control_types:
                 try:
-                    items = self.window.descendants(
+                    for item in self.window.descendants(
                         control_type=control_type,
                         title=candidate_title,
-                    )
+                    ):
+                        yield item, True
                 except Exception:
                     continue
-                for item in items:
-                    try:
-                        return item.get_value()
-                    except Exception:
-                        continue
 
         for control_type in control_types:
             try:
-                edits = self.window.descendants(control_type=control_type)
+                for item in self.window.descendants(control_type=control_type):
+                    yield item, False
             except Exception:
                 continue
-            for item in edits:
-                try:
-                    return item.get_value()
-                except Exception:
-                    continue
-
-        return "Unknown"
 
 
     def scan_page_elements(
@@ -1241,69 +4770,105 @@ class NativeBrowserDriver:
 
         elements_map: dict[int, Any] = {}
         elements_info: dict[int, dict[str, object]] = {}
+        geo_indices: list[int] = []
+        rects: list[tuple[int, int, int, int]] = []
+        offscreen_flags: list[bool] = []
+
+        # 名前/automation_id/矩形/オフスクリーンを CacheRequest で一括取得する。
+        # 失敗時は従来の descendants() に戻る（矩形は filter 時に個別取得）。
+        cached_items: Optional[list[Any]] = None
+        try:
+            condition = IUIA().build_condition(control_type=control_type, title=title)
+            cached_items = _find_all_build_cache(
+                self.window.element_info.element,
+                ("control_type", "name", "automation_id", "bounding_rectangle", "is_offscreen", "runtime_id"),
+                condition=condition,
+            )
+        except Exception as e:
+            logger.debug(f"scan_page_elements: cache request failed, falling back to descendants(): {e}")
 
-        descendants_kwargs: dict[str, Any] = {}
-        if control_type is not None:
-            descendants_kwargs["control_type"] = control_type
-        if title is not None:
-            descendants_kwargs["title"] = title
-        all_items = self.window.descendants(**descendants_kwargs) if descendants_kwargs else self.window.descendants()
+        if cached_items is not None:
+            all_items: Iterable[Any] = cached_items
+        else:
+            descendants_kwargs: dict[str, Any] = {}
+            if control_type is not None:
+                descendants_kwargs["control_type"] = control_type
+            if title is not None:
+                descendants_kwargs["title"] = title
+            all_items = self.window.descendants(**descendants_kwargs) if descendants_kwargs else self.window.descendants()
 
         truncated = False
         max_elements = int(max_elements) if max_elements is not None else 0
-        for item in all_items:
+        ttl_s = self.element_property_ttl_s
+        for raw in all_items:
             if len(elements_map) >= max_elements:
                 truncated = True
                 break
 
-            try:
-                name = item.window_text()
-            except Exception:
-                name = ""
-
-            try:
-                f_class = item.friendly_class_name()
-            except Exception:
+            seed: dict[str, Any] = {}
+            if cached_items is not None:
                 try:
-                    f_class = item.element_info.control_type
+                    wrapper = UIAWrapper(UIAElementInfo(raw))
                 except Exception:
-                    f_class = "Unknown"
-
-            try:
-                aid = item.element_info.automation_id
-            except Exception:
-                aid = ""
-            aid = "" if aid is None else str(aid)
+                    continue
+                rect = _read_cached_property(raw, "bounding_rectangle")
+                seed = {
+                    "automation_id": str(_read_cached_property(raw, "automation_id", "") or ""),
+                    "control_type": _read_cached_property(raw, "control_type"),
+                    "runtime_id": _read_cached_property(raw, "runtime_id"),
+                }
+                # name は window_text() と同じ意味にそろえる（Edit/Document は UIA Name ではなく
+                # TextPattern の本文を返すので、キャッシュ値で代用せず従来どおり取得させる）
+                if seed["control_type"] not in _TEXT_NAME_CONTROL_TYPES:
+                    seed["name"] = _read_cached_property(raw, "name", "") or ""
+                if rect is not None:
+                    seed["rectangle"] = Rect(*rect)
+                    geo_indices.append(len(elements_map))
+                    rects.append(rect)
+                    offscreen_flags.append(bool(_read_cached_property(raw, "is_offscreen", True)))
+            else:
+                wrapper = raw
+
+            item = ElementProxy(wrapper, ttl_s=ttl_s, seed=seed)
+            f_class = item.get("friendly_class", "Unknown")
 
             index = len(elements_map)
             elements_map[index] = item
             elements_info[index] = {
                 "control_type": str(f_class) if f_class is not None else "Unknown",
-                "name": name or "",
-                "automation_id": aid,
+                "name": item.get("name", ""),
+                "automation_id": item.get("automation_id", ""),
             }
 
+        geometry = _ElementGeometry(geo_indices, rects, offscreen_flags)
+        geometry.spatial_index()
+
         if update_mode == "overwrite":
             # 現在の要素を完全に置き換え
             self.current_elements = elements_map
             self.current_elements_info = elements_info
             self.current_elements_truncated = truncated
+            self.current_elements_geometry = geometry
         elif update_mode == "add":
             # 既存インデックスを保持して新しいインデックスで追加
             max_index = max(self.current_elements.keys()) if self.current_elements else -1
-            for idx, (elem, info) in enumerate(zip(elements_map.values(), elements_info.values())):
+            mapping: dict[int, int] = {}
+            for idx, (old_idx, elem) in enumerate(elements_map.items()):
                 new_idx = max_index + idx + 1
+                mapping[old_idx] = new_idx
                 self.current_elements[new_idx] = elem
-                self.current_elements_info[new_idx] = info
+                self.current_elements_info[new_idx] = elements_info[old_idx]
+            self.current_elements_geometry = self.current_elements_geometry.merged(geometry.remap(mapping))
         elif update_mode == "preserve":
             # スキャン結果は返すが、current_elementsは変更しない
             pass
 
         return f"Found {len(elements_map)} elements."
 
-    def filter_current_elements(
+    def _match_current_elements(
         self,
         *,
+        caller: str,
         class_names: Optional[Union[str, Iterable[str]]] = None,
         control_types: Optional[Union[str, Iterable[str]]] = None,
         name_regex: Optional[str] = None,
@@ -1313,13 +4878,15 @@ class NativeBrowserDriver:
         min_width: Optional[int] = None,
         min_height: Optional[int] = None,
         only_focusable: bool = False,
+        in_viewport: bool = False,
         automation_id_regex: Optional[str] = None,
         omit_no_name: bool = False,
         min_separator_count: int = 0,
-        update_mode: Literal["overwrite", "preserve"] = "overwrite",
-        output: str = "simple",
-    ) -> str:
-
+    ) -> list[tuple[int, "ElementProxy", str, str, str]]:
+        """
+        filter_current_elements / get_index 共通の絞り込み。
+        戻り値は (元インデックス, 要素, friendly_class, 表示名, automation_id) のリスト。
+        """
         control_types_list = None
         if control_types:
             control_types_list = [control_types] if isinstance(control_types, str) else list(control_types)
@@ -1337,34 +4904,22 @@ class NativeBrowserDriver:
         separator_threshold = max(0, int(min_separator_count or 0))
         separator_hits = 0
 
-        matched_items: list[tuple[Any, str, str, str]] = []
-        for index in sorted(self.current_elements.keys()):
-            item = self.current_elements[index]
-            try:
-                name = item.window_text()
-            except Exception:
-                name = ""
-            name = name or ""
-
-            try:
-                f_class = item.friendly_class_name()
-            except Exception:
-                try:
-                    f_class = item.element_info.control_type
-                except Exception:
-                    f_class = "Unknown"
+        geometry_check, geo_pass, viewport = self._prepare_geometry_filter(
+            min_width=min_width,
+            min_height=min_height,
+            only_visible=only_visible,
+            in_viewport=in_viewport,
+        )
 
-            try:
-                element_control_type = item.element_info.control_type
-            except Exception:
-                element_control_type = None
+        matched: list[tuple[int, ElementProxy, str, str, str]] = []
+        for index in sorted(self.current_elements.keys()):
+            item = self._element_proxy(index)
+            name = item.get("name", "")
+            f_class = item.get("friendly_class", "Unknown")
+            element_control_type = item.get("control_type")
 
-            value = ""
             if compiled_value_regex:
-                try:
-                    value = item.get_value()
-                except Exception:
-                    value = ""
+                value = item.get("value", "")
                 value = "" if value is None else str(value)
                 if not compiled_value_regex.search(value):
                     continue
@@ -1380,24 +4935,7 @@ class NativeBrowserDriver:
                     continue
 
                 if not name and omit_no_name:
-                    unnamed_allowed_types = [
-                        "CheckBox",
-                        "Button",
-                        "RadioButton",
-                        "ComboBox",
-                        "ListBox",
-                        "Edit",
-                        "Slider",
-                        "Spinner",
-                        "TabItem",
-                        "ToggleButton",
-                        "SplitButton",
-                        "MenuItem",
-                        "Link",
-                        "Hyperlink",
-                        "Separator",
-                    ]
-                    if element_control_type in unnamed_allowed_types:
+                    if element_control_type in _UNNAMED_ALLOWED_TYPES:
                         name = f"<{element_control_type}>"
                     else:
                         continue
@@ -1406,109 +4944,45 @@ class NativeBrowserDriver:
                     if element_control_type is None or element_control_type not in control_types_list:
                         continue
 
-                if min_width is not None or min_height is not None:
-                    rect = item.rectangle()
-                    if (min_width is not None and rect.width() <= min_width) or (min_height is not None and rect.height() <= min_height):
-                        continue
-
-                if only_visible:
-                    try:
-                        if not item.is_visible():
-                            continue
-                    except Exception:
-                        continue
+                if geometry_check and not self._passes_geometry(
+                    index,
+                    item,
+                    geo_pass,
+                    min_width=min_width,
+                    min_height=min_height,
+                    only_visible=only_visible,
+                    viewport=viewport,
+                ):
+                    continue
 
-                if require_enabled:
-                    try:
-                        if not item.is_enabled():
-                            continue
-                    except Exception:
-                        continue
+                if require_enabled and not item.get("enabled", False):
+                    continue
 
-                if only_focusable:
-                    try:
-                        if not item.is_keyboard_focusable():
-                            continue
-                    except Exception:
-                        continue
+                if only_focusable and not item.get("focusable", False):
+                    continue
 
-                if class_names_list:
-                    try:
-                        if f_class not in class_names_list:
-                            continue
-                    except Exception:
-                        continue
+                if class_names_list and f_class not in class_names_list:
+                    continue
 
                 if compiled_regex and not compiled_regex.search(name):
                     continue
 
-                try:
-                    auto_id = item.element_info.automation_id
-                except Exception:
-                    auto_id = ""
-                auto_id = "" if auto_id is None else str(auto_id)
-
+                auto_id = item.get("automation_id", "")
                 if compiled_automation_id_regex:
                     if not compiled_automation_id_regex.search(auto_id):
                         continue
 
-                aid = auto_id
-
-                matched_items.append((item, f_class, name, aid))
+                matched.append((index, item, f_class, name, auto_id))
             except Exception as e:
                 logger.debug(
-                    f"filter_current_elements: Exception at index {index}: "
+                    f"{caller}: Exception at index {index}: "
                     f"{type(e).__name__}: {e}"
                 )
                 continue
 
-        logger.debug(
-            f"filter_current_elements: Processed {len(self.current_elements)} elements, "
-            f"matched {len(matched_items)} items"
-        )
-
-        selected_indices = list(range(len(matched_items)))
-        elements_map: dict[int, Any] = {}
-        elements_info: dict[int, dict[str, object]] = {}
-        for current_index in selected_indices:
-            item, f_class, name, aid = matched_items[current_index]
-            elements_map[current_index] = item
-            elements_info[current_index] = {
-                "control_type": str(f_class) if f_class is not None else "Unknown",
-                "name": name or "",
-                "automation_id": aid,
-            }
-
-        output_mode = str(output or "simple").lower()
-        if output_mode == "simple":
-            result = f"Filtered {len(elements_map)} elements."
-        elif output_mode == "summary":
-            result = self._format_elements_summary(elements_map, elements_info, truncated=False)
-        elif output_mode == "full":
-            result = self._format_elements_list(elements_map, elements_info, truncated=False)
-        else:
-            raise InvalidInputError(
-                f"filter_current_elements: unknown output mode: {output!r}",
-                code="invalid_output_mode",
-            )
-
-        if update_mode == "overwrite":
-            # 現在の要素を完全に置き換え
-            self.current_elements = elements_map
-            self.current_elements_info = elements_info
-            self.current_elements_truncated = False
-        elif update_mode == "preserve":
-            # フィルタ結果は返すが、current_elementsは変更しない
-            pass
-
-        logger.debug(
-            f"filter_current_elements: Final result = {len(elements_map)} elements, "
-            f"update_mode={update_mode}"
-        )
-
-        return result
+        return matched
 
-    def get_index(
+    def filter_current_elements(
         self,
         *,
         class_names: Optional[Union[str, Iterable[str]]] = None,
@@ -1520,150 +4994,117 @@ class NativeBrowserDriver:
         min_width: Optional[int] = None,
         min_height: Optional[int] = None,
         only_focusable: bool = False,
+        in_viewport: bool = False,
         automation_id_regex: Optional[str] = None,
         omit_no_name: bool = False,
         min_separator_count: int = 0,
-    ) -> list[int]:
-
-        control_types_list = None
-        if control_types:
-            control_types_list = [control_types] if isinstance(control_types, str) else list(control_types)
-
-        class_names_list = None
-        if class_names:
-            class_names_list = [class_names] if isinstance(class_names, str) else list(class_names)
+        update_mode: Literal["overwrite", "preserve"] = "overwrite",
+        output: str = "simple",
+    ) -> str:
 
-        compiled_regex = re.compile(name_regex) if name_regex else None
-        compiled_value_regex = re.compile(value_regex) if value_regex else None
-        compiled_automation_id_regex = (
-            re.compile(automation_id_regex) if automation_id_regex else None
+        matched_items = self._match_current_elements(
+            caller="filter_current_elements",
+            class_names=class_names,
+            control_types=control_types,
+            name_regex=name_regex,
+            value_regex=value_regex,
+            only_visible=only_visible,
+            require_enabled=require_enabled,
+            min_width=min_width,
+            min_height=min_height,
+            only_focusable=only_focusable,
+            in_viewport=in_viewport,
+            automation_id_regex=automation_id_regex,
+            omit_no_name=omit_no_name,
+            min_separator_count=min_separator_count,
         )
 
-        separator_threshold = max(0, int(min_separator_count or 0))
-        separator_hits = 0
-
-        matched_indices: list[int] = []
-        for index in sorted(self.current_elements.keys()):
-            item = self.current_elements[index]
-            try:
-                name = item.window_text()
-            except Exception:
-                name = ""
-            name = name or ""
-
-            try:
-                f_class = item.friendly_class_name()
-            except Exception:
-                try:
-                    f_class = item.element_info.control_type
-                except Exception:
-                    f_class = "Unknown"
-
-            try:
-                element_control_type = item.element_info.control_type
-            except Exception:
-                element_control_type = None
-
-            value = ""
-            if compiled_value_regex:
-                try:
-                    value = item.get_value()
-                except Exception:
-                    value = ""
-                value = "" if value is None else str(value)
-                if not compiled_value_regex.search(value):
-                    continue
-
-            try:
-                is_separator = element_control_type == "Separator"
-                if is_separator:
-                    separator_hits += 1
-                    if separator_threshold and separator_hits <= separator_threshold:
-                        continue
-
-                if separator_threshold and separator_hits < separator_threshold:
-                    continue
-
-                if not name and omit_no_name:
-                    unnamed_allowed_types = [
-                        "CheckBox",
-                        "Button",
-                        "RadioButton",
-                        "ComboBox",
-                        "ListBox",
-                        "Edit",
-                        "Slider",
-                        "Spinner",
-                        "TabItem",
-                        "ToggleButton",
-                        "SplitButton",
-                        "MenuItem",
-                        "Link",
-                        "Hyperlink",
-                        "Separator",
-                    ]
-                    if element_control_type in unnamed_allowed_types:
-                        name = f"<{element_control_type}>"
-                    else:
-                        continue
-
-                if control_types_list:
-                    if element_control_type is None or element_control_type not in control_types_list:
-                        continue
-
-                if min_width is not None or min_height is not None:
-                    rect = item.rectangle()
-                    if (min_width is not None and rect.width() <= min_width) or (min_height is not None and rect.height() <= min_height):
-                        continue
-
-                if only_visible:
-                    try:
-                        if not item.is_visible():
-                            continue
-                    except Exception:
-                        continue
+        logger.debug(
+            f"filter_current_elements: Processed {len(self.current_elements)} elements, "
+            f"matched {len(matched_items)} items"
+        )
 
-                if require_enabled:
-                    try:
-                        if not item.is_enabled():
-                            continue
-                    except Exception:
-                        continue
+        selected_indices = list(range(len(matched_items)))
+        elements_map: dict[int, Any] = {}
+        elements_info: dict[int, dict[str, object]] = {}
+        index_mapping: dict[int, int] = {}
+        for current_index in selected_indices:
+            source_index, item, f_class, name, aid = matched_items[current_index]
+            index_mapping[source_index] = current_index
+            elements_map[current_index] = item
+            elements_info[current_index] = {
+                "control_type": str(f_class) if f_class is not None else "Unknown",
+                "name": name or "",
+                "automation_id": aid,
+            }
 
-                if only_focusable:
-                    try:
-                        if not item.is_keyboard_focusable():
-                            continue
-                    except Exception:
-                        continue
+        output_mode = str(output or "simple").lower()
+        if output_mode == "simple":
+            result = f"Filtered {len(elements_map)} elements."
+        elif output_mode == "summary":
+            result = self._format_elements_summary(elements_map, elements_info, truncated=False)
+        elif output_mode == "full":
+            result = self._format_elements_list(elements_map, elements_info, truncated=False)
+        else:
+            raise InvalidInputError(
+                f"filter_current_elements: unknown output mode: {output!r}",
+                code="invalid_output_mode",
+            )
 
-                if class_names_list:
-                    try:
-                        if f_class not in class_names_list:
-                            continue
-                    except Exception:
-                        continue
+        if update_mode == "overwrite":
+            # 現在の要素を完全に置き換え
+            self.current_elements_geometry = self.current_elements_geometry.remap(index_mapping)
+            self.current_elements = elements_map
+            self.current_elements_info = elements_info
+            self.current_elements_truncated = False
+        elif update_mode == "preserve":
+            # フィルタ結果は返すが、current_elementsは変更しない
+            pass
 
-                if compiled_regex and not compiled_regex.search(name):
-                    continue
+        logger.debug(
+            f"filter_current_elements: Final result = {len(elements_map)} elements, "
+            f"update_mode={update_mode}"
+        )
 
-                try:
-                    auto_id = item.element_info.automation_id
-                except Exception:
-                    auto_id = ""
-                auto_id = "" if auto_id is None else str(auto_id)
+        return result
 
-                if compiled_automation_id_regex:
-                    if not compiled_automation_id_regex.search(auto_id):
-                        continue
+    def get_index(
+        self,
+        *,
+        class_names: Optional[Union[str, Iterable[str]]] = None,
+        control_types: Optional[Union[str, Iterable[str]]] = None,
+        name_regex: Optional[str] = None,
+        value_regex: Optional[str] = None,
+        only_visible: bool = False,
+        require_enabled: bool = False,
+        min_width: Optional[int] = None,
+        min_height: Optional[int] = None,
+        only_focusable: bool = False,
+        in_viewport: bool = False,
+        automation_id_regex: Optional[str] = None,
+        omit_no_name: bool = False,
+        min_separator_count: int = 0,
+    ) -> list[int]:
 
-                matched_indices.append(index)
-            except Exception as e:
-                logger.debug(
-                    f"get_index: Exception at index {index}: "
-                    f"{type(e).__name__}: {e}"
-                )
-                continue
+        matched_indices = [
+            index
+            for index, *_ in self._match_current_elements(
+                caller="get_index",
+                class_names=class_names,
+                control_types=control_types,
+                name_regex=name_regex,
+                value_regex=value_regex,
+                only_visible=only_visible,
+                require_enabled=require_enabled,
+                min_width=min_width,
+                min_height=min_height,
+                only_focusable=only_focusable,
+                in_viewport=in_viewport,
+                automation_id_regex=automation_id_regex,
+                omit_no_name=omit_no_name,
+                min_separator_count=min_separator_count,
+            )
+        ]
 
         logger.debug(
             f"get_index: Processed {len(self.current_elements)} elements, "
@@ -1672,36 +5113,82 @@ class NativeBrowserDriver:
 
         return matched_indices
 
+    def _element_proxy(self, index: int) -> ElementProxy:
+        """current_elements[index] を ElementProxy として返す（生ラッパーなら包み直して保存）。"""
+        item = self.current_elements[index]
+        if not isinstance(item, ElementProxy):
+            item = ElementProxy(item, ttl_s=self.element_property_ttl_s)
+            self.current_elements[index] = item
+        return item
+
+    def _prepare_geometry_filter(
+        self,
+        *,
+        min_width: Optional[int],
+        min_height: Optional[int],
+        only_visible: bool,
+        in_viewport: bool,
+    ) -> tuple[bool, set[int], Optional[Rect]]:
+        """幾何条件をスキャン時の矩形スナップショットに対して一括評価する。"""
+        geometry_check = min_width is not None or min_height is not None or only_visible or in_viewport
+        if not geometry_check:
+            return False, set(), None
+
+        viewport = _get_window_rect(self.hwnd) if in_viewport else None
+        geo_pass = self.current_elements_geometry.passing(
+            min_width=min_width,
+            min_height=min_height,
+            only_visible=only_visible,
+            viewport=viewport,
+        )
+        return True, geo_pass, viewport
+
+    def _passes_geometry(
+        self,
+        index: int,
+        item: Any,
+        geo_pass: set[int],
+        *,
+        min_width: Optional[int],
+        min_height: Optional[int],
+        only_visible: bool,
+        viewport: Optional[Rect],
+    ) -> bool:
+        if index in self.current_elements_geometry:
+            return index in geo_pass
+
+        # スナップショットに無い要素（フォールバックスキャン等）は個別に取得する
+        if min_width is not None or min_height is not None or viewport is not None:
+            rect = item.get("rectangle")
+            if rect is None:
+                return False
+            if min_width is not None and rect.width <= min_width:
+                return False
+            if min_height is not None and rect.height <= min_height:
+                return False
+            if viewport is not None and not (
+                rect.left < viewport.right
+                and rect.right > viewport.left
+                and rect.top < viewport.bottom
+                and rect.bottom > viewport.top
+            ):
+                return False
+        if only_visible and not item.get("visible", False):
+            return False
+        return True
+
     def _ensure_current_elements_info(self) -> dict[int, dict[str, object]]:
         info = getattr(self, "current_elements_info", None)
         if isinstance(info, dict) and set(info.keys()) == set(self.current_elements.keys()):
             return info
 
         info = {}
-        for index, item in self.current_elements.items():
-            try:
-                control_type = item.friendly_class_name()
-            except Exception:
-                try:
-                    control_type = item.element_info.control_type
-                except Exception:
-                    control_type = "Unknown"
-
-            try:
-                name = item.window_text()
-            except Exception:
-                name = ""
-
-            try:
-                aid = item.element_info.automation_id
-            except Exception:
-                aid = ""
-            aid = "" if aid is None else str(aid)
-
+        for index in self.current_elements:
+            item = self._element_proxy(index)
             info[index] = {
-                "control_type": str(control_type) if control_type is not None else "Unknown",
-                "name": name,
-                "automation_id": aid,
+                "control_type": str(item.get("friendly_class", "Unknown") or "Unknown"),
+                "name": item.get("name", ""),
+                "automation_id": item.get("automation_id", ""),
             }
 
         self.current_elements_info = info
@@ -1713,9 +5200,11 @@ class NativeBrowserDriver:
         elements_info: dict[int, dict[str, object]],
         *,
         truncated: bool,
+        order: Optional[Iterable[int]] = None,
     ) -> str:
         lines: list[str] = []
-        for index in sorted(elements_map.keys()):
+        indices = sorted(elements_map.keys()) if order is None else [i for i in order if i in elements_map]
+        for index in indices:
             info = elements_info.get(index, {})
             control_type = info.get("control_type") or "Unknown"
             name = info.get("name") or ""
@@ -1767,6 +5256,118 @@ class NativeBrowserDriver:
             truncated=self.current_elements_truncated,
         )
 
+    def _ensure_geometry(self) -> _ElementGeometry:
+        """current_elements のうち矩形スナップショットに無い要素を個別取得で補う。"""
+        geometry = self.current_elements_geometry
+        missing = [index for index in self.current_elements if index not in geometry]
+        if not missing:
+            return geometry
+
+        indices: list[int] = []
+        rects: list[tuple[int, int, int, int]] = []
+        offscreen: list[bool] = []
+        for index in missing:
+            item = self._element_proxy(index)
+            rect = item.get("rectangle")
+            if rect is None:
+                continue
+            indices.append(index)
+            rects.append((rect.left, rect.top, rect.right, rect.bottom))
+            offscreen.append(not item.get("visible", False))
+
+        self.current_elements_geometry = geometry.merged(_ElementGeometry(indices, rects, offscreen))
+        return self.current_elements_geometry
+
+    def _to_screen_coords(self, x: int, y: int, screen_coords: bool) -> tuple[int, int]:
+        if screen_coords:
+            return int(x), int(y)
+        rect = _get_window_rect(self.hwnd)
+        return rect.left + int(x), rect.top + int(y)
+
+    def find_elements_at_point(
+        self,
+        x: int,
+        y: int,
+        *,
+        screen_coords: bool = False,
+        limit: Optional[int] = None,
+    ) -> list[int]:
+        """
+        指定座標を含む current_elements のインデックスを返す（最も深い/小さい要素が先頭）。
+        座標は既定でウィンドウ相対（click / screenshot と同じ）、screen_coords=True でスクリーン絶対。
+        """
+        sx, sy = self._to_screen_coords(x, y, screen_coords)
+        hits = self._ensure_geometry().spatial_index().at_point(sx, sy)
+        return hits[:limit] if limit else hits
+
+    def find_elements_in_region(
+        self,
+        left: int,
+        top: int,
+        right: int,
+        bottom: int,
+        *,
+        mode: Literal["inside", "intersect"] = "inside",
+        screen_coords: bool = False,
+        limit: Optional[int] = None,
+    ) -> list[int]:
+        """指定矩形内（inside）または交差（intersect）する current_elements のインデックスを返す。"""
+        if mode not in ("inside", "intersect"):
+            raise InvalidInputError(
+                f"find_elements_in_region: mode must be 'inside' or 'intersect' (mode={mode!r})",
+                code="invalid_mode",
+            )
+        sl, st = self._to_screen_coords(left, top, screen_coords)
+        sr, sb = self._to_screen_coords(right, bottom, screen_coords)
+        hits = self._ensure_geometry().spatial_index().in_region(sl, st, sr, sb, mode=mode)
+        return hits[:limit] if limit else hits
+
+    def get_elements_list_for(self, indices: Iterable[int]) -> str:
+        """指定インデックスの要素を指定順で一覧表示する。"""
+        info_map = self._ensure_current_elements_info()
+        return self._format_elements_list(
+            self.current_elements,
+            info_map,
+            truncated=False,
+            order=indices,
+        )
+
+    def get_current_elements_outline(
+        self,
+        *,
+        max_chars: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_name_len: int = 60,
+        only_current: bool = True,
+    ) -> str:
+        """
+        current_elements を階層付きの圧縮アウトラインで返す（LLM 向け）。
+        - 名前なしの入れ物を畳み、同一の連続兄弟は ×N にまとめ、長い名前は max_name_len で切る
+        - max_chars / max_tokens を超える場合は操作系要素を優先して残す
+        - only_current=False で current_elements に無い要素も（インデックス無しで）表示
+        """
+        if max_chars is None and max_tokens is not None:
+            max_chars = int(max_tokens) * _CHARS_PER_TOKEN
+
+        index_by_runtime_id: dict[tuple[int, ...], int] = {}
+        for index in self.current_elements:
+            runtime_id = self._element_proxy(index).get("runtime_id")
+            if runtime_id:
+                index_by_runtime_id[runtime_id] = index
+
+        try:
+            cached_root = _build_cached_subtree(
+                self.window.element_info.element,
+                ("control_type", "name", "automation_id", "runtime_id"),
+            )
+            root: Optional[_OutlineNode] = _outline_from_cached_tree(cached_root, index_by_runtime_id)
+        except Exception as e:
+            raise ExternalApiError(f"get_current_elements_outline: failed to read element tree: {e}") from e
+
+        if only_current:
+            root = _prune_outline(root)
+        return _render_outline(root, max_chars=max_chars, max_name_len=max_name_len)
+
     def click_by_index(self, index):
         result = self.click_by_index_result(index)
         _raise_for_result(result)
@@ -1779,8 +5380,14 @@ class NativeBrowserDriver:
                 f"click_by_index: element not found (index={index})",
             )
 
-        elem = self.current_elements[index]
+        elem = self._element_proxy(index)
         try:
+            ok, method = self._try_background("click_by_index", lambda: _activate_by_pattern(elem))
+            if ok:
+                return ActionResult.success(
+                    f"click_by_index: ok (index={index})",
+                    data={"method": method, "input_mode": "background"},
+                )
             elem.invoke()
             return ActionResult.success(
                 f"click_by_index: ok (index={index})",
@@ -1800,6 +5407,8 @@ class NativeBrowserDriver:
                     "click_by_index: failed to click "
                     f"(index={index}): invoke={invoke_error}; click_input={click_error}",
                 )
+        finally:
+            elem.invalidate()
 
     def click_by_index_or_raise(self, index: int) -> None:
         result = self.click_by_index_result(index)
@@ -1813,7 +5422,7 @@ class NativeBrowserDriver:
 
     def select_all_and_get_text_result(self) -> ActionResult:
         """Ctrl+Aで全選択してCtrl+Cでクリップボードにコピーし、テキストを取得（ActionResult版）"""
-        return self._perform_clipboard_transfer("^a^c", timeout_s=1.2, settle_ms=100)
+        return self._perform_clipboard_transfer("^a^c", timeout_s=1.2, settle_ms=100, preserve=True)
 
     def select_all_and_get_text_or_raise(self) -> str:
         result = self.select_all_and_get_text_result()
@@ -1824,31 +5433,114 @@ class NativeBrowserDriver:
     # ページスクロール機能
     # ========================================
 
-    def scroll_down(self, amount: int = 500) -> None:
-        """指定したピクセル数だけ下にスクロール"""
-        def _action() -> None:
-            for _ in range(amount // 100):
-                send_keys("{DOWN}")
-                time.sleep(0.01)
+    def _document_scroll(self):
+        """Document 要素とその ScrollPattern インターフェース。"""
+        document = self._find_document_element()
+        return document, get_elem_interface(document, "Scroll")
+
+    def get_scroll_position(self) -> dict[str, Any]:
+        """Document の縦スクロール位置（ScrollPattern、スクロール不可なら percent=-1）。"""
+        _, scroll = self._document_scroll()
+        return _scroll_position(scroll)
+
+    def _scroll_to_percent(self, percent: float) -> ActionResult:
+        document, scroll = self._document_scroll()
+        before = _scroll_position(scroll)
+        if not before["vertically_scrollable"]:
+            return ActionResult.success("scroll: not scrollable", data={"method": "none", "before": before, "after": before})
+        scroll.SetScrollPercent(_SCROLL_NO_SCROLL, float(percent))
+        after = before
+        # Chrome は反映が非同期なことがあるので、位置が動くまで短時間だけ待つ
+        if abs(before["vertical_percent"] - percent) > 1e-6:
+            latest: dict[str, Any] = {}
+
+            def _moved() -> bool:
+                latest["position"] = _scroll_position(scroll)
+                return latest["position"]["vertical_percent"] != before["vertical_percent"]
+
+            wait_for(_moved, timeout_s=0.3, interval_s=0.01, backoff=2.0, max_interval_s=0.05, label="scroll:pattern")
+            after = latest.get("position", before)
+        return ActionResult.success(
+            f"scroll: {after['vertical_percent']:.1f}%",
+            data={"method": "scroll_pattern", "before": before, "after": after},
+        )
+
+    def _scroll_by_wheel(self, pixels: int) -> ActionResult:
+        """Document 中央にカーソルを置き、pixels 相当のホイールイベントを1回送る。"""
+        rect = _get_window_rect(self.hwnd)
+        try:
+            document = self._find_document_element()
+            r = document.CurrentBoundingRectangle
+            rect = Rect(int(r.left), int(r.top), int(r.right), int(r.bottom))
+        except Exception:
+            pass
+        self._prepare_for_input(maximize=False, foreground=True, settle_ms=0)
+        center = (rect.left + rect.width // 2, rect.top + rect.height // 2)
+        mouse.move(coords=center)
+        # 下方向は負のホイール量。Chrome/Edge は1ノッチ(120)でおよそ100px スクロールする
+        delta = -int(round(pixels * _WHEEL_DELTA / _WHEEL_PIXELS_PER_NOTCH))
+        self.keyboard.backend.send([_MOUSEINPUT(0, 0, ctypes.c_ulong(delta).value, _MOUSEEVENTF_WHEEL, 0, 0)])
+        try:
+            after: Optional[dict[str, Any]] = self.get_scroll_position()
+        except Exception:
+            after = None
+        return ActionResult.success(
+            f"scroll: wheel {pixels}px",
+            data={"method": "wheel", "wheel_delta": delta, "after": after},
+        )
+
+    def scroll_by(self, pixels: int) -> ActionResult:
+        """
+        pixels だけ縦スクロールする（正で下、負で上）。
 
-        self._send_shortcut(_action)
+        Document の ScrollPattern が使えれば、表示領域の高さと ViewSize からスクロール可能な
+        ピクセル数を求めて SetScrollPercent で一度に移動する（前面化不要）。使えない場合は
+        計算したホイール量のイベントを1回だけ送る。data の after に移動後の位置を返す。
+        """
+        pixels = int(pixels)
+        if pixels == 0:
+            return ActionResult.success("scroll: no-op", data={"method": "none"})
+        try:
+            document, scroll = self._document_scroll()
+            position = _scroll_position(scroll)
+            view_size = position["vertical_view_size"]
+            if position["vertically_scrollable"] and 0 < view_size < 100:
+                r = document.CurrentBoundingRectangle
+                viewport_h = max(1, int(r.bottom - r.top))
+                scrollable_px = viewport_h * (100.0 / view_size - 1.0)
+                target = position["vertical_percent"] + pixels / scrollable_px * 100.0
+                result = self._scroll_to_percent(min(100.0, max(0.0, target)))
+                result.data["pixels"] = pixels
+                return result
+        except Exception as e:
+            logger.debug(f"scroll_by: ScrollPattern unavailable, falling back to wheel: {e}")
+        return self._scroll_by_wheel(pixels)
 
-    def scroll_up(self, amount: int = 500) -> None:
-        """指定したピクセル数だけ上にスクロール"""
-        def _action() -> None:
-            for _ in range(amount // 100):
-                send_keys("{UP}")
-                time.sleep(0.01)
+    def scroll_down(self, amount: int = 500) -> ActionResult:
+        """指定したピクセル数だけ下にスクロール（移動後の位置を返す）"""
+        return self.scroll_by(abs(int(amount)))
 
-        self._send_shortcut(_action)
+    def scroll_up(self, amount: int = 500) -> ActionResult:
+        """指定したピクセル数だけ上にスクロール（移動後の位置を返す）"""
+        return self.scroll_by(-abs(int(amount)))
 
-    def scroll_to_bottom(self) -> None:
+    def scroll_to_bottom(self) -> ActionResult:
         """ページの最下部までスクロール"""
+        try:
+            return self._scroll_to_percent(100.0)
+        except Exception as e:
+            logger.debug(f"scroll_to_bottom: ScrollPattern unavailable, falling back to keys: {e}")
         self._send_shortcut(keys="^{END}", post_sleep_s=0.2)
+        return ActionResult.success("scroll: bottom", data={"method": "keys"})
 
-    def scroll_to_top(self) -> None:
+    def scroll_to_top(self) -> ActionResult:
         """ページの最上部までスクロール"""
+        try:
+            return self._scroll_to_percent(0.0)
+        except Exception as e:
+            logger.debug(f"scroll_to_top: ScrollPattern unavailable, falling back to keys: {e}")
         self._send_shortcut(keys="^{HOME}", post_sleep_s=0.2)
+        return ActionResult.success("scroll: top", data={"method": "keys"})
 
     def page_down(self) -> None:
         """Page Downキーでスクロール"""
@@ -1862,24 +5554,87 @@ class NativeBrowserDriver:
     # テキスト入力・検索機能
     # ========================================
 
-    def type_text(self, text: str, *, method: Literal["paste", "type"] = "paste") -> None:
+    def _focused_value(self) -> Optional[str]:
+        """フォーカス中の要素の Value（ValuePattern を持たなければ None）。"""
+        try:
+            return get_elem_interface(IUIA().iuia.GetFocusedElement(), "Value").CurrentValue
+        except Exception:
+            return None
+
+    def _paste_text(
+        self,
+        text: str,
+        *,
+        label: str,
+        keys: Callable[[str], Any] = send_keys,
+        settle_ms: int = 80,
+    ) -> dict[str, Any]:
+        """
+        前面化から Ctrl+V の反映確認までを1つのクリップボード排他区間で行う。
+
+        フォーカス要素の Value の変化を確認できたら元のクリップボードに戻す。
+        ValuePattern が無く確認しようがない要素（contenteditable など）は _PASTE_RESTORE_DELAY_S 待ってから戻す。
+        Value を読めるのに時間内に変わらなければ、貼り付け途中の可能性があるので戻さない。
+        """
+        with self._clipboard_transaction(label, preserve=True) as transaction:
+            self._prepare_for_input(maximize=False, foreground=True, settle_ms=settle_ms)
+            before = self._focused_value()
+            transaction.write_text(text)
+            sent = keys("^v")
+            # 貼り付けはブラウザ側で非同期に処理されるので、Value の変化を見てから戻す
+            observed = bool(text) and before is not None and bool(
+                wait_for(
+                    lambda: self._focused_value() != before,
+                    timeout_s=1.0,
+                    interval_s=0.02,
+                    label=f"{label}:paste",
+                )
+            )
+            if observed or not text:
+                restored = transaction.restore()
+            elif before is None:
+                time.sleep(_PASTE_RESTORE_DELAY_S)
+                restored = transaction.restore()
+            else:
+                if transaction.snapshot is not None:
+                    logger.warning(f"{label}: 貼り付けの反映を確認できないためクリップボードを復元しません")
+                transaction.keep()
+                restored = False
+        return {"observed": observed, "clipboard_restored": restored, "events": sent if isinstance(sent, int) else 0}
+
+    def type_text(self, text: str, *, method: Literal["paste", "type"] = "paste") -> ActionResult:
         """
         フォーカス中の要素にテキストを入力。
         method="paste" でクリップボード経由のCtrl+V（デフォルト）、
-        method="type" で一文字ずつ送信。
+        method="type" でキー入力として送信（KeyboardEngine が SendInput でまとめて送る）。
+        どちらも text は文字どおりに入力し、{ENTER} や ^a などのキー記法は解釈しない（キー操作は send_keys / run_input_macro）。
+
+        paste ではフォーカス要素の Value が変わったことを確認してからクリップボードを戻す。
+        ValuePattern が無く確認できない要素では一定時間待ってから戻し、Value が時間内に変わらない場合は
+        貼り付け中の可能性があるので戻さずに data["clipboard_restored"]=False で知らせる。
         """
-        self.ensure_visible(maximize=False, foreground=True, settle_ms=80)
-        self.window.set_focus()
+        if method not in ("paste", "type"):
+            raise InvalidInputError("type_text: method must be 'paste' or 'type'", code="invalid_method")
+        # background ではどちらの method でも WM_CHAR で直接送る（クリップボードも使わない）。
+        # フォーカスがページ内の入力欄に無い場合は送信前に前面操作へ切り替える。
+        # 送信後に反映を確認できなくても前面で打ち直さず、code="unverified" で返す
+        ok, posted = self._try_background("type_text", lambda: self._type_in_background(text))
+        if ok:
+            data = {"method": "background", **posted}
+            if not posted["observed"]:
+                return ActionResult.success("type_text: background (unverified)", data=data, code="unverified")
+            return ActionResult.success("type_text: background", data=data)
 
         if method == "paste":
-            _set_clipboard_text(text)
-            send_keys("^v")
-        elif method == "type":
-            send_keys(text, with_spaces=True)
-        else:
-            raise InvalidInputError("type_text: method must be 'paste' or 'type'", code="invalid_method")
+            pasted = self._paste_text(text, label="type_text")
+            pasted.pop("events")
+            return ActionResult.success("type_text: paste", data={"method": "paste", **pasted})
 
+        self.ensure_visible(maximize=False, foreground=True, settle_ms=80)
+        self.window.set_focus()
+        self.keyboard.type_text(text)
         time.sleep(0.1)
+        return ActionResult.success("type_text: type", data={"method": "type"})
 
     def find_text_on_page(self, search_text: str, *, method: Literal["paste", "type"] = "paste") -> None:
         """Ctrl+Fでページ内検索を開き、指定方式で入力"""
@@ -1890,25 +5645,106 @@ class NativeBrowserDriver:
         self.type_text(search_text, method=method)
         time.sleep(0.2)
 
+    # ========================================
+    # 入力マクロ
+    # ========================================
+
+    def run_input_macro(self, steps: Iterable[dict[str, Any]]) -> ActionResult:
+        """
+        入力マクロ（InputMacro の手順 dict のリスト）を実行する。
+
+        手順は実行前にまとめて検証し（不正なら InvalidInputError）、ウィンドウの前面化とフォーカスは
+        最初に1回だけ行う。連続する入力系の手順は1回の SendInput にまとめて送る。
+        クリップボードは paste 手順ごとに排他区間を取り（前面化し直してから貼り付け）、待機中は保持しない。
+        wait_for が timeout した場合はそこで中断し、code="timeout" の ActionResult を返す。
+        """
+        macro = InputMacro.compile(steps, keyboard=self.keyboard)
+        started = time.monotonic()
+        self._prepare_for_input(maximize=False, foreground=True, settle_ms=80)
+        baseline = {"url": self._probe_url(), "title": self._probe_title()}
+        origin = _get_window_rect(self.hwnd)
+        events_sent = 0
+        waits: list[dict[str, Any]] = []
+        pastes: list[dict[str, Any]] = []
+
+        def _condition(op: _MacroOp) -> Callable[[], bool]:
+            if op.condition == "url_changed":
+                return lambda: self._probe_url() not in ("Unknown", "", baseline["url"])
+            if op.condition == "title_changed":
+                return lambda: self._probe_title() not in ("", baseline["title"])
+            if op.condition == "url_contains":
+                return lambda: op.value in self._probe_url()
+            return lambda: op.value in self._probe_title()
+
+        def _result(ok: bool, failed_step: Optional[int] = None) -> ActionResult:
+            data = {
+                "steps": macro.step_count,
+                "batches": macro.batch_count,
+                "events": events_sent,
+                "waits": waits,
+                "pastes": pastes,
+                "elapsed_s": round(time.monotonic() - started, 3),
+            }
+            if ok:
+                return ActionResult.success(f"run_input_macro: ok ({macro.step_count} steps)", data=data)
+            data["failed_step"] = failed_step
+            return ActionResult.failure(
+                "timeout", f"run_input_macro: wait_for timed out at step {failed_step}", data=data
+            )
+
+        for op in macro.ops:
+            if op.kind == "input":
+                events: list[Any] = []
+                for item in op.items:
+                    if isinstance(item, _MacroClick):
+                        events.extend(_mouse_click_inputs(origin.left + item.x, origin.top + item.y, item.button))
+                    else:
+                        events.append(item)
+                events_sent += self.keyboard.send(events)
+            elif op.kind == "paste":
+                pasted = self._paste_text(op.text, label="input_macro", keys=self.keyboard.send_keys, settle_ms=0)
+                events_sent += pasted.pop("events")
+                pastes.append({"step": op.step, **pasted})
+            elif op.kind == "sleep":
+                time.sleep(op.seconds)
+            elif op.condition == "ready":
+                ready = self.wait_for_ready(op.seconds)
+                waits.append({"step": op.step, **(ready.data or {})})
+                if not ready.ok:
+                    return _result(False, op.step)
+            else:
+                outcome = wait_for(
+                    _condition(op),
+                    op.seconds,
+                    0.02,
+                    backoff=1.5,
+                    max_interval_s=0.2,
+                    label=f"macro:{op.condition}",
+                )
+                waits.append({"step": op.step, **outcome.as_dict()})
+                if not outcome:
+                    return _result(False, op.step)
+        return _result(True)
+
     # ========================================
     # タブ操作機能
     # ========================================
 
     def new_tab(self) -> None:
         """新しいタブを開く (Ctrl+T)"""
-        self._send_shortcut(keys="^t", post_sleep_s=0.3)
+        self._send_shortcut(keys="^t", post_sleep_s=0.3, ack=self._probe_tab_count, label="new_tab")
 
     def close_tab(self) -> None:
         """現在のタブを閉じる (Ctrl+W)"""
-        self._send_shortcut(keys="^w", post_sleep_s=0.3)
+        self._send_shortcut(keys="^w", post_sleep_s=0.3, ack=self._probe_tab_count, label="close_tab")
 
     def next_tab(self) -> None:
         """次のタブに切り替え (Ctrl+Tab)"""
-        self._send_shortcut(keys="^{TAB}", post_sleep_s=0.2)
+        self._send_shortcut(keys="^{TAB}", post_sleep_s=0.2, ack=self._probe_title, label="next_tab")
 
     def previous_tab(self) -> None:
         """前のタブに切り替え (Ctrl+Shift+Tab)"""
-        self._send_shortcut(keys="^+{TAB}", post_sleep_s=0.2)
+        self._send_shortcut(keys="^+{TAB}", post_sleep_s=0.2, ack=self._probe_title, label="previous_tab")
 
     # ========================================
     # ブラウザ操作機能
@@ -1916,27 +5752,27 @@ class NativeBrowserDriver:
 
     def back(self) -> None:
         """戻る (Alt+←)"""
-        self._send_shortcut(keys="%{LEFT}", post_sleep_s=0.5)
+        self._send_shortcut(keys="%{LEFT}", post_sleep_s=0.5, ack=self._probe_url, label="back")
 
     def forward(self) -> None:
         """進む (Alt+→)"""
-        self._send_shortcut(keys="%{RIGHT}", post_sleep_s=0.5)
+        self._send_shortcut(keys="%{RIGHT}", post_sleep_s=0.5, ack=self._probe_url, label="forward")
 
     def refresh(self) -> None:
         """ページをリロード (F5)"""
-        self._send_shortcut(keys="{F5}", post_sleep_s=0.5)
+        self._send_shortcut(keys="{F5}", post_sleep_s=0.5, ack=self._probe_document_identity, label="refresh")
 
     def zoom_in(self) -> None:
         """ズームイン (Ctrl++)"""
-        self._send_shortcut(keys="^{+}", post_sleep_s=0.2)
+        self._send_shortcut(keys="^{+}", post_sleep_s=0.2, ack=self._probe_document_layout, label="zoom_in")
 
     def zoom_out(self) -> None:
         """ズームアウト (Ctrl+-)"""
-        self._send_shortcut(keys="^{-}", post_sleep_s=0.2)
+        self._send_shortcut(keys="^{-}", post_sleep_s=0.2, ack=self._probe_document_layout, label="zoom_out")
 
     def reset_zoom(self) -> None:
         """ズームをリセット (Ctrl+0)"""
-        self._send_shortcut(keys="^0", post_sleep_s=0.2)
+        self._send_shortcut(keys="^0", post_sleep_s=0.2, ack=self._probe_document_layout, label="reset_zoom")
 
     # ========================================
     # 待機・検証機能
@@ -1946,6 +5782,137 @@ class NativeBrowserDriver:
         """指定秒数待機"""
         time.sleep(seconds)
 
+    def _ready_signal_values(self, signals: Iterable[str], context: dict[str, Any]) -> dict[str, Any]:
+        """
+        各信号の現在値。context は wait_for_ready 1回分の状態で、Document 要素を保持して使い回す
+        （見つからない/取得に失敗した場合だけ次回に探し直す）。
+        """
+        values: dict[str, Any] = {}
+        for signal in signals:
+            try:
+                if signal == "title":
+                    values[signal] = (self.get_page_title(), self.get_address_bar_url())
+                elif signal == "elements":
+                    document = context.get("document")
+                    if document is None:
+                        document = context["document"] = self._find_document_element()
+                    if not document:
+                        context["document"] = None
+                        values[signal] = None
+                    else:
+                        values[signal] = _document_shape(document)
+                elif signal == "screenshot":
+                    values[signal] = _image_fingerprint(_capture_by_printwindow(self.hwnd))
+            except Exception as e:
+                if signal == "elements":
+                    context["document"] = None
+                # 取得できない信号は「変化なし」扱いにせず、値として失敗を記録する
+                values[signal] = f"error: {type(e).__name__}"
+        return values
+
+    def wait_for_ready(
+        self,
+        timeout_s: float = 10.0,
+        *,
+        stable_s: float = 0.5,
+        signals: Iterable[ReadySignal] = _READY_SIGNALS,
+        min_interval_s: float = 0.05,
+        max_interval_s: float = 0.5,
+    ) -> ActionResult:
+        """
+        ページが落ち着くまで待機する（固定 sleep の代替）。
+
+        タイトル/URL、Document の形状（直下の子要素数と縦の表示割合）、スクリーンショットの縮小ハッシュを観測し、
+        指定した信号がすべて stable_s 秒変化しなければ ready とみなして即座に戻る。
+        観測間隔は変化が無いたびに倍増し（min_interval_s → max_interval_s）、
+        変化を検出すると最小値に戻す。スクリーンショットは高コストなので、
+        安価な信号が一巡して安定してから取得する。UIA イベントが使える場合は
+        変化の通知で待機を早めに切り上げる（購読はウィンドウ自身・アドレスバー・Document 配下に限る）。
+        Document 要素は1回の呼び出しにつき1度だけ探し、
+        タイトル/URL が変わったとき（ページが差し替わったとき）に探し直す。
+
+        戻り値の data には reason（"stable" / "timeout"）, elapsed_s, samples, changes を含む。
+        """
+        signals = tuple(dict.fromkeys(signals))
+        unknown = [sig for sig in signals if sig not in _READY_SIGNALS]
+        if unknown or not signals:
+            raise InvalidInputError(
+                f"signals は {list(_READY_SIGNALS)} から1つ以上指定してください: {list(signals)}",
+                data={"signals": list(signals)},
+            )
+        cheap = tuple(sig for sig in signals if sig != "screenshot")
+        expensive = tuple(sig for sig in signals if sig == "screenshot")
+        min_interval_s = max(0.01, float(min_interval_s))
+        max_interval_s = max(min_interval_s, float(max_interval_s))
+
+        started = time.monotonic()
+        deadline = started + max(0.0, float(timeout_s))
+        last_values: dict[str, Any] = {}
+        seen: dict[str, int] = {}
+        stable_since = started
+        interval = min_interval_s
+        samples = 0
+        changes = 0
+        reason = "timeout"
+        context: dict[str, Any] = {}
+        # navigate と同じく、ウィンドウ自身（タイトル）・アドレスバー・Document 配下だけを購読する
+        watcher = _PropertyChangeWatcher(self.window.element_info.element, ("name", "value"), scope="element")
+        watched: set[tuple[int, ...]] = set()
+
+        with watcher:
+            while True:
+                quiet = time.monotonic() - stable_since
+                # 安価な信号が安定している間だけ高コストな信号を観測する
+                targets = cheap + (expensive if (not cheap or quiet >= min(stable_s, interval)) else ())
+                values = self._ready_signal_values(targets, context)
+                samples += 1
+                changed = [sig for sig, value in values.items() if sig in last_values and last_values[sig] != value]
+                if samples == 1 or "title" in changed:
+                    # ページが差し替わったら Document を探し直し、新しい Document も購読する
+                    if samples > 1:
+                        context["document"] = None
+                    self._watch_page(watcher, watched)
+                last_values.update(values)
+                for sig in values:
+                    seen[sig] = seen.get(sig, 0) + 1
+                now = time.monotonic()
+                if changed:
+                    changes += 1
+                    stable_since = now
+                    interval = min_interval_s
+                elif all(seen.get(sig, 0) >= 2 for sig in signals) and now - stable_since >= stable_s:
+                    reason = "stable"
+                    break
+                else:
+                    interval = min(max_interval_s, interval * 2)
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    break
+                if watcher.active:
+                    # 変化の通知が来たら間隔を詰めてすぐ再観測する（安定判定は信号値で行う）
+                    if watcher.wait(min(remaining, interval)):
+                        interval = min_interval_s
+                else:
+                    time.sleep(min(remaining, interval))
+
+        elapsed = time.monotonic() - started
+        _WAIT_TELEMETRY.append(
+            WaitOutcome(label="wait_for_ready", ok=reason == "stable", elapsed_s=elapsed, attempts=samples)
+        )
+        data = {
+            "reason": reason,
+            "elapsed_s": round(elapsed, 3),
+            "signals": list(signals),
+            "samples": samples,
+            "changes": changes,
+        }
+        if reason != "stable":
+            return ActionResult.failure(
+                "timeout", f"wait_for_ready: {timeout_s}s 以内に安定しませんでした", data=data
+            )
+        return ActionResult.success(f"wait_for_ready: stable ({elapsed:.2f}s)", data=data)
+
     def get_page_title(self) -> str:
         """現在のページタイトルを取得"""
         self._prepare_for_read()
@@ -1954,8 +5921,20 @@ class NativeBrowserDriver:
         except Exception as e:
             raise ExternalApiError(f"get_page_title: failed to read window title: {e}") from e
 
-    def get_browser_summary(self, max_text_len: int = 50) -> dict[str, object]:
-        """現在のブラウザ概要をJSON向けdictで返す（途中出力なし）"""
+    def get_browser_summary(
+        self,
+        max_text_len: int = 50,
+        *,
+        update_elements: bool = False,
+        sample_size: Optional[int] = None,
+    ) -> dict[str, object]:
+        """
+        現在のブラウザ概要をJSON向けdictで返す（途中出力なし）。
+
+        descendants 統計は UIA CacheRequest で ControlType / IsOffscreen を一括取得して集計する。
+        - update_elements=True : 従来通り要素ごとに取得し、current_elements も更新する（低速）
+        - sample_size          : 指定時は等間隔サンプリングで集計（件数は外挿値）
+        """
         self._prepare_for_read()
 
         def _norm_trunc(value: object) -> str:
@@ -2018,16 +5997,55 @@ class NativeBrowserDriver:
             rect_payload = {"error": _norm_trunc(e)}
 
         # 5) descendants統計
+        descendants_payload: dict[str, object]
+        if update_elements:
+            descendants_payload = self._collect_descendants_stats_by_wrapper(_norm_trunc)
+        else:
+            try:
+                descendants_payload = _collect_control_type_stats(
+                    self.window.element_info.element,
+                    sample_size=sample_size,
+                )
+            except Exception as e:
+                logger.debug(f"get_browser_summary: cache request failed, falling back: {e}")
+                descendants_payload = self._collect_descendants_stats_by_wrapper(
+                    _norm_trunc,
+                    update=False,
+                )
+
+        return {
+            "url": _norm_trunc(url),
+            "title": _norm_trunc(title),
+            "state": {
+                "window": window_state,
+                "visible": visible,
+                "offscreen": offscreen,
+            },
+            "rect": rect_payload,
+            "descendants": descendants_payload,
+        }
+
+    def _collect_descendants_stats_by_wrapper(
+        self,
+        norm: Callable[[object], str],
+        *,
+        update: bool = True,
+    ) -> dict[str, object]:
+        """要素ごとに属性を取得して descendants 統計を作る（update=True で current_elements も更新）。"""
         descendants_payload: dict[str, object] = {
             "total": 0,
             "visible_total": 0,
             "invisible_total": 0,
             "visible_by_control_type": {},
             "invisible_by_control_type": {},
+            "method": "wrapper",
+            "sampled": False,
         }
-        self.current_elements = {}
-        self.current_elements_info = {}
-        self.current_elements_truncated = False
+        if update:
+            self.current_elements = {}
+            self.current_elements_info = {}
+            self.current_elements_truncated = False
+            self.current_elements_geometry = _ElementGeometry.empty()
         try:
             items = self.window.descendants()
             descendants_payload["total"] = len(items)
@@ -2037,42 +6055,20 @@ class NativeBrowserDriver:
 
             elements_map: dict[int, Any] = {}
             elements_info: dict[int, dict[str, object]] = {}
-            for index, item in enumerate(items):
-                elements_map[index] = item
-                try:
-                    control_type = getattr(getattr(item, "element_info", None), "control_type", None)
-                except Exception:
-                    control_type = None
-
-                if not control_type:
-                    try:
-                        control_type = item.friendly_class_name()
-                    except Exception:
-                        control_type = "Unknown"
-
+            for index, wrapper in enumerate(items):
+                item = ElementProxy(wrapper, ttl_s=self.element_property_ttl_s)
+                control_type = item.get("control_type") or item.get("friendly_class", "Unknown")
                 control_type = str(control_type)
 
-                try:
-                    name = item.window_text()
-                except Exception:
-                    name = ""
-
-                try:
-                    aid = item.element_info.automation_id
-                except Exception:
-                    aid = ""
-                aid = "" if aid is None else str(aid)
-
-                elements_info[index] = {
-                    "control_type": control_type,
-                    "name": name,
-                    "automation_id": aid,
-                }
+                if update:
+                    elements_map[index] = item
+                    elements_info[index] = {
+                        "control_type": control_type,
+                        "name": item.get("name", ""),
+                        "automation_id": item.get("automation_id", ""),
+                    }
 
-                try:
-                    is_visible = bool(item.is_visible())
-                except Exception:
-                    is_visible = False
+                is_visible = item.get("visible", False)
 
                 if is_visible:
                     descendants_payload["visible_total"] = int(descendants_payload["visible_total"]) + 1
@@ -2081,22 +6077,13 @@ class NativeBrowserDriver:
                     descendants_payload["invisible_total"] = int(descendants_payload["invisible_total"]) + 1
                     invisible_map[control_type] = int(invisible_map.get(control_type, 0)) + 1
 
-            self.current_elements = elements_map
-            self.current_elements_info = elements_info
+            if update:
+                self.current_elements = elements_map
+                self.current_elements_info = elements_info
         except Exception as e:
-            descendants_payload["error"] = _norm_trunc(e)
+            descendants_payload["error"] = norm(e)
 
-        return {
-            "url": _norm_trunc(url),
-            "title": _norm_trunc(title),
-            "state": {
-                "window": window_state,
-                "visible": visible,
-                "offscreen": offscreen,
-            },
-            "rect": rect_payload,
-            "descendants": descendants_payload,
-        }
+        return descendants_payload
 
     # ========================================
     # ページソース取得
@@ -2109,10 +6096,13 @@ class NativeBrowserDriver:
         """
         self._prepare_for_input(maximize=False, foreground=True, settle_ms=80)
         send_keys("^u")
-        wait_until(
+        wait_for(
             lambda: str(self.get_address_bar_url()).startswith("view-source:"),
             timeout_s=wait_seconds,
-            interval_s=0.1,
+            interval_s=0.05,
+            backoff=1.5,
+            max_interval_s=0.2,
+            label="page_source:view_source",
         )
 
         source = self.select_all_and_get_text()
@@ -2126,7 +6116,6 @@ class NativeBrowserDriver:
                 self.close_tab()
             except Exception:
                 pass
-            time.sleep(0.2)
 
         return source
 
@@ -2136,7 +6125,8 @@ class NativeBrowserDriver:
 
     def paste_from_clipboard(self) -> None:
         """クリップボードから貼り付け (Ctrl+V)"""
-        self._send_shortcut(keys="^v", post_sleep_s=0.2)
+        with self._clipboard_transaction("paste"):
+            self._send_shortcut(keys="^v", post_sleep_s=0.2)
 
     def copy_selected_text(self) -> str:
         """選択済みのテキストをコピーして取得 (Ctrl+C)"""
@@ -2177,6 +6167,8 @@ class NativeBrowserDriver:
         self._send_shortcut(
             lambda: self.window.click_input(coords=(x, y)),
             post_sleep_s=0.2,
+            ack=self._probe_focused_element,
+            label="click",
         )
 
     def double_click_at_position(self, x: int, y: int) -> None:
@@ -2184,6 +6176,8 @@ class NativeBrowserDriver:
         self._send_shortcut(
             lambda: self.window.double_click_input(coords=(x, y)),
             post_sleep_s=0.2,
+            ack=self._probe_focused_element,
+            label="double_click",
         )
 
     def right_click_at_position(self, x: int, y: int) -> None:
@@ -2191,6 +6185,8 @@ class NativeBrowserDriver:
         self._send_shortcut(
             lambda: self.window.right_click_input(coords=(x, y)),
             post_sleep_s=0.2,
+            ack=self._probe_focused_element,
+            label="right_click",
         )
 
     def move_mouse_to_element(self, index: int) -> None:
@@ -2201,11 +6197,15 @@ class NativeBrowserDriver:
                 code="element_not_found",
             )
 
-        element = self.current_elements[index]
+        element = self._element_proxy(index)
         try:
             element.set_focus()
+            # フォーカスでスクロールされ得るので矩形は取り直す
+            element.invalidate("rectangle", "visible")
             time.sleep(0.1)
-            rect = element.rectangle()
+            rect = element.get("rectangle")
+            if rect is None:
+                raise ExternalApiError("failed to read element rectangle")
             # 矩形の中心座標を計算
             x = (rect.left + rect.right) // 2
             y = (rect.top + rect.bottom) // 2
@@ -2241,8 +6241,10 @@ class NativeBrowserDriver:
         *,
         monitor: int = 0,
         as_bytes: bool = False,
-        fmt: Literal["PNG", "JPEG"] = "PNG",
+        fmt: ImageFormat = "PNG",
         quality: int = 90,
+        max_bytes: Optional[int] = None,
+        per_monitor: bool = False,
     ) -> Union[Image.Image, bytes]:
         """
         現在の画面全体を純粋にスクリーンショット（Chrome以外も含む全画面）。
@@ -2251,41 +6253,39 @@ class NativeBrowserDriver:
             file_path: 保存先パス（Noneの場合は保存しない）
             monitor: モニター番号（0=すべてのモニター、1=プライマリ、2=セカンダリ...）
             as_bytes: Trueの場合、バイト列で返す
-            fmt: 画像フォーマット（"PNG"または"JPEG"）
-            quality: JPEG品質（1-100）
+            fmt: 画像フォーマット（"PNG" / "JPEG" / "WEBP" / "auto"）
+            quality: 非可逆圧縮の品質（1-100）
+            max_bytes: エンコード後の上限バイト数（収まる最大の品質を探索）
+            per_monitor: monitor=0 のとき、各モニターを並列に取得して貼り合わせる
 
         Returns:
             PIL.Image.Image または bytes
         """
-        with mss.mss() as sct:
-            # monitor=0 ですべてのモニター、1以降で個別モニター
-            if monitor < 0 or monitor > len(sct.monitors) - 1:
-                raise InvalidInputError(
-                    "capture_full_screen: invalid monitor number "
-                    f"(monitor={monitor}, available=0-{len(sct.monitors) - 1})",
-                    code="invalid_monitor",
-                )
+        # monitor=0 ですべてのモニター、1以降で個別モニター
+        if monitor == 0 and per_monitor:
+            img = self.capture_monitors(stitch=True)
+        else:
+            img = screen_grabber.grab_monitor(monitor)
+
+        return _deliver_image(img, file_path, as_bytes=as_bytes, fmt=fmt, quality=quality, max_bytes=max_bytes)
+
+    def capture_monitors(
+        self,
+        monitors: Optional[Iterable[int]] = None,
+        *,
+        stitch: bool = False,
+    ) -> Union[Image.Image, list[Image.Image]]:
+        """
+        各モニター（省略時は全モニター、番号は 1 始まり）を並列に取得する。
 
-            shot = sct.grab(sct.monitors[monitor])
-            img = Image.frombytes("RGB", shot.size, shot.rgb)
-
-            if file_path:
-                save_kwargs = {}
-                if fmt == "JPEG":
-                    save_kwargs["quality"] = int(quality)
-                    save_kwargs["optimize"] = True
-                img.save(file_path, format=fmt, **save_kwargs)
-
-            if as_bytes:
-                buf = io.BytesIO()
-                save_kwargs = {}
-                if fmt == "JPEG":
-                    save_kwargs["quality"] = int(quality)
-                    save_kwargs["optimize"] = True
-                img.save(buf, format=fmt, **save_kwargs)
-                return buf.getvalue()
-
-            return img
+        stitch=True なら仮想スクリーン上の位置に貼り合わせた1枚、False ならモニターごとの画像のリストを返す。
+        """
+        shots = screen_grabber.grab_monitors(monitors)
+        if not shots:
+            raise ScreenshotError("capture_monitors: no monitors to capture")
+        if stitch:
+            return _stitch_monitors(shots)
+        return [img for _, img in shots]
 
 
 class NativeChromeDriver(NativeBrowserDriver):
@@ -26,7 +26,11 @@ from native_browser_control.core.driver import (
     NativeChromeDriver,
     NativeEdgeDriver,
     NativeBrowserError,
+    InvalidInputError,
     UnsupportedBrowserError,
+    EncodedImage,
+    image_encoder,
+    get_wait_telemetry,
     list_running_browser_drivers,
     launch_browser_driver,
     connect_browser_by_index,
@@ -72,6 +76,26 @@ def _error_text(code: str, message: str, data: Any | None = None) -> list[TextCo
     return [TextContent(type="text", text=json.dumps(payload, ensure_ascii=False))]
 
 
+def _image_content(encoded: EncodedImage) -> ImageContent:
+    data = base64.standard_b64encode(encoded.data).decode("utf-8")
+    return ImageContent(type="image", data=data, mimeType=encoded.mime_type)
+
+
+async def _encode(img: Any, fmt: str, **kwargs: Any) -> EncodedImage:
+    # エンコード（max_bytes 指定時は品質探索）は重いので、イベントループを塞がないよう別スレッドで行う。
+    # image_encoder のプールは品質探索自体が使うため、外側は asyncio の既定スレッドで回す
+    return await asyncio.to_thread(image_encoder.encode, img, fmt, **kwargs)
+
+
+async def _encode_many(images: list[Any], fmt: str, **kwargs: Any) -> list[EncodedImage]:
+    return await asyncio.to_thread(image_encoder.encode_many, images, fmt, **kwargs)
+
+
+def _encoding_text(encoded: EncodedImage | list[EncodedImage], **extra: Any) -> TextContent:
+    encoding = [item.as_dict() for item in encoded] if isinstance(encoded, list) else encoded.as_dict()
+    return TextContent(type="text", text=json.dumps({**extra, "encoding": encoding}, ensure_ascii=False))
+
+
 def _exception_to_error_payload(exc: Exception) -> dict[str, Any]:
     if isinstance(exc, NativeBrowserError):
         return _error_payload(exc.code, str(exc), exc.data)
@@ -266,6 +290,16 @@ async def list_tools() -> list[Tool]:
             inputSchema=build_schema(
                 properties={
                     "url": {"type": "string", "description": "移動先のURL"},
+                    "wait": {
+                        "type": "string",
+                        "enum": ["none", "committed", "title_changed", "content_stable"],
+                        "description": "完了条件（none=送信直後, committed=ナビゲーション確定（アドレスバーからフォーカスが外れ、Document差し替え/タイトル変化/読み込み完了を観測）, title_changed=タイトル変化, content_stable=ページ変化が収まり読み込み中でなくなるまで。省略時はcommitted）",
+                    },
+                    "timeout_s": {"type": "number", "description": "最大待機秒数（省略時は5.0）"},
+                    "quiet_s": {
+                        "type": "number",
+                        "description": "content_stable で変化が途絶えたとみなす秒数（省略時は0.5）",
+                    },
                 },
                 required=["url"],
             ),
@@ -289,6 +323,15 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "description": "URL/タイトル等の最大文字数（デフォルト: 50）",
                     },
+                    "update_elements": {
+                        "type": "boolean",
+                        "description": "要素ごとに取得して current_elements も更新するか（低速、デフォルト: false）",
+                    },
+                    "sample_size": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "descendants統計をサンプリング集計する件数（1以上、省略時: 全件）",
+                    },
                 }
             ),
         ),
@@ -301,14 +344,72 @@ async def list_tools() -> list[Tool]:
                 properties={
                     "format": {
                         "type": "string",
-                        "enum": ["PNG", "JPEG"],
-                        "description": "画像フォーマット（デフォルト: PNG）",
+                        "enum": ["PNG", "JPEG", "WEBP", "auto"],
+                        "description": "画像フォーマット（auto=色数の少ない画像は可逆、それ以外は非可逆を自動選択。デフォルト: PNG）",
                     },
                     "quality": {
                         "type": "integer",
                         "minimum": 1,
                         "maximum": 100,
-                        "description": "JPEG品質（1-100、デフォルト: 90）",
+                        "description": "JPEG/WebP品質（1-100、デフォルト: 90）",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "エンコード後の上限バイト数（収まる最大の品質を自動で探索）",
+                    },
+                    "element_index": {
+                        "type": "integer",
+                        "description": "この要素（scan_elements のインデックス）の範囲だけを撮影",
+                    },
+                    "element_id": {
+                        "type": "string",
+                        "description": "この AutomationId を持つ要素の範囲だけを撮影",
+                    },
+                    "region": {
+                        "type": "array",
+                        "items": {"type": "integer"},
+                        "minItems": 4,
+                        "maxItems": 4,
+                        "description": "撮影範囲 [left, top, right, bottom]（ウィンドウ相対）",
+                    },
+                    "padding": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "description": "要素/範囲の周囲に含める余白（px、デフォルト: 0）",
+                    },
+                    "max_dimension": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "長辺がこの値を超える場合は縮小してからエンコード（px）",
+                    },
+                    "frame_max_age_s": {
+                        "type": "number",
+                        "minimum": 0,
+                        "description": "範囲指定時、連続キャプチャにこの秒数以内のフレームがあれば撮影せずそこから切り抜く",
+                    },
+                    "dedupe": {
+                        "type": "boolean",
+                        "description": "直近に返した画像と同一/ほぼ同一なら画像を返さず参照IDのみ返す（デフォルト: false）",
+                    },
+                    "dedupe_threshold": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "maximum": 64,
+                        "description": "ほぼ同一とみなす知覚ハッシュのハミング距離（0=完全一致のみ、デフォルト: 0）。1以上でも異なる32pxタイルが2個以下の場合に限る",
+                    },
+                    "delta": {
+                        "type": "boolean",
+                        "description": "前回の delta 撮影から変化した領域だけを返す（デフォルト: false）",
+                    },
+                    "tile_size": {
+                        "type": "integer",
+                        "minimum": 8,
+                        "description": "delta の比較単位となるタイルの一辺（px、デフォルト: 64）",
+                    },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "delta の比較基準を捨ててフレーム全体を返す（デフォルト: false）",
                     },
                 }
             ),
@@ -322,14 +423,126 @@ async def list_tools() -> list[Tool]:
                         "type": "integer",
                         "description": "モニター番号（0=全モニター、1=プライマリ、2=セカンダリ...）",
                     },
+                    "per_monitor": {
+                        "type": "boolean",
+                        "description": "monitor=0 のとき各モニターを並列に取得する（デフォルト: false）",
+                    },
+                    "stitch": {
+                        "type": "boolean",
+                        "description": "per_monitor=true のとき1枚に貼り合わせる（false ならモニターごとの画像を返す、デフォルト: true）",
+                    },
                     "format": {
                         "type": "string",
-                        "enum": ["PNG", "JPEG"],
-                        "description": "画像フォーマット（デフォルト: PNG）",
+                        "enum": ["PNG", "JPEG", "WEBP", "auto"],
+                        "description": "画像フォーマット（auto=色数の少ない画像は可逆、それ以外は非可逆を自動選択。デフォルト: PNG）",
+                    },
+                    "quality": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "maximum": 100,
+                        "description": "JPEG/WebP品質（1-100、デフォルト: 90）",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "エンコード後の上限バイト数（収まる最大の品質を自動で探索）",
                     },
                 }
             ),
         ),
+        Tool(
+            name="start_frame_capture",
+            description="ブラウザウィンドウの連続キャプチャをバックグラウンドで開始します（同一フレームは重複除去してリングバッファに保持）",
+            inputSchema=build_schema(
+                properties={
+                    "fps": {
+                        "type": "number",
+                        "exclusiveMinimum": 0,
+                        "description": "1秒あたりの撮影回数（デフォルト: 2）",
+                    },
+                    "capacity": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "保持するフレーム数の上限（デフォルト: 120）",
+                    },
+                    "prefer": {
+                        "type": "string",
+                        "enum": ["printwindow", "screen"],
+                        "description": "撮影方式（デフォルト: printwindow）",
+                    },
+                }
+            ),
+        ),
+        Tool(
+            name="stop_frame_capture",
+            description="連続キャプチャを停止します（バッファ内のフレームは引き続き取得・書き出し可能）",
+            inputSchema=build_schema(),
+        ),
+        Tool(
+            name="get_captured_frame",
+            description="連続キャプチャのフレームを通し番号で取得します",
+            inputSchema=build_schema(
+                properties={
+                    "index": {
+                        "type": "integer",
+                        "description": "フレームの通し番号（負数は最新から数えた位置、デフォルト: -1=最新）",
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["PNG", "JPEG", "WEBP", "auto"],
+                        "description": "画像フォーマット（auto=色数の少ない画像は可逆、それ以外は非可逆を自動選択。デフォルト: PNG）",
+                    },
+                    "quality": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "maximum": 100,
+                        "description": "JPEG/WebP品質（1-100、デフォルト: 90）",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "エンコード後の上限バイト数（収まる最大の品質を自動で探索）",
+                    },
+                }
+            ),
+        ),
+        Tool(
+            name="export_captured_frames",
+            description="連続キャプチャのフレームを範囲指定でディレクトリに書き出します（manifest.json 付き）",
+            inputSchema=build_schema(
+                properties={
+                    "directory": {
+                        "type": "string",
+                        "description": "書き出し先ディレクトリ",
+                    },
+                    "start": {
+                        "type": "integer",
+                        "description": "先頭フレームの通し番号（省略時: バッファの先頭）",
+                    },
+                    "end": {
+                        "type": "integer",
+                        "description": "末尾フレームの通し番号（省略時: バッファの末尾）",
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["PNG", "JPEG", "WEBP", "auto"],
+                        "description": "画像フォーマット（auto=色数の少ない画像は可逆、それ以外は非可逆を自動選択。デフォルト: PNG）",
+                    },
+                    "quality": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "maximum": 100,
+                        "description": "JPEG/WebP品質（1-100、デフォルト: 90）",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "1ファイルあたりのエンコード後の上限バイト数（収まる最大の品質を自動で探索）",
+                    },
+                },
+                required=["directory"],
+            ),
+        ),
 
         # コンテンツ取得
         Tool(
@@ -353,7 +566,7 @@ async def list_tools() -> list[Tool]:
                     "method": {
                         "type": "string",
                         "enum": ["paste", "type"],
-                        "description": "入力方法（paste=クリップボード経由、type=一文字ずつ）",
+                        "description": "入力方法（paste=クリップボード経由、type=一文字ずつ。どちらも {ENTER} などの記法は解釈せず文字どおり入力）",
                     },
                 },
                 required=["text"],
@@ -565,6 +778,10 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "description": "キーボードフォーカス可能のみ（デフォルト: false）",
                     },
+                    "in_viewport": {
+                        "type": "boolean",
+                        "description": "ブラウザウィンドウ矩形と交差する要素のみ（デフォルト: false）",
+                    },
                     "automation_id": {
                         "oneOf": [
                             {"type": "string"},
@@ -607,6 +824,66 @@ async def list_tools() -> list[Tool]:
             description="直近の scan_elements / filter_elements 結果をタイプ別に集計します。",
             inputSchema=build_schema(),
         ),
+        Tool(
+            name="elements_outline",
+            description="直近の scan_elements / filter_elements 結果を階層付きの圧縮アウトラインで表示します（文字数/トークン予算内、操作系要素を優先）。",
+            inputSchema=build_schema(
+                properties={
+                    "max_chars": {"type": "integer", "description": "出力の最大文字数"},
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": "出力の最大トークン数の目安（max_chars 未指定時に文字数へ換算）",
+                    },
+                    "max_name_len": {
+                        "type": "integer",
+                        "description": "要素名の最大文字数（デフォルト: 60）",
+                    },
+                    "only_current": {
+                        "type": "boolean",
+                        "description": "current_elements に含まれる要素の枝のみ表示（デフォルト: true）",
+                    },
+                }
+            ),
+        ),
+        Tool(
+            name="elements_at_point",
+            description="指定座標にある要素を current_elements から検索します（深い/小さい要素順、先にscan_elementsを実行してください）",
+            inputSchema=build_schema(
+                properties={
+                    "x": {"type": "integer", "description": "X座標（既定: ウィンドウ相対座標）"},
+                    "y": {"type": "integer", "description": "Y座標（既定: ウィンドウ相対座標）"},
+                    "screen_coords": {
+                        "type": "boolean",
+                        "description": "スクリーン絶対座標として扱うか（デフォルト: false）",
+                    },
+                    "limit": {"type": "integer", "description": "返す件数の上限"},
+                },
+                required=["x", "y"],
+            ),
+        ),
+        Tool(
+            name="elements_in_region",
+            description="指定矩形内の要素を current_elements から検索します（先にscan_elementsを実行してください）",
+            inputSchema=build_schema(
+                properties={
+                    "left": {"type": "integer", "description": "左端X座標"},
+                    "top": {"type": "integer", "description": "上端Y座標"},
+                    "right": {"type": "integer", "description": "右端X座標"},
+                    "bottom": {"type": "integer", "description": "下端Y座標"},
+                    "mode": {
+                        "type": "string",
+                        "enum": ["inside", "intersect"],
+                        "description": "inside=完全に含まれる（デフォルト）, intersect=交差する",
+                    },
+                    "screen_coords": {
+                        "type": "boolean",
+                        "description": "スクリーン絶対座標として扱うか（デフォルト: false）",
+                    },
+                    "limit": {"type": "integer", "description": "返す件数の上限"},
+                },
+                required=["left", "top", "right", "bottom"],
+            ),
+        ),
         Tool(
             name="click_element",
             description="スキャンした要素をインデックスでクリックします（先にscan_elementsを実行してください）",
@@ -666,14 +943,93 @@ async def list_tools() -> list[Tool]:
         # 待機
         Tool(
             name="wait",
-            description="指定した秒数待機します",
+            description="指定した秒数待機します。until=ready ではページが落ち着いた時点で戻ります",
+            inputSchema=build_schema(
+                properties={
+                    "seconds": {
+                        "type": "number",
+                        "description": "待機秒数（デフォルト: 2）。until=ready では最大待機秒数（デフォルト: 10）",
+                    },
+                    "until": {
+                        "type": "string",
+                        "enum": ["time", "ready"],
+                        "description": "time=指定秒数そのまま待機, ready=タイトル/URL・要素数・スクショが安定したら終了（省略時はtime）",
+                    },
+                    "stable_s": {
+                        "type": "number",
+                        "description": "until=ready で安定とみなす無変化秒数（省略時は0.5）",
+                    },
+                    "signals": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": ["title", "elements", "screenshot"]},
+                        "description": "until=ready で観測する信号（省略時は全て）",
+                    },
+                }
+            ),
+        ),
+        Tool(
+            name="get_wait_telemetry",
+            description="直近の待機（navigate・wait・操作の完了確認など）の結果を新しい順に返します（経過時間・試行回数・起床回数・例外数）",
             inputSchema=build_schema(
                 properties={
-                    "seconds": {"type": "number", "description": "待機秒数（デフォルト: 2）"},
+                    "label": {
+                        "type": "string",
+                        "description": "待機のラベルで絞り込む（例: navigate:committed, wait_for_ready, ack:back）",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "返す件数（省略時は20）",
+                    },
                 }
             ),
         ),
 
+        # 入力マクロ
+        Tool(
+            name="run_input_macro",
+            description="キー/テキスト/クリック/待機の手順をまとめて検証し、1回の前面化で連続送信します",
+            inputSchema=build_schema(
+                properties={
+                    "steps": {
+                        "type": "array",
+                        "description": (
+                            "手順のリスト。各要素は type に応じて: keys{keys}, text{text}, paste{text}, "
+                            "click{x, y, button=left|right|double}（ウィンドウ相対座標）, wait{seconds≤60}, "
+                            "wait_for{condition=url_changed|title_changed|url_contains|title_contains|ready, value, timeout_s≤60}"
+                        ),
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "type": {
+                                    "type": "string",
+                                    "enum": ["keys", "text", "paste", "click", "wait", "wait_for"],
+                                },
+                            },
+                            "required": ["type"],
+                        },
+                    },
+                },
+                required=["steps"],
+            ),
+        ),
+
+        # 入力方式
+        Tool(
+            name="set_input_mode",
+            description="入力方式を切り替えます（background=ウィンドウを前面化せずUIAパターン/ウィンドウメッセージで操作、できない操作は自動で前面操作）",
+            inputSchema=build_schema(
+                properties={
+                    "mode": {
+                        "type": "string",
+                        "enum": ["foreground", "background"],
+                        "description": "入力方式",
+                    },
+                },
+                required=["mode"],
+            ),
+        ),
+
         # クリップボード
         Tool(
             name="copy_selected",
@@ -753,12 +1109,42 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
                 )
             ]
 
+        if name == "get_wait_telemetry":
+            # 待機結果はプロセス共通なのでドライバ不要
+            limit = int(arguments.get("limit", 20))
+            if limit <= 0:
+                raise InvalidInputError(
+                    f"get_wait_telemetry: limit must be > 0: {limit}",
+                    code="invalid_limit",
+                    data={"limit": limit},
+                )
+            outcomes = get_wait_telemetry(arguments.get("label"), limit=limit)
+            return [TextContent(type="text", text=json.dumps(outcomes, ensure_ascii=False))]
+
         driver = get_driver(browser)
         # ナビゲーション
         if name == "navigate":
             url = arguments["url"]
-            driver.navigate(url)
-            return [TextContent(type="text", text=f"URLに移動しました: {url}")]
+            result = driver.navigate(
+                url,
+                timeout_s=float(arguments.get("timeout_s", 5.0)),
+                wait=arguments.get("wait", "committed"),
+                quiet_s=float(arguments.get("quiet_s", 0.5)),
+            )
+            data = result.data or {}
+            if not result.ok:
+                return [
+                    TextContent(
+                        type="text",
+                        text=f"URLに移動しましたが完了待機がタイムアウトしました: {url}（到達: {data.get('reached')}, {data.get('elapsed_s')}s）",
+                    )
+                ]
+            return [
+                TextContent(
+                    type="text",
+                    text=f"URLに移動しました: {url}（{data.get('wait')}, {data.get('elapsed_s')}s, {data.get('via')}）",
+                )
+            ]
 
         elif name == "get_url":
             url = driver.get_address_bar_url()
@@ -770,35 +1156,114 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
 
         elif name == "get_browser_summary":
             max_text_len = int(arguments.get("max_text_len", 50))
-            summary = driver.get_browser_summary(max_text_len=max_text_len)
+            update_elements = bool(arguments.get("update_elements", False))
+            sample_size = arguments.get("sample_size")
+            if sample_size is not None:
+                sample_size = int(sample_size)
+                if sample_size <= 0:
+                    raise InvalidInputError(
+                        f"get_browser_summary: sample_size must be > 0: {sample_size}",
+                        code="invalid_sample_size",
+                        data={"sample_size": sample_size},
+                    )
+            summary = driver.get_browser_summary(
+                max_text_len=max_text_len,
+                update_elements=update_elements,
+                sample_size=sample_size,
+            )
             return [
                 TextContent(type="text", text=json.dumps(summary, ensure_ascii=False))
             ]
 
         # スクリーンショット
         elif name == "screenshot":
+            encode_kwargs = {
+                "quality": arguments.get("quality", 90),
+                "max_bytes": arguments.get("max_bytes"),
+            }
             fmt = arguments.get("format", "PNG")
-            quality = arguments.get("quality", 90)
-            img_bytes = driver.screenshot(
-                as_bytes=True,
-                fmt=fmt,
-                quality=quality
-            )
-            img_base64 = base64.standard_b64encode(img_bytes).decode("utf-8")
-            mime_type = "image/png" if fmt == "PNG" else "image/jpeg"
-            return [ImageContent(type="image", data=img_base64, mimeType=mime_type)]
+            capture_kwargs = {
+                "element_index": arguments.get("element_index"),
+                "element_id": arguments.get("element_id"),
+                "region": arguments.get("region"),
+                "padding": arguments.get("padding", 0),
+                "max_dimension": arguments.get("max_dimension"),
+                "frame_max_age_s": arguments.get("frame_max_age_s"),
+            }
+            if arguments.get("delta"):
+                if arguments.get("reset"):
+                    driver.reset_screenshot_baseline(**capture_kwargs)
+                delta = driver.screenshot_delta(tile_size=arguments.get("tile_size", 64), **capture_kwargs)
+                encoded = await _encode_many([region.image for region in delta.regions], fmt, **encode_kwargs)
+                return [
+                    _encoding_text(encoded, **delta.as_dict()),
+                    *(_image_content(item) for item in encoded),
+                ]
+            img = driver.screenshot(**capture_kwargs)
+            if arguments.get("dedupe"):
+                cached = driver.screenshot_cache.check(img, threshold=arguments.get("dedupe_threshold", 0))
+                payload = {**cached.as_dict(), "cache": driver.screenshot_cache.stats()}
+                if cached.match is not None:
+                    return [TextContent(type="text", text=json.dumps(payload, ensure_ascii=False))]
+                encoded = await _encode(img, fmt, **encode_kwargs)
+                return [_encoding_text(encoded, **payload), _image_content(encoded)]
+            encoded = await _encode(img, fmt, **encode_kwargs)
+            return [_encoding_text(encoded), _image_content(encoded)]
 
         elif name == "full_screenshot":
             monitor = arguments.get("monitor", 0)
+            encode_kwargs = {
+                "quality": arguments.get("quality", 90),
+                "max_bytes": arguments.get("max_bytes"),
+            }
             fmt = arguments.get("format", "PNG")
-            img_bytes = driver.capture_full_screen(
-                monitor=monitor,
-                as_bytes=True,
-                fmt=fmt
+            if monitor == 0 and arguments.get("per_monitor") and not arguments.get("stitch", True):
+                images = driver.capture_monitors()
+                encoded = await _encode_many(images, fmt, **encode_kwargs)
+                return [_encoding_text(encoded), *(_image_content(item) for item in encoded)]
+            img = driver.capture_full_screen(monitor=monitor, per_monitor=bool(arguments.get("per_monitor")))
+            encoded = await _encode(img, fmt, **encode_kwargs)
+            return [_encoding_text(encoded), _image_content(encoded)]
+
+        elif name == "start_frame_capture":
+            result = driver.start_frame_capture(
+                fps=arguments.get("fps", 2.0),
+                capacity=arguments.get("capacity", 120),
+                prefer=arguments.get("prefer", "printwindow"),
             )
-            img_base64 = base64.standard_b64encode(img_bytes).decode("utf-8")
-            mime_type = "image/png" if fmt == "PNG" else "image/jpeg"
-            return [ImageContent(type="image", data=img_base64, mimeType=mime_type)]
+            return [TextContent(type="text", text=json.dumps({"ok": result.ok, **result.data}, ensure_ascii=False))]
+
+        elif name == "stop_frame_capture":
+            result = driver.stop_frame_capture()
+            if not result.ok:
+                return _error_text(result.code, result.message)
+            return [TextContent(type="text", text=json.dumps({"ok": result.ok, **result.data}, ensure_ascii=False))]
+
+        elif name == "get_captured_frame":
+            frame = driver.get_captured_frame(arguments.get("index", -1))
+            encoded = await _encode(
+                frame.image,
+                arguments.get("format", "PNG"),
+                quality=arguments.get("quality", 90),
+                max_bytes=arguments.get("max_bytes"),
+            )
+            return [
+                _encoding_text(encoded, **frame.as_dict()),
+                _image_content(encoded),
+            ]
+
+        elif name == "export_captured_frames":
+            result = driver.export_captured_frames(
+                arguments["directory"],
+                start=arguments.get("start"),
+                end=arguments.get("end"),
+                fmt=arguments.get("format", "PNG"),
+                quality=arguments.get("quality", 90),
+                max_bytes=arguments.get("max_bytes"),
+            )
+            if not result.ok:
+                return _error_text(result.code, result.message, result.data)
+            return [TextContent(type="text", text=json.dumps(result.data, ensure_ascii=False))]
 
         # コンテンツ取得
         elif name == "get_page_text":
@@ -813,8 +1278,13 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
         elif name == "type_text":
             text = arguments["text"]
             method = arguments.get("method", "paste")
-            driver.type_text(text, method=method)
-            return [TextContent(type="text", text=f"テキストを入力しました: {text[:50]}{'...' if len(text) > 50 else ''}")]
+            result = driver.type_text(text, method=method)
+            message = f"テキストを入力しました: {text[:50]}{'...' if len(text) > 50 else ''}"
+            if result.data and result.data.get("clipboard_restored") is False and driver.preserve_clipboard:
+                message += "\n（貼り付けの反映を確認できなかったため、クリップボードは復元していません）"
+            if result.code == "unverified":
+                message += "\n（バックグラウンド入力の反映を確認できませんでした。二重入力を避けるため再送していません）"
+            return [TextContent(type="text", text=message)]
 
         elif name == "find_text":
             text = arguments["text"]
@@ -826,19 +1296,28 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
             direction = arguments["direction"]
             amount = arguments.get("amount", 500)
 
+            result = None
             if direction == "down":
-                driver.scroll_down(amount)
+                result = driver.scroll_down(amount)
             elif direction == "up":
-                driver.scroll_up(amount)
+                result = driver.scroll_up(amount)
             elif direction == "top":
-                driver.scroll_to_top()
+                result = driver.scroll_to_top()
             elif direction == "bottom":
-                driver.scroll_to_bottom()
+                result = driver.scroll_to_bottom()
             elif direction == "page_down":
                 driver.page_down()
             elif direction == "page_up":
                 driver.page_up()
 
+            after = (result.data or {}).get("after") if result is not None else None
+            if after and after.get("vertical_percent", -1) >= 0:
+                return [
+                    TextContent(
+                        type="text",
+                        text=f"スクロールしました: {direction}（位置: {after['vertical_percent']:.1f}%, 表示率: {after['vertical_view_size']:.1f}%）",
+                    )
+                ]
             return [TextContent(type="text", text=f"スクロールしました: {direction}")]
 
         # タブ操作
@@ -934,6 +1413,7 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
             min_width = arguments.get("min_width", 0)
             min_height = arguments.get("min_height", 0)
             only_focusable = arguments.get("only_focusable", False)
+            in_viewport = arguments.get("in_viewport", False)
             automation_id_regex = arguments.get("automation_id_regex")
             omit_no_name = arguments.get("omit_no_name", True)
             min_separator_count = arguments.get("min_separator_count", 0)
@@ -950,6 +1430,7 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
                 min_width=min_width,
                 min_height=min_height,
                 only_focusable=only_focusable,
+                in_viewport=in_viewport,
                 automation_id_regex=automation_id_regex,
                 omit_no_name=omit_no_name,
                 min_separator_count=min_separator_count,
@@ -967,6 +1448,38 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
             result = driver.get_current_elements_summary()
             return [TextContent(type="text", text=result)]
 
+        elif name == "elements_outline":
+            result = driver.get_current_elements_outline(
+                max_chars=arguments.get("max_chars"),
+                max_tokens=arguments.get("max_tokens"),
+                max_name_len=int(arguments.get("max_name_len", 60)),
+                only_current=bool(arguments.get("only_current", True)),
+            )
+            return [TextContent(type="text", text=result if result else "No elements found.")]
+
+        elif name == "elements_at_point":
+            indices = driver.find_elements_at_point(
+                arguments["x"],
+                arguments["y"],
+                screen_coords=bool(arguments.get("screen_coords", False)),
+                limit=arguments.get("limit"),
+            )
+            result = driver.get_elements_list_for(indices)
+            return [TextContent(type="text", text=result if result else "No elements found.")]
+
+        elif name == "elements_in_region":
+            indices = driver.find_elements_in_region(
+                arguments["left"],
+                arguments["top"],
+                arguments["right"],
+                arguments["bottom"],
+                mode=arguments.get("mode", "inside"),
+                screen_coords=bool(arguments.get("screen_coords", False)),
+                limit=arguments.get("limit"),
+            )
+            result = driver.get_elements_list_for(indices)
+            return [TextContent(type="text", text=result if result else "No elements found.")]
+
         elif name == "click_element":
             index = arguments["index"]
             result = driver.click_by_index(index)
@@ -996,10 +1509,31 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent |
 
         # 待機
         elif name == "wait":
+            if arguments.get("until", "time") == "ready":
+                result = driver.wait_for_ready(
+                    float(arguments.get("seconds", 10)),
+                    stable_s=float(arguments.get("stable_s", 0.5)),
+                    signals=arguments.get("signals") or ("title", "elements", "screenshot"),
+                )
+                return [TextContent(type="text", text=json.dumps(result.data, ensure_ascii=False))]
             seconds = arguments.get("seconds", 2)
             driver.wait_for_idle(seconds)
             return [TextContent(type="text", text=f"{seconds}秒待機しました")]
 
+        elif name == "run_input_macro":
+            result = driver.run_input_macro(arguments["steps"])
+            return [
+                TextContent(
+                    type="text",
+                    text=json.dumps({"ok": result.ok, "message": result.message, **(result.data or {})}, ensure_ascii=False),
+                )
+            ]
+
+        elif name == "set_input_mode":
+            mode = arguments["mode"]
+            driver.set_input_mode(mode)
+            return [TextContent(type="text", text=f"入力方式を {mode} に切り替えました")]
+
         # クリップボード
         elif name == "copy_selected":
             text = driver.copy_selected_text()
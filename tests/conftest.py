@@ -0,0 +1,46 @@
+"""
+Windows 以外（CI など）でも driver の純粋なロジックを検証できるよう、
+未インストールの Windows 専用モジュール（pywin32 / pywinauto / mss / mcp）を MagicMock で差し替える。
+Windows で実モジュールが入っていればそちらを使う。
+"""
+
+import ctypes
+import importlib.util
+import sys
+from unittest import mock
+
+_WINDOWS_ONLY_MODULES = (
+    "pywinauto",
+    "pywinauto.keyboard",
+    "pywinauto.findwindows",
+    "pywinauto.uia_defines",
+    "pywinauto.uia_element_info",
+    "pywinauto.controls",
+    "pywinauto.controls.uiawrapper",
+    "win32con",
+    "win32gui",
+    "win32ui",
+    "win32clipboard",
+    "win32process",
+    "win32api",
+    "mss",
+    "mcp",
+    "mcp.server",
+    "mcp.server.stdio",
+    "mcp.types",
+)
+
+
+def _available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+for _name in _WINDOWS_ONLY_MODULES:
+    if _name not in sys.modules and not _available(_name.partition(".")[0]):
+        sys.modules[_name] = mock.MagicMock(name=_name)
+
+if not hasattr(ctypes, "windll"):
+    ctypes.windll = mock.MagicMock(name="windll")
@@ -0,0 +1,184 @@
+import threading
+import time
+
+import pytest
+
+from native_browser_control.core import driver as driver_module
+from native_browser_control.core.driver import ClipboardBroker, ClipboardError, NativeBrowserDriver
+
+CF_UNICODETEXT = driver_module.win32con.CF_UNICODETEXT
+CF_DIB = driver_module.win32con.CF_DIB
+
+
+class FakeClipboard:
+    """win32clipboard の代役。GetClipboardData で読まれた形式を記録する。"""
+
+    def __init__(self):
+        self.data: dict = {}
+        self.sequence = 1
+        self.registered: dict[str, int] = {}
+        self.reads: list = []
+
+    def register(self, name: str) -> int:
+        return self.registered.setdefault(name, 0xC000 + len(self.registered))
+
+    def RegisterClipboardFormat(self, name):
+        return self.register(name)
+
+    def GetClipboardSequenceNumber(self):
+        return self.sequence
+
+    def OpenClipboard(self):
+        pass
+
+    def CloseClipboard(self):
+        pass
+
+    def EmptyClipboard(self):
+        self.data = {}
+        self.sequence += 1
+
+    def SetClipboardData(self, fmt, data):
+        self.data[fmt] = data
+        self.sequence += 1
+
+    def IsClipboardFormatAvailable(self, fmt):
+        return fmt in self.data
+
+    def GetClipboardData(self, fmt):
+        self.reads.append(fmt)
+        return self.data[fmt]
+
+
+@pytest.fixture
+def clipboard(monkeypatch):
+    fake = FakeClipboard()
+    monkeypatch.setattr(driver_module, "win32clipboard", fake)
+    fake.data = {
+        CF_UNICODETEXT: "user text",
+        fake.register("HTML Format"): b"<b>user</b>",
+        # 遅延レンダリングの独自形式（読むと提供元に生成させてしまう）
+        fake.register("Art::GVML ClipFormat"): b"x" * 100,
+    }
+    fake.reads = []
+    return fake
+
+
+class TestSnapshot:
+    def test_nothing_is_read_until_overwrite(self, clipboard):
+        with ClipboardBroker().transaction("test", preserve=True) as transaction:
+            assert transaction.read_text().data == "user text"
+        assert clipboard.reads == [CF_UNICODETEXT]
+
+    def test_restores_allowed_formats_only(self, clipboard):
+        html = clipboard.register("HTML Format")
+        with ClipboardBroker().transaction("test", preserve=True) as transaction:
+            transaction.write_text("pasted")
+            transaction.write_text("again")
+            assert clipboard.data == {CF_UNICODETEXT: "again"}
+        assert clipboard.data == {CF_UNICODETEXT: "user text", html: b"<b>user</b>"}
+        # 退避は最初の上書き前に1回だけで、対象外の形式は読まない
+        assert clipboard.reads == [CF_UNICODETEXT, html]
+
+    def test_size_cap_skips_large_formats(self, clipboard):
+        clipboard.data[CF_DIB] = b"\0" * 64
+        snapshot = driver_module._save_clipboard(max_bytes=40)
+        assert snapshot.formats == {CF_UNICODETEXT: "user text", clipboard.register("HTML Format"): b"<b>user</b>"}
+        assert snapshot.skipped == [CF_DIB]
+
+    def test_without_preserve_nothing_is_restored(self, clipboard):
+        with ClipboardBroker().transaction("test") as transaction:
+            transaction.write_text("copied")
+        assert clipboard.data == {CF_UNICODETEXT: "copied"}
+
+
+def _wait_until(predicate, timeout_s=2.0):
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+class TestBroker:
+    def test_waiters_are_served_in_arrival_order(self, clipboard):
+        broker = ClipboardBroker()
+        order = []
+
+        def use(name):
+            with broker.transaction(name):
+                order.append(name)
+
+        threads = []
+        with broker.transaction("holder"):
+            for i, name in enumerate(["first", "second", "third"]):
+                thread = threading.Thread(target=use, args=(name,))
+                thread.start()
+                threads.append(thread)
+                _wait_until(lambda: broker.stats()["queue_length"] == i + 1)
+        for thread in threads:
+            thread.join(2.0)
+        assert order == ["first", "second", "third"]
+        stats = broker.stats()
+        assert (stats["transactions"], stats["contended"], stats["max_queue_length"]) == (4, 3, 3)
+        assert not stats["held"]
+
+    def test_nested_transactions_share_the_outer_one(self, clipboard):
+        broker = ClipboardBroker()
+        with broker.transaction("outer", preserve=True) as outer:
+            with broker.transaction("inner") as inner:
+                assert inner is outer
+                inner.write_text("inner")
+            # 内側の終了では復元しない
+            assert clipboard.data == {CF_UNICODETEXT: "inner"}
+        assert clipboard.data[CF_UNICODETEXT] == "user text"
+        assert broker.stats()["transactions"] == 1
+
+    def test_times_out_with_clipboard_busy(self, clipboard):
+        broker = ClipboardBroker()
+        errors = []
+
+        def waiter():
+            try:
+                with broker.transaction("late", timeout_s=0.05):
+                    pass
+            except ClipboardError as e:
+                errors.append(e)
+
+        with broker.transaction("holder"):
+            thread = threading.Thread(target=waiter)
+            thread.start()
+            thread.join(2.0)
+        assert [e.code for e in errors] == ["clipboard_busy"]
+        assert broker.stats()["timeouts"] == 1
+        assert broker.stats()["queue_length"] == 0
+
+
+class TestPasteRestore:
+    def _driver(self, monkeypatch, values):
+        monkeypatch.setattr(driver_module, "clipboard_broker", ClipboardBroker())
+        monkeypatch.setattr(driver_module, "_PASTE_RESTORE_DELAY_S", 0.0)
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver._prepare_for_input = lambda **kwargs: None
+        reads = iter(values)
+        driver._focused_value = lambda: next(reads, values[-1])
+        return driver
+
+    def test_restores_after_value_changes(self, monkeypatch, clipboard):
+        driver = self._driver(monkeypatch, ["", "pasted"])
+        result = driver._paste_text("pasted", label="test", keys=lambda keys: 4)
+        assert result == {"observed": True, "clipboard_restored": True, "events": 4}
+        assert clipboard.data[CF_UNICODETEXT] == "user text"
+
+    def test_restores_after_delay_when_value_is_unreadable(self, monkeypatch, clipboard):
+        driver = self._driver(monkeypatch, [None])
+        result = driver._paste_text("pasted", label="test", keys=lambda keys: 4)
+        assert result["observed"] is False
+        assert result["clipboard_restored"] is True
+        assert clipboard.data[CF_UNICODETEXT] == "user text"
+
+    def test_keeps_clipboard_when_value_never_changes(self, monkeypatch, clipboard):
+        driver = self._driver(monkeypatch, ["same"])
+        result = driver._paste_text("pasted", label="test", keys=lambda keys: 4)
+        assert result["clipboard_restored"] is False
+        assert clipboard.data == {CF_UNICODETEXT: "pasted"}
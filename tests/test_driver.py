@@ -0,0 +1,466 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from native_browser_control.core import driver as driver_module
+from native_browser_control.core.driver import (
+    KeyboardEngine,
+    NativeBrowserDriver,
+    SimulatedInputBackend,
+    _PropertyChangeWatcher,
+)
+
+
+class FakeBrowser:
+    """アドレスバー・タイトル・Document だけを持つブラウザの代役。send_keys を差し替えて操作する。"""
+
+    def __init__(self, *, commits_on_enter: bool):
+        self.commits_on_enter = commits_on_enter
+        self.address = "https://old.example/"
+        self.title = "Old - Google Chrome"
+        self.document = (42, 1)
+        self.address_focused = False
+        self.clipboard = ""
+
+    @property
+    def CurrentHasKeyboardFocus(self) -> bool:
+        return self.address_focused
+
+    def send_keys(self, keys: str) -> None:
+        if keys == "^l":
+            self.address_focused = True
+        elif keys == "^v":
+            # 貼り付けた時点で（コミット前でも）アドレスバーには入力した URL が表示される
+            self.address = self.clipboard
+        elif keys == "{ENTER}" and self.commits_on_enter:
+            self.address_focused = False
+            self.document = (42, 2)
+            self.title = "New - Google Chrome"
+
+
+def _make_driver(monkeypatch, browser: FakeBrowser) -> NativeBrowserDriver:
+    monkeypatch.setattr(_PropertyChangeWatcher, "start", lambda self: False)
+    monkeypatch.setattr(driver_module, "send_keys", browser.send_keys)
+    driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+    driver._init_state("chrome")
+    driver.window = SimpleNamespace(element_info=SimpleNamespace(element=object()))
+
+    @contextmanager
+    def transaction(label, *, preserve=False):
+        yield SimpleNamespace(write_text=lambda text: setattr(browser, "clipboard", text))
+
+    address_bar = SimpleNamespace(element_info=SimpleNamespace(element=browser))
+    driver._address_bar = (address_bar, (1, 2, 3))
+    driver._reload_button = False
+    driver._clipboard_transaction = transaction
+    driver._prepare_for_input = lambda **kwargs: None
+    driver._find_document_element = lambda: SimpleNamespace(GetRuntimeId=lambda: browser.document)
+    driver.get_address_bar_url = lambda: browser.address
+    driver.get_page_title = lambda: browser.title
+    return driver
+
+
+class TestNavigateCommit:
+    def test_pasted_url_alone_is_not_a_commit(self, monkeypatch):
+        browser = FakeBrowser(commits_on_enter=False)
+        driver = _make_driver(monkeypatch, browser)
+        result = driver.navigate("https://new.example/", timeout_s=0.3, interval_s=0.02)
+        # アドレスバーには入力した URL が出ているが、フォーカスは残り Document もタイトルも変わっていない
+        assert browser.address == "https://new.example/"
+        assert not result.ok
+        assert result.code == "timeout"
+        assert result.data["reached"] == "none"
+        assert result.data["commit_signal"] is None
+
+    def test_document_replacement_commits(self, monkeypatch):
+        browser = FakeBrowser(commits_on_enter=True)
+        driver = _make_driver(monkeypatch, browser)
+        result = driver.navigate("https://new.example/", timeout_s=1.0, interval_s=0.02)
+        assert result.ok
+        assert result.data["reached"] == "committed"
+        assert result.data["commit_signal"] == "document"
+        assert result.data["via"] == "polling"
+
+    def test_waits_while_address_bar_keeps_focus(self, monkeypatch):
+        browser = FakeBrowser(commits_on_enter=True)
+        driver = _make_driver(monkeypatch, browser)
+        original = browser.send_keys
+
+        def enter_without_blur(keys):
+            original(keys)
+            if keys == "{ENTER}":
+                browser.address_focused = True
+
+        monkeypatch.setattr(driver_module, "send_keys", enter_without_blur)
+        result = driver.navigate("https://new.example/", timeout_s=0.3, interval_s=0.02)
+        assert not result.ok
+        assert result.data["reached"] == "none"
+
+
+@pytest.mark.parametrize("wait", ["bogus", ""])
+def test_navigate_rejects_unknown_wait(monkeypatch, wait):
+    driver = _make_driver(monkeypatch, FakeBrowser(commits_on_enter=True))
+    with pytest.raises(driver_module.InvalidInputError):
+        driver.navigate("https://new.example/", wait=wait)
+
+
+class TestBackgroundTyping:
+    def _driver(self, monkeypatch, *, focused):
+        driver = _make_driver(monkeypatch, FakeBrowser(commits_on_enter=False))
+        driver.window = SimpleNamespace(element_info=SimpleNamespace(element=object()), handle=100)
+        driver.input_mode = "background"
+        value = SimpleNamespace(CurrentValue="")
+        document = SimpleNamespace(FindFirst=lambda scope, condition: focused)
+        driver._find_document_element = lambda: document
+        posted, foreground = [], []
+        monkeypatch.setattr(driver_module, "IUIA", mock.MagicMock())
+        monkeypatch.setattr(driver_module, "get_elem_interface", lambda element, name: value)
+        monkeypatch.setattr(driver_module, "_post_text", lambda hwnd, text: posted.append(text) or len(text))
+
+        def paste(text, **kwargs):
+            foreground.append(text)
+            return {"observed": True, "clipboard_restored": True, "events": []}
+
+        driver._paste_text = paste
+        return driver, value, posted, foreground
+
+    def test_unobserved_post_is_not_retyped_in_foreground(self, monkeypatch):
+        driver, _, posted, foreground = self._driver(monkeypatch, focused=object())
+        result = driver.type_text("hello")
+        assert posted == ["hello"]
+        assert foreground == []
+        assert result.ok and result.code == "unverified"
+        assert result.data == {"method": "background", "sent": 5, "observed": False}
+
+    def test_observed_post(self, monkeypatch):
+        driver, value, posted, foreground = self._driver(monkeypatch, focused=object())
+        monkeypatch.setattr(
+            driver_module, "_post_text", lambda hwnd, text: setattr(value, "CurrentValue", text) or len(text)
+        )
+        result = driver.type_text("hello")
+        assert result.code == "ok"
+        assert result.data["observed"] is True
+        assert foreground == []
+
+    def test_no_focus_in_document_falls_back_before_posting(self, monkeypatch):
+        driver, _, posted, foreground = self._driver(monkeypatch, focused=None)
+        result = driver.type_text("hello")
+        assert posted == []
+        assert foreground == ["hello"]
+        assert result.data["method"] == "paste"
+        assert driver.input_mode_stats == {"background": 0, "fallback": 1}
+
+    def test_address_bar_focus_falls_back(self, monkeypatch):
+        driver, _, posted, foreground = self._driver(monkeypatch, focused=object())
+        driver._address_bar[0].element_info.element.address_focused = True
+        driver.type_text("hello")
+        assert posted == []
+        assert foreground == ["hello"]
+
+
+def test_wait_for_ready_subscribes_like_navigate(monkeypatch):
+    browser = FakeBrowser(commits_on_enter=False)
+    driver = _make_driver(monkeypatch, browser)
+    subscribed = []
+    monkeypatch.setattr(_PropertyChangeWatcher, "stop", lambda self: subscribed.extend(self._targets))
+    result = driver.wait_for_ready(1.0, stable_s=0.05, signals=("title",), min_interval_s=0.01)
+    assert result.ok
+    window = driver.window.element_info.element
+    address_bar = driver._address_bar[0].element_info.element
+    assert [(target, scope) for target, scope in subscribed[:2]] == [(window, "element"), (address_bar, "element")]
+    # ウィンドウ全体を subtree で購読せず、Document 配下だけを subtree で購読する
+    assert [scope for _, scope in subscribed] == ["element", "element", "subtree"]
+    assert subscribed[2][0].GetRuntimeId() == browser.document
+
+
+class FakeWindowState:
+    """ensure_visible が参照する win32gui の代役（1つのウィンドウの状態だけを持つ）。"""
+
+    def __init__(self, hwnd, *, iconic=False, zoomed=False, foreground=False):
+        self.hwnd = hwnd
+        self.iconic = iconic
+        self.zoomed = zoomed
+        self.foreground = foreground
+        self.shown = []
+
+    def IsWindow(self, hwnd):
+        return hwnd == self.hwnd
+
+    def IsIconic(self, hwnd):
+        return self.iconic
+
+    def IsZoomed(self, hwnd):
+        return self.zoomed
+
+    def GetForegroundWindow(self):
+        return self.hwnd if self.foreground else 1
+
+    def ShowWindow(self, hwnd, command):
+        self.shown.append(command)
+        if command == driver_module.win32con.SW_RESTORE:
+            # 最小化前に前面だったウィンドウは復帰で前面に戻る
+            self.iconic = False
+            self.foreground = True
+        elif command == driver_module.win32con.SW_MAXIMIZE:
+            self.zoomed = True
+
+
+class TestEnsureVisible:
+    def _driver(self, monkeypatch, state):
+        monkeypatch.setattr(driver_module, "win32gui", state)
+        forced = []
+        monkeypatch.setattr(driver_module, "_force_foreground", forced.append)
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver.window = SimpleNamespace(handle=state.hwnd)
+        return driver, forced
+
+    def test_fast_path_when_nothing_to_do(self, monkeypatch):
+        driver, forced = self._driver(monkeypatch, FakeWindowState(7, zoomed=True, foreground=True))
+        driver.ensure_visible(settle_ms=0)
+        assert forced == []
+        assert driver.ensure_visible_stats["fast_path"] == 1
+
+    def test_maximize_only_does_not_refocus(self, monkeypatch):
+        driver, forced = self._driver(monkeypatch, FakeWindowState(7, foreground=True))
+        driver.ensure_visible(settle_ms=0)
+        assert forced == []
+        stats = driver.ensure_visible_stats
+        assert (stats["slow_path"], stats["maximized"], stats["foregrounded"]) == (1, 1, 0)
+
+    def test_restore_that_brings_window_forward_skips_foregrounding(self, monkeypatch):
+        driver, forced = self._driver(monkeypatch, FakeWindowState(7, iconic=True, zoomed=True))
+        driver.ensure_visible(settle_ms=0)
+        assert forced == []
+        assert driver.ensure_visible_stats["restored"] == 1
+        assert driver.ensure_visible_stats["foregrounded"] == 0
+
+    def test_background_window_is_foregrounded(self, monkeypatch):
+        driver, forced = self._driver(monkeypatch, FakeWindowState(7, zoomed=True))
+        driver.ensure_visible(settle_ms=0)
+        assert forced == [7]
+        assert driver.ensure_visible_stats["foregrounded"] == 1
+
+
+class FakeEdit:
+    """descendants() が返す Edit の代役。runtime_id を差し替えると要素の作り直しを表す。"""
+
+    def __init__(self, value, *, automation_id="", title="", runtime_id=(1,)):
+        self.value = value
+        self.automation_id = automation_id
+        self.title = title
+        self.element_info = SimpleNamespace(runtime_id=runtime_id)
+        self.reads = 0
+
+    def get_value(self):
+        self.reads += 1
+        return self.value
+
+
+class FakeToolbarWindow:
+    def __init__(self, edits):
+        self.edits = edits
+        self.searches = 0
+
+    def descendants(self, control_type=None, automation_id=None, title=None):
+        self.searches += 1
+        return [
+            edit
+            for edit in self.edits
+            if (automation_id is None or edit.automation_id == automation_id) and (title is None or edit.title == title)
+        ]
+
+
+class TestAddressBarCache:
+    def _driver(self, edits):
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver.window = FakeToolbarWindow(edits)
+        return driver
+
+    def test_hit_reads_cached_element_without_searching(self):
+        bar = FakeEdit("https://a.example/", automation_id="Address and search bar", runtime_id=(7, 1))
+        driver = self._driver([FakeEdit("page input"), bar])
+        assert driver.get_address_bar_url() == "https://a.example/"
+        searches = driver.window.searches
+        bar.value = "https://b.example/"
+        assert driver.get_address_bar_url() == "https://b.example/"
+        assert driver.window.searches == searches
+        assert driver.address_bar_cache_stats == {"hit": 1, "miss": 1, "stale": 0}
+
+    def test_title_match_is_cacheable(self):
+        bar = FakeEdit("https://a.example/", title="Search or enter web address", runtime_id=(7, 1))
+        driver = self._driver([bar])
+        driver.get_address_bar_url()
+        assert driver._address_bar == (bar, (7, 1))
+
+    def test_recreated_element_is_stale(self):
+        bar = FakeEdit("https://a.example/", automation_id="Address and search bar", runtime_id=(7, 1))
+        driver = self._driver([bar])
+        driver.get_address_bar_url()
+        bar.element_info.runtime_id = (7, 2)
+        assert driver.get_address_bar_url() == "https://a.example/"
+        assert driver.address_bar_cache_stats["stale"] == 1
+        assert driver._address_bar == (bar, (7, 2))
+
+    def test_control_type_fallback_is_not_cached(self):
+        edit = FakeEdit("page input", runtime_id=(9,))
+        driver = self._driver([edit])
+        assert driver.get_address_bar_url() == "page input"
+        assert driver._address_bar is None
+        driver.get_address_bar_url()
+        assert driver.address_bar_cache_stats == {"hit": 0, "miss": 2, "stale": 0}
+
+
+class FakeTabStrip:
+    def __init__(self, tabs, *, valid=True):
+        self.tabs = tabs
+        self.valid = valid
+        self.queries = 0
+
+    def FindAll(self, scope, condition):
+        self.queries += 1
+        if not self.valid:
+            raise RuntimeError("element not available")
+        return SimpleNamespace(Length=self.tabs)
+
+
+class TestShortcutAck:
+    def _driver(self, monkeypatch):
+        sent = []
+        monkeypatch.setattr(driver_module, "send_keys", sent.append)
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver.ensure_visible = lambda **kwargs: None
+        driver.window = SimpleNamespace(set_focus=lambda: None)
+        return driver, sent
+
+    def test_returns_as_soon_as_ack_changes(self, monkeypatch):
+        driver, sent = self._driver(monkeypatch)
+        tabs = [1]
+        monkeypatch.setattr(driver_module, "send_keys", lambda keys: sent.append(keys) or tabs.append(2))
+        outcome = driver._send_shortcut(keys="^t", post_sleep_s=5.0, ack=lambda: len(tabs), label="test")
+        assert sent == ["^t"]
+        assert outcome.ok and outcome.elapsed_s < 1.0
+
+    def test_unchanged_ack_times_out_at_post_sleep(self, monkeypatch):
+        driver, _ = self._driver(monkeypatch)
+        outcome = driver._send_shortcut(keys="^t", post_sleep_s=0.1, ack=lambda: 1, label="test")
+        assert not outcome
+        assert outcome.elapsed_s < 1.0
+
+    def test_probe_errors_count_as_a_state_change(self, monkeypatch):
+        driver, _ = self._driver(monkeypatch)
+        closed = []
+
+        def probe():
+            if closed:
+                raise RuntimeError("window closed")
+            return 1
+
+        monkeypatch.setattr(driver_module, "send_keys", closed.append)
+        assert driver._send_shortcut(keys="^w", post_sleep_s=1.0, ack=probe, label="test").ok
+
+    def test_without_ack_sleeps(self, monkeypatch):
+        driver, _ = self._driver(monkeypatch)
+        slept = []
+        monkeypatch.setattr(driver_module.time, "sleep", slept.append)
+        assert driver._send_shortcut(keys="^0", post_sleep_s=0.2) is None
+        assert slept == [0.2]
+
+
+class TestTabCount:
+    def _driver(self, monkeypatch, strips):
+        strips = iter(strips)
+        iuia = SimpleNamespace(
+            tree_scope={"children": "children", "descendants": "descendants"},
+            build_condition=lambda **kwargs: kwargs,
+            raw_tree_walker=SimpleNamespace(GetParentElement=lambda first: next(strips)),
+        )
+        monkeypatch.setattr(driver_module, "IUIA", lambda: iuia)
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        element = SimpleNamespace(FindFirst=lambda scope, condition: object())
+        driver.window = SimpleNamespace(element_info=SimpleNamespace(element=element))
+        return driver
+
+    def test_counts_children_of_cached_strip(self, monkeypatch):
+        strip = FakeTabStrip(3)
+        driver = self._driver(monkeypatch, [strip])
+        assert driver._probe_tab_count() == 3
+        strip.tabs = 4
+        assert driver._probe_tab_count() == 4
+        assert driver._tab_strip is strip
+
+    def test_recreated_strip_is_resolved_again(self, monkeypatch):
+        old, new = FakeTabStrip(3), FakeTabStrip(2)
+        driver = self._driver(monkeypatch, [old, new])
+        driver._probe_tab_count()
+        old.valid = False
+        assert driver._probe_tab_count() == 2
+        assert driver._tab_strip is new
+
+
+class FakeScrollPattern:
+    """Document の ScrollPattern の代役。SetScrollPercent はすぐに反映される。"""
+
+    def __init__(self, percent=0.0, view_size=25.0, scrollable=True):
+        self.CurrentVerticalScrollPercent = percent
+        self.CurrentVerticalViewSize = view_size
+        self.CurrentVerticallyScrollable = scrollable
+        self.calls = []
+
+    def SetScrollPercent(self, horizontal, vertical):
+        self.calls.append((horizontal, vertical))
+        self.CurrentVerticalScrollPercent = vertical
+
+
+class TestScroll:
+    def _driver(self, monkeypatch, scroll):
+        document = SimpleNamespace(CurrentBoundingRectangle=SimpleNamespace(left=0, top=100, right=1000, bottom=900))
+        monkeypatch.setattr(driver_module, "get_elem_interface", lambda element, name: scroll)
+        moved = []
+        monkeypatch.setattr(driver_module, "mouse", SimpleNamespace(move=lambda coords: moved.append(coords)))
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver.keyboard = KeyboardEngine(SimulatedInputBackend())
+        driver.window = SimpleNamespace(handle=7)
+        monkeypatch.setattr(driver_module, "_get_window_rect", lambda hwnd: driver_module.Rect(0, 0, 1000, 1000))
+        driver._find_document_element = lambda: document
+        driver._prepare_for_input = lambda **kwargs: None
+        return driver, moved
+
+    def test_pixels_map_to_percent_of_scrollable_height(self, monkeypatch):
+        scroll = FakeScrollPattern(percent=10.0, view_size=25.0)
+        driver, moved = self._driver(monkeypatch, scroll)
+        # 表示領域 800px・ViewSize 25% なので、スクロールできる高さは 2400px
+        result = driver.scroll_down(600)
+        assert scroll.calls == [(-1.0, pytest.approx(35.0))]
+        assert result.data["method"] == "scroll_pattern"
+        assert result.data["after"]["vertical_percent"] == pytest.approx(35.0)
+        assert moved == []
+
+    def test_clamps_to_the_ends(self, monkeypatch):
+        scroll = FakeScrollPattern(percent=90.0)
+        driver, _ = self._driver(monkeypatch, scroll)
+        driver.scroll_down(5000)
+        driver.scroll_up(100000)
+        assert [vertical for _, vertical in scroll.calls] == [100.0, 0.0]
+
+    def test_not_scrollable_uses_one_wheel_event(self, monkeypatch):
+        scroll = FakeScrollPattern(scrollable=False, view_size=100.0)
+        driver, moved = self._driver(monkeypatch, scroll)
+        result = driver.scroll_down(250)
+        assert result.data["method"] == "wheel"
+        assert result.data["wheel_delta"] == -300
+        assert moved == [(500, 500)]
+        [batch] = driver.keyboard.backend.batches
+        assert len(batch) == 1
+
+    def test_zero_is_a_no_op(self, monkeypatch):
+        scroll = FakeScrollPattern()
+        driver, _ = self._driver(monkeypatch, scroll)
+        assert driver.scroll_by(0).data == {"method": "none"}
+        assert scroll.calls == []
@@ -0,0 +1,271 @@
+from types import SimpleNamespace
+
+import pytest
+
+from native_browser_control.core import driver as driver_module
+from native_browser_control.core.driver import (
+    ElementProxy,
+    InvalidInputError,
+    NativeBrowserDriver,
+    _collect_control_type_stats,
+    _OutlineNode,
+    _render_outline,
+    _sample_stride,
+    _SpatialGrid,
+)
+
+
+class TestSpatialGrid:
+    def _grid(self) -> _SpatialGrid:
+        rects = [
+            (0, 0, 2000, 2000),  # ページ全体（大きすぎてセルに登録されない）
+            (100, 100, 400, 300),  # フォーム
+            (120, 120, 200, 160),  # フォーム内のボタン
+            (500, 500, 600, 540),  # 離れたリンク
+            (10, 10, 10, 50),  # 幅 0 は無視される
+        ]
+        return _SpatialGrid(list(range(len(rects))), rects, cell_size=64, max_cells=64)
+
+    def test_ignores_empty_rects(self):
+        assert len(self._grid()) == 4
+
+    def test_at_point_returns_deepest_first(self):
+        grid = self._grid()
+        assert grid.at_point(150, 130) == [2, 1, 0]
+        assert grid.at_point(300, 250) == [1, 0]
+        assert grid.at_point(1500, 1500) == [0]
+        assert grid.at_point(2500, 10) == []
+
+    def test_right_and_bottom_are_exclusive(self):
+        grid = self._grid()
+        assert 2 not in grid.at_point(200, 130)
+        assert 2 in grid.at_point(199, 159)
+
+    def test_in_region_inside_and_intersect(self):
+        grid = self._grid()
+        assert grid.in_region(90, 90, 410, 310) == [2, 1]
+        assert sorted(grid.in_region(150, 150, 520, 520, mode="intersect")) == [0, 1, 2, 3]
+        assert grid.in_region(150, 150, 150, 200) == []
+
+    def test_matches_brute_force(self):
+        rects = []
+        for i in range(300):
+            left, top = (i * 37) % 900, (i * 53) % 700
+            rects.append((left, top, left + 20 + i % 90, top + 15 + i % 60))
+        grid = _SpatialGrid(list(range(len(rects))), rects, cell_size=32)
+        for x, y in [(0, 0), (100, 100), (450, 320), (899, 699), (123, 456)]:
+            expected = {i for i, (l, t, r, b) in enumerate(rects) if l <= x < r and t <= y < b}
+            assert set(grid.at_point(x, y)) == expected
+
+
+def _node(control_type: str, name: str = "", index=None, children=()) -> _OutlineNode:
+    return _OutlineNode(control_type, name, index=index, children=list(children))
+
+
+class TestRenderOutline:
+    def test_collapses_unnamed_wrappers_and_repeats(self):
+        root = _node(
+            "Document",
+            "Page",
+            children=[
+                _node("Group", children=[_node("Button", "OK", index=1)]),
+                _node("ListItem", "row", index=2),
+                _node("ListItem", "row", index=3),
+                _node("ListItem", "row", index=4),
+            ],
+        )
+        assert _render_outline(root).splitlines() == [
+            "<Document> Page",
+            "  [1] <Button> OK",
+            "  [2] <ListItem> row ×3 (+3,4)",
+        ]
+
+    def test_truncates_long_names(self):
+        root = _node("Document", "x" * 100)
+        assert _render_outline(root, max_name_len=10) == "<Document> " + "x" * 9 + "…"
+
+    def test_budget_keeps_interactive_lines_with_ancestors(self):
+        sections = [
+            _node(
+                "Group",
+                f"Section {i}",
+                children=[_node("Text", f"paragraph {i} " + "lorem ipsum " * 5)]
+                + ([_node("Button", "Submit", index=i)] if i == 7 else []),
+            )
+            for i in range(20)
+        ]
+        root = _node("Document", "Page", children=sections)
+        full = _render_outline(root)
+        limited = _render_outline(root, max_chars=200)
+        assert len(limited) < len(full)
+        lines = limited.splitlines()
+        assert "    [7] <Button> Submit" in lines
+        # 採用行の祖先（Section 7 と Document）は必ず残る
+        assert "  <Group> Section 7" in lines
+        assert lines[0] == "<Document> Page"
+        assert lines[-1].startswith("... (") and lines[-1].endswith(" lines omitted)")
+
+    def test_empty_root(self):
+        assert _render_outline(None) == ""
+
+    def test_keeps_unnamed_indexed_nodes(self):
+        root = _node(
+            "Document",
+            "Page",
+            children=[
+                _node("Image", index=5),
+                _node("Group", index=6, children=[_node("Text", index=7)]),
+                _node("Group", children=[_node("Group")]),
+            ],
+        )
+        assert _render_outline(root).splitlines() == [
+            "<Document> Page",
+            "  [5] <Image>",
+            "  [6] <Group>",
+            "    [7] <Text>",
+        ]
+
+
+class FakeCachedElement:
+    """FindAllBuildCache の要素の代役。window_text() は TextPattern があれば本文を返す pywinauto の挙動をまねる。"""
+
+    def __init__(self, control_type, name, *, text=None, rect=(0, 0, 100, 20), offscreen=False):
+        self.control_type = control_type
+        self.cached = {"name": name, "control_type": control_type, "automation_id": "", "runtime_id": (id(self),)}
+        self.cached["bounding_rectangle"] = rect
+        self.cached["is_offscreen"] = offscreen
+        self.text = text
+        self.window_text_calls = 0
+        self.element_info = SimpleNamespace(control_type=control_type, automation_id="")
+
+    def window_text(self):
+        self.window_text_calls += 1
+        return self.text if self.text is not None else self.cached["name"]
+
+    def friendly_class_name(self):
+        return self.control_type
+
+
+def _scan(monkeypatch, elements) -> NativeBrowserDriver:
+    monkeypatch.setattr(driver_module, "_find_all_build_cache", lambda root, props, condition=None: elements)
+    monkeypatch.setattr(driver_module, "_read_cached_property", lambda e, prop, default=None: e.cached.get(prop, default))
+    monkeypatch.setattr(driver_module, "UIAElementInfo", lambda raw: raw)
+    monkeypatch.setattr(driver_module, "UIAWrapper", lambda info: info)
+    driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+    driver._init_state("chrome")
+    driver.window = SimpleNamespace(element_info=SimpleNamespace(element=object()))
+    driver.scan_page_elements()
+    return driver
+
+
+def test_scan_names_match_window_text(monkeypatch):
+    button = FakeCachedElement("Button", "Search")
+    edit = FakeCachedElement("Edit", "Query", text="typed words")
+    driver = _scan(monkeypatch, [button, edit])
+    # Edit は UIA Name ではなく window_text()（入力済みの本文）を表示名にする
+    assert [info["name"] for info in driver.current_elements_info.values()] == ["Search", "typed words"]
+    assert button.window_text_calls == 0
+    assert [index for index, *_ in driver._match_current_elements(caller="test", name_regex="typed")] == [1]
+
+
+class TestControlTypeStats:
+    def _stats(self, monkeypatch, elements, **kwargs):
+        monkeypatch.setattr(driver_module, "_find_all_build_cache", lambda root, props, condition=None: elements)
+        monkeypatch.setattr(driver_module, "_read_cached_property", lambda e, prop, default=None: e.cached.get(prop, default))
+        return _collect_control_type_stats(object(), **kwargs)
+
+    def _elements(self):
+        # 5件ずつの塊で、可視のボタン 30 件と不可視のテキスト 70 件を混ぜる
+        return [
+            FakeCachedElement("Button", "b") if (i // 5) % 10 < 3 else FakeCachedElement("Text", "t", offscreen=True)
+            for i in range(100)
+        ]
+
+    def test_full_count(self, monkeypatch):
+        stats = self._stats(monkeypatch, self._elements())
+        assert stats["visible_by_control_type"] == {"Button": 30}
+        assert stats["invisible_by_control_type"] == {"Text": 70}
+        assert (stats["total"], stats["visible_total"], stats["invisible_total"]) == (100, 30, 70)
+        assert stats["sampled"] is False and stats["sample_count"] == 100
+
+    def test_sampling_extrapolates_to_total(self, monkeypatch):
+        stats = self._stats(monkeypatch, self._elements(), sample_size=20)
+        assert stats["sampled"] is True and stats["sample_count"] == 20
+        assert stats["total"] == 100
+        assert stats["visible_by_control_type"] == {"Button": 30}
+        assert stats["invisible_by_control_type"] == {"Text": 70}
+
+    def test_sample_stride(self):
+        assert _sample_stride(100, None) == 1
+        assert _sample_stride(100, 0) == 1
+        assert _sample_stride(100, 200) == 1
+        assert _sample_stride(100, 30) == 4
+
+
+class CountingWrapper:
+    """window_text() の呼び出し回数を数える pywinauto ラッパーの代役。"""
+
+    def __init__(self, text="first"):
+        self.text = text
+        self.calls = 0
+        self.clicked = False
+
+    def window_text(self):
+        self.calls += 1
+        if self.text is None:
+            raise RuntimeError("element gone")
+        return self.text
+
+    def click_input(self):
+        self.clicked = True
+
+
+class TestElementProxy:
+    def test_memoizes_within_ttl(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr(driver_module.time, "monotonic", lambda: clock[0])
+        wrapper = CountingWrapper()
+        proxy = ElementProxy(wrapper, ttl_s=2.0)
+        assert proxy.get("name") == "first"
+        wrapper.text = "second"
+        clock[0] += 1.5
+        assert proxy.get("name") == "first"
+        clock[0] += 1.0
+        assert proxy.get("name") == "second"
+        assert wrapper.calls == 2
+
+    def test_ttl_zero_and_none(self):
+        wrapper = CountingWrapper()
+        uncached = ElementProxy(wrapper, ttl_s=0)
+        uncached.get("name")
+        uncached.get("name")
+        assert wrapper.calls == 2
+        forever = ElementProxy(wrapper, ttl_s=None)
+        forever.get("name")
+        wrapper.text = "changed"
+        assert forever.get("name") == "first"
+
+    def test_seed_skips_fetch_and_invalidate_refetches(self):
+        wrapper = CountingWrapper("live")
+        proxy = ElementProxy(wrapper, seed={"name": "seeded", "control_type": None, "bogus": 1})
+        assert proxy.get("name") == "seeded"
+        assert wrapper.calls == 0
+        proxy.invalidate("name")
+        assert proxy.get("name") == "live"
+        assert wrapper.calls == 1
+
+    def test_failures_return_default_without_caching(self):
+        wrapper = CountingWrapper(None)
+        proxy = ElementProxy(wrapper)
+        assert proxy.get("name", "n/a") == "n/a"
+        wrapper.text = "back"
+        assert proxy.get("name") == "back"
+
+    def test_unknown_property_and_delegation(self):
+        wrapper = CountingWrapper()
+        proxy = ElementProxy(wrapper)
+        with pytest.raises(InvalidInputError) as info:
+            proxy.get("colour")
+        assert info.value.code == "invalid_property"
+        proxy.click_input()
+        assert wrapper.clicked
@@ -0,0 +1,140 @@
+import pytest
+
+from native_browser_control.core.driver import (
+    InputMacro,
+    InvalidInputError,
+    KeyboardEngine,
+    SimulatedInputBackend,
+    _KEYEVENTF_KEYUP,
+    _MacroClick,
+)
+
+CTRL = 0x11
+
+
+def _engine(chunk_size: int = 512) -> tuple[KeyboardEngine, SimulatedInputBackend]:
+    backend = SimulatedInputBackend()
+    return KeyboardEngine(backend, chunk_size=chunk_size), backend
+
+
+def _held_after(batch) -> set[tuple[int, int]]:
+    held: set[tuple[int, int]] = set()
+    for event in batch:
+        key = (event.vk, event.scan)
+        if event.is_up:
+            held.discard(key)
+        else:
+            held.add(key)
+    return held
+
+
+def test_compile_text_is_literal():
+    keyboard, _ = _engine()
+    events = keyboard.compile_text("{ENTER}^a")
+    # 記法を解釈せず 9 文字ぶんの Unicode 押下/解放になる
+    assert len(events) == 18
+    assert all(event.vk == 0 for event in events)
+    assert [chr(event.scan) for event in events[::2]] == list("{ENTER}^a")
+
+
+def test_compile_keys_modifier_group_and_repeat():
+    keyboard, _ = _engine()
+    events = keyboard.compile_keys("^a{DOWN 2}")
+    assert [(e.vk, e.flags & _KEYEVENTF_KEYUP) for e in events[:4]] == [
+        (CTRL, 0),
+        (ord("A"), 0),
+        (ord("A"), _KEYEVENTF_KEYUP),
+        (CTRL, _KEYEVENTF_KEYUP),
+    ]
+    assert sum(1 for e in events[4:] if not e.is_up) == 2
+
+
+@pytest.mark.parametrize("keys", ["{FOO}", "^", "{x", "(ab"])
+def test_compile_keys_rejects_invalid(keys):
+    keyboard, _ = _engine()
+    with pytest.raises(InvalidInputError) as info:
+        keyboard.compile_keys(keys)
+    assert info.value.code == "invalid_keys"
+
+
+@pytest.mark.parametrize(
+    ("keys", "chunk_size"),
+    [
+        ("^a{DOWN 2}+(xy){+}~", 8),
+        ("abc^v" * 20, 7),
+        ("^{a 20}", 8),
+        ("^+{a 20}", 4),
+        ("^{a 3}", 2),
+    ],
+)
+def test_send_never_leaves_keys_held_between_chunks(keys, chunk_size):
+    keyboard, backend = _engine(chunk_size)
+    keyboard.send_keys(keys)
+    assert len(backend.batches) > 1
+    for batch in backend.batches:
+        assert not _held_after(batch)
+
+
+def test_send_carries_modifiers_across_chunks():
+    keyboard, backend = _engine(8)
+    keyboard.send_keys("^{a 20}")
+    pressed = [e for e in backend.events if e.vk == ord("A") and not e.is_up]
+    assert len(pressed) == 20
+    # 2つ目以降のチャンクは Ctrl の押し直しから始まる
+    for batch in backend.batches[1:]:
+        assert (batch[0].vk, batch[0].is_up) == (CTRL, False)
+
+
+def test_send_plain_text_uses_chunk_size():
+    keyboard, backend = _engine(64)
+    keyboard.type_text("x" * 100)
+    assert [len(batch) for batch in backend.batches] == [64, 64, 64, 8]
+
+
+def test_macro_compile_batches_consecutive_input_steps():
+    keyboard, _ = _engine()
+    macro = InputMacro.compile(
+        [
+            {"type": "keys", "keys": "^l"},
+            {"type": "text", "text": "hi"},
+            {"type": "click", "x": 10, "y": 20, "button": "double"},
+            {"type": "paste", "text": "https://example.com"},
+            {"type": "keys", "keys": "{ENTER}"},
+            {"type": "wait", "seconds": 0.2},
+            {"type": "wait_for", "condition": "url_contains", "value": "example", "timeout_s": 3},
+        ],
+        keyboard=keyboard,
+    )
+    assert [op.kind for op in macro.ops] == ["input", "paste", "input", "sleep", "wait_for"]
+    assert macro.step_count == 7
+    assert macro.batch_count == 2
+    first = macro.ops[0]
+    assert first.step == 0
+    assert first.items[-1] == _MacroClick(10, 20, "double")
+    assert macro.ops[1].text == "https://example.com"
+    assert macro.ops[4].seconds == 3.0
+
+
+@pytest.mark.parametrize(
+    "steps",
+    [
+        [],
+        ["keys"],
+        [{"type": "nope"}],
+        [{"type": "keys"}],
+        [{"type": "keys", "keys": "{BAD}"}],
+        [{"type": "click", "x": 1, "y": 2, "button": "middle"}],
+        [{"type": "wait_for", "condition": "url_contains"}],
+        [{"type": "wait_for", "condition": "loaded"}],
+        [{"type": "wait", "seconds": -1}],
+        [{"type": "wait", "seconds": 61}],
+        [{"type": "wait", "seconds": "nan"}],
+        [{"type": "wait_for", "condition": "ready", "timeout_s": 3600}],
+        [{"type": "wait", "seconds": 0}] * 501,
+    ],
+)
+def test_macro_compile_rejects_invalid_steps(steps):
+    keyboard, _ = _engine()
+    with pytest.raises(InvalidInputError) as info:
+        InputMacro.compile(steps, keyboard=keyboard)
+    assert info.value.code == "invalid_macro"
@@ -0,0 +1,498 @@
+import ctypes
+import io
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageDraw
+
+from native_browser_control.core import driver as driver_module
+from native_browser_control.core.driver import (
+    ElementNotFoundError,
+    FrameRecorder,
+    ImageEncoder,
+    InvalidInputError,
+    NativeBrowserDriver,
+    Rect,
+    ScreenGrabber,
+    ScreenshotCache,
+    ScreenshotError,
+    _blank_kind,
+    _capture_context,
+    _changed_tile_boxes,
+    _diff_frames,
+    _PrintWindowContext,
+    _stitch_monitors,
+    _save_image,
+)
+
+
+def _page(size=(640, 480), *, banner: bool = False, box=None) -> Image.Image:
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(0, size[1], 24):
+        draw.line((20, y, size[0] - 20, y), fill=(200, 200, 200))
+    if banner:
+        draw.rectangle((200, 10, 320, 40), fill=(220, 40, 40))
+    if box is not None:
+        draw.rectangle(box, fill=(0, 0, 255))
+    return img
+
+
+def _noise(size=(320, 240), seed: int = 1) -> Image.Image:
+    import random
+
+    rng = random.Random(seed)
+    return Image.frombytes("RGB", size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * 3)))
+
+
+class TestBlankKind:
+    @pytest.mark.parametrize(
+        ("color", "mode", "kind"),
+        [
+            ((0, 0, 0), "RGB", "black"),
+            ((255, 255, 255, 255), "RGBA", "white"),
+            ((128, 128, 128), "RGB", "uniform"),
+        ],
+    )
+    def test_single_color_frames(self, color, mode, kind):
+        assert _blank_kind(Image.new(mode, (1280, 800), color)) == kind
+
+    def test_sparse_text_on_white_is_not_blank(self):
+        img = Image.new("RGB", (1280, 800), "white")
+        draw = ImageDraw.Draw(img)
+        for y in range(100, 700, 40):
+            draw.text((40, y), "Lorem ipsum dolor sit amet " * 3, fill="black")
+        assert _blank_kind(img) is None
+
+    def test_ruled_page_is_not_blank(self):
+        assert _blank_kind(_page()) is None
+
+
+class TestDiffFrames:
+    def test_first_frame_is_full(self):
+        delta, baseline = _diff_frames(_page(), None, tile=64, full_threshold=0.6)
+        assert delta.changed and delta.full
+        assert baseline[0] == (640, 480) and baseline[1] == 64
+
+    def test_unchanged_frame(self):
+        _, baseline = _diff_frames(_page(), None, tile=64, full_threshold=0.6)
+        delta, _ = _diff_frames(_page(), baseline, tile=64, full_threshold=0.6)
+        assert not delta.changed
+        assert delta.regions == []
+
+    def test_small_change_returns_only_changed_tiles(self):
+        _, baseline = _diff_frames(_page(), None, tile=64, full_threshold=0.6)
+        delta, _ = _diff_frames(_page(box=(130, 130, 180, 180)), baseline, tile=64, full_threshold=0.6)
+        assert delta.changed and not delta.full
+        assert [region.as_dict() for region in delta.regions] == [
+            {"left": 128, "top": 128, "right": 192, "bottom": 192}
+        ]
+        assert delta.regions[0].image.size == (64, 64)
+
+    def test_size_change_or_large_change_is_full(self):
+        _, baseline = _diff_frames(_page(), None, tile=64, full_threshold=0.6)
+        resized, _ = _diff_frames(_page((800, 600)), baseline, tile=64, full_threshold=0.6)
+        assert resized.full
+        covered, _ = _diff_frames(_page(box=(0, 0, 640, 400)), baseline, tile=64, full_threshold=0.6)
+        assert covered.full
+
+
+def test_changed_tiles_are_grouped_by_4_connectivity():
+    changed = {(0, 0), (1, 0), (1, 1), (5, 5), (6, 6)}
+    # 斜めに接するだけのタイルは別の領域になる
+    assert _changed_tile_boxes(changed) == [(0, 0, 1, 1), (5, 5, 5, 5), (6, 6, 6, 6)]
+    assert _changed_tile_boxes(set()) == []
+
+
+class TestCaptureRegion:
+    WINDOW = Rect(100, 50, 900, 650)
+
+    def _driver(self) -> NativeBrowserDriver:
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver.window = SimpleNamespace(handle=7, descendants=lambda **kwargs: [])
+        return driver
+
+    def _resolve(self, driver, *, element_index=None, element_id=None, region=None, padding=0):
+        return driver._capture_region_rect(
+            self.WINDOW, element_index=element_index, element_id=element_id, region=region, padding=padding
+        )
+
+    def test_region_is_window_relative_and_clipped(self):
+        driver = self._driver()
+        assert self._resolve(driver) is None
+        assert self._resolve(driver, region=(10, 20, 110, 70)) == Rect(110, 70, 210, 120)
+        assert self._resolve(driver, region=(0, 0, 100, 100), padding=30) == Rect(100, 50, 230, 180)
+
+    def test_element_rectangle_is_padded(self):
+        driver = self._driver()
+        button = SimpleNamespace(rectangle=lambda: Rect(300, 200, 400, 240))
+        driver.current_elements = {3: button}
+        assert self._resolve(driver, element_index=3, padding=4) == Rect(296, 196, 404, 244)
+
+    def test_invalid_requests(self):
+        driver = self._driver()
+        with pytest.raises(InvalidInputError) as info:
+            self._resolve(driver, element_index=1, region=(0, 0, 1, 1))
+        assert info.value.code == "invalid_region"
+        with pytest.raises(ElementNotFoundError):
+            self._resolve(driver, element_index=1)
+        with pytest.raises(ElementNotFoundError):
+            self._resolve(driver, element_id="missing")
+        with pytest.raises(ScreenshotError) as info:
+            self._resolve(driver, region=(900, 700, 950, 750))
+        assert info.value.code == "region_out_of_window"
+
+
+class TestScreenshotBaselines:
+    def _driver(self) -> NativeBrowserDriver:
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver.window = SimpleNamespace(handle=7)
+        driver.screenshot = lambda **kwargs: _page((320, 240))
+        return driver
+
+    def test_baselines_are_kept_per_capture_region(self):
+        driver = self._driver()
+        assert driver.screenshot_delta().full
+        assert driver.screenshot_delta(region=(0, 0, 320, 240)).full
+        assert not driver.screenshot_delta().changed
+        assert not driver.screenshot_delta(region=[0, 0, 320, 240]).changed
+
+    def test_reset_drops_one_region_or_all_for_the_window(self):
+        driver = self._driver()
+        driver.screenshot_delta()
+        driver.screenshot_delta(padding=8)
+        driver.reset_screenshot_baseline(padding=8)
+        assert not driver.screenshot_delta().changed
+        assert driver.screenshot_delta(padding=8).full
+        driver.reset_screenshot_baseline()
+        assert driver._screenshot_baselines == {}
+
+    def test_oldest_baseline_is_evicted(self, monkeypatch):
+        driver = self._driver()
+        monkeypatch.setattr(driver_module, "_SCREENSHOT_BASELINE_LIMIT", 2)
+        for padding in (1, 2, 3):
+            driver.screenshot_delta(padding=padding)
+        assert [key[4] for key in driver._screenshot_baselines] == [2, 3]
+        assert driver.screenshot_delta(padding=1).full
+
+
+class TestScreenshotCache:
+    def test_exact_match_by_default(self):
+        cache = ScreenshotCache()
+        first = cache.check(_page())
+        assert first.match is None
+        again = cache.check(_page())
+        assert (again.ref, again.match) == (first.ref, "exact")
+
+    def test_near_match_requires_threshold(self):
+        cache = ScreenshotCache()
+        cache.check(_page(), threshold=0)
+        # threshold=0（既定）では 1px の違いも別の画像として登録する
+        assert cache.check(_page(box=(300, 300, 300, 300))).match is None
+
+    def test_near_match_within_changed_tiles(self):
+        cache = ScreenshotCache()
+        base = cache.check(_page(), threshold=4)
+        near = cache.check(_page(box=(300, 300, 301, 301)), threshold=4)
+        assert (near.ref, near.match) == (base.ref, "perceptual")
+        assert near.changed_tiles == 1
+
+    def test_banner_is_not_treated_as_near_match(self):
+        cache = ScreenshotCache()
+        cache.check(_page(), threshold=4)
+        assert cache.check(_page(banner=True), threshold=4).match is None
+
+    def test_capacity_evicts_least_recently_used(self):
+        cache = ScreenshotCache(capacity=2)
+        a = cache.check(_noise(seed=1))
+        cache.check(_noise(seed=2))
+        cache.check(_noise(seed=1))  # a を最近使ったものにする
+        cache.check(_noise(seed=3))
+        assert cache.check(_noise(seed=1)).ref == a.ref
+        assert cache.check(_noise(seed=2)).match is None
+        assert cache.stats()["entries"] == 2
+
+
+class TestSearchQuality:
+    @pytest.fixture
+    def encoder(self):
+        encoder = ImageEncoder(max_workers=2, probes=3)
+        yield encoder
+        encoder.close()
+
+    def test_finds_highest_quality_within_budget(self, encoder):
+        img = _noise()
+        sizes = {q: len(_save_image(img, "JPEG", quality=q, lossless=False)) for q in range(10, 96)}
+        budget = sizes[60]
+        result = encoder._search_quality(img, "JPEG", budget, low=10, high=95, attempts=1)
+        assert result.within_budget
+        assert len(result.data) <= budget
+        # 予算に収まる品質のうち最大のもの
+        assert result.quality == max(q for q, size in sizes.items() if size <= budget)
+        assert Image.open(io.BytesIO(result.data)).size == img.size
+
+    def test_reports_smallest_when_budget_is_impossible(self, encoder):
+        img = _noise()
+        result = encoder._search_quality(img, "JPEG", 10, low=10, high=95, attempts=1)
+        assert not result.within_budget
+        assert result.quality == 10
+
+    def test_encode_uses_search_only_when_over_budget(self, encoder):
+        img = _noise()
+        unlimited = encoder.encode(img, "JPEG", quality=90)
+        assert unlimited.attempts == 1
+        limited = encoder.encode(img, "JPEG", quality=90, max_bytes=len(unlimited.data) // 2)
+        assert limited.within_budget and limited.quality < 90
+        assert limited.attempts > 1
+
+
+class TestFrameRecorder:
+    def _recorder(self, **kwargs) -> FrameRecorder:
+        return FrameRecorder(lambda: _page(), **kwargs)
+
+    def test_consecutive_duplicates_only_count_repeats(self):
+        recorder = self._recorder()
+        first = recorder.add(_page())
+        again = recorder.add(_page())
+        assert again is first and first.repeats == 2
+        other = recorder.add(_page(banner=True))
+        assert other.index == 1
+        stats = recorder.stats()
+        assert (stats["frames"], stats["samples"], stats["duplicates"]) == (2, 3, 1)
+
+    def test_reappearing_content_shares_the_image(self):
+        recorder = self._recorder()
+        first = recorder.add(_page())
+        recorder.add(_page(banner=True))
+        third = recorder.add(_page())
+        assert third.index == 2 and third.image is first.image
+        assert recorder.stats()["unique_images"] == 2
+
+    def test_capacity_evicts_oldest_but_keeps_indices(self):
+        recorder = self._recorder(capacity=2)
+        for seed in range(4):
+            recorder.add(_noise(seed=seed))
+        assert [frame.index for frame in recorder.frames()] == [2, 3]
+        assert recorder.stats()["dropped"] == 2
+        assert recorder.frame(-1).index == 3
+        with pytest.raises(InvalidInputError):
+            recorder.frame(0)
+
+    def test_byte_budget_evicts_and_releases_images(self):
+        one = len(_noise().tobytes())
+        recorder = self._recorder(max_bytes=one * 2)
+        for seed in range(3):
+            recorder.add(_noise(seed=seed))
+        stats = recorder.stats()
+        assert stats["frames"] == 2
+        assert stats["bytes"] == one * 2
+
+    def test_export_passes_quality_and_budget(self, tmp_path):
+        driver = NativeBrowserDriver.__new__(NativeBrowserDriver)
+        driver._init_state("chrome")
+        driver._frame_recorder = recorder = self._recorder()
+        recorder.add(_noise(seed=1))
+        recorder.add(_noise(seed=2))
+        recorder.add(_noise(seed=1))
+        budget = 20_000
+        result = driver.export_captured_frames(str(tmp_path), fmt="JPEG", quality=80, max_bytes=budget)
+        assert result.ok
+        assert (result.data["frames"], result.data["files"]) == (3, 2)
+        manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+        assert manifest[0]["path"] == manifest[2]["path"]
+        for entry in manifest:
+            assert entry["encoding"]["format"] == "JPEG"
+            assert entry["encoding"]["quality"] <= 80
+            assert entry["encoding"]["bytes"] <= budget
+            assert (tmp_path / entry["path"]).stat().st_size == entry["encoding"]["bytes"]
+
+
+class FakeGdi:
+    """_gdi_api() の代役。DIB セクションは ctypes のバッファで、PrintWindow は単色 BGRX で塗る。"""
+
+    def __init__(self):
+        self.buffers = {}
+        self.deleted_objects = []
+        self.deleted_dcs = []
+        self.color = (30, 20, 10)  # (B, G, R)
+        self._next = 100
+
+    def api(self):
+        return {
+            "CreateCompatibleDC": self.create_dc,
+            "CreateDIBSection": self.create_dib,
+            "SelectObject": lambda dc, obj: 1,
+            "DeleteObject": self.deleted_objects.append,
+            "DeleteDC": self.deleted_dcs.append,
+            "GdiFlush": lambda: None,
+            "PrintWindow": self.print_window,
+        }
+
+    def create_dc(self, _):
+        self._next += 1
+        return self._next
+
+    def create_dib(self, dc, header_ref, usage, bits_ref, section, offset):
+        header = header_ref._obj
+        buffer = (ctypes.c_char * (header.biWidth * -header.biHeight * 4))()
+        self._next += 1
+        self.buffers[self._next] = buffer
+        self.current = buffer
+        bits_ref._obj.value = ctypes.addressof(buffer)
+        return self._next
+
+    def print_window(self, hwnd, dc, flags):
+        blue, green, red = self.color
+        pixel = bytes((blue, green, red, 0))
+        ctypes.memmove(self.current, pixel * (len(self.current) // 4), len(self.current))
+        return 1
+
+
+class TestPrintWindowContext:
+    @pytest.fixture
+    def gdi(self, monkeypatch):
+        fake = FakeGdi()
+        monkeypatch.setattr(driver_module, "_GDI_API", fake.api())
+        return fake
+
+    def _context(self, monkeypatch, size):
+        monkeypatch.setattr(driver_module, "_get_window_rect", lambda hwnd: Rect(0, 0, *size))
+        return _PrintWindowContext(7)
+
+    def test_reuses_dib_until_resized(self, monkeypatch, gdi):
+        context = self._context(monkeypatch, (40, 30))
+        first = context.capture()
+        assert first.size == (40, 30)
+        assert first.getpixel((0, 0)) == (10, 20, 30)
+        gdi.color = (0, 0, 255)
+        assert context.capture().getpixel((39, 29)) == (255, 0, 0)
+        # 返した画像は DIB の再利用で書き換わらない
+        assert first.getpixel((0, 0)) == (10, 20, 30)
+        assert (context.rebuilds, context.captures) == (1, 2)
+        monkeypatch.setattr(driver_module, "_get_window_rect", lambda hwnd: Rect(0, 0, 50, 30))
+        assert context.capture().size == (50, 30)
+        assert context.rebuilds == 2
+        assert len(gdi.deleted_objects) == 1
+        context.close()
+        assert len(gdi.deleted_objects) == 2 and len(gdi.deleted_dcs) == 1
+
+    def test_pool_keeps_one_context_per_live_window(self, monkeypatch, gdi):
+        live = {1, 2}
+        monkeypatch.setattr(driver_module, "_CAPTURE_CONTEXTS", {})
+        monkeypatch.setattr(driver_module, "win32gui", SimpleNamespace(IsWindow=lambda hwnd: hwnd in live))
+        monkeypatch.setattr(driver_module, "_get_window_rect", lambda hwnd: Rect(0, 0, 4, 4))
+        first = _capture_context(1)
+        first.capture()
+        assert _capture_context(1) is first
+        live.discard(1)
+        second = _capture_context(2)
+        assert second is not first
+        assert driver_module._CAPTURE_CONTEXTS == {2: second}
+        assert first._dc is None and gdi.deleted_dcs
+
+
+class FakeMss:
+    """mss.mss() の代役。grab は領域の左上座標から決まる単色の画像を返す。"""
+
+    MONITORS = [
+        {"left": -1280, "top": 0, "width": 2560, "height": 1024},
+        {"left": 0, "top": 0, "width": 1280, "height": 1024},
+        {"left": -1280, "top": 200, "width": 1280, "height": 720},
+    ]
+    created: list = []
+
+    def __init__(self):
+        self.monitors = [dict(monitor) for monitor in self.MONITORS]
+        self.closed = False
+        self.thread = threading.get_ident()
+        FakeMss.created.append(self)
+
+    def grab(self, region):
+        assert threading.get_ident() == self.thread
+        size = (region["width"], region["height"])
+        color = bytes((abs(region["left"]) % 256, region["top"] % 256, 0))
+        return SimpleNamespace(size=size, rgb=color * (size[0] * size[1]))
+
+    def close(self):
+        self.closed = True
+
+
+class TestScreenGrabber:
+    @pytest.fixture
+    def grabber(self, monkeypatch):
+        FakeMss.created = []
+        display = {"signature": (0, 0, 2560, 1024, 2)}
+        monkeypatch.setattr(driver_module, "mss", SimpleNamespace(mss=FakeMss))
+        monkeypatch.setattr(driver_module, "_display_signature", lambda: display["signature"])
+        grabber = ScreenGrabber(max_workers=2)
+        grabber.display = display
+        yield grabber
+        grabber.close()
+
+    def test_reuses_one_instance_per_thread(self, grabber):
+        grabber.grab({"left": 0, "top": 0, "width": 4, "height": 4})
+        grabber.grab({"left": 0, "top": 0, "width": 4, "height": 4})
+        worker = threading.Thread(target=lambda: grabber.grab({"left": 0, "top": 0, "width": 4, "height": 4}))
+        worker.start()
+        worker.join()
+        assert len(FakeMss.created) == 2
+        assert grabber.stats()["grabs"] == 3
+
+    def test_release_current_thread_closes_its_instance(self, grabber):
+        def record():
+            grabber.grab({"left": 0, "top": 0, "width": 4, "height": 4})
+            grabber.release_current_thread()
+
+        worker = threading.Thread(target=record)
+        worker.start()
+        worker.join()
+        assert FakeMss.created[0].closed
+        assert grabber.stats()["live_instances"] == 0
+
+    def test_display_change_recreates_instances(self, grabber):
+        grabber.monitors()
+        grabber.display["signature"] = (0, 0, 1280, 1024, 1)
+        grabber.monitors()
+        assert FakeMss.created[0].closed and len(FakeMss.created) == 2
+        assert grabber.stats()["invalidations"] == 1
+
+    def test_grab_monitors_keeps_requested_order(self, grabber):
+        shots = grabber.grab_monitors([2, 1])
+        assert [monitor["left"] for monitor, _ in shots] == [-1280, 0]
+        assert [img.size for _, img in shots] == [(1280, 720), (1280, 1024)]
+        with pytest.raises(InvalidInputError) as info:
+            grabber.grab_monitors([3])
+        assert info.value.code == "invalid_monitor"
+
+    def test_frame_recorder_thread_releases_its_instance(self, grabber, monkeypatch):
+        monkeypatch.setattr(driver_module, "screen_grabber", grabber)
+        recorder = FrameRecorder(lambda: grabber.grab({"left": 0, "top": 0, "width": 4, "height": 4}), fps=50)
+        recorder.start()
+        try:
+            _wait_for_samples(recorder)
+        finally:
+            recorder.stop()
+        assert FakeMss.created and all(sct.closed for sct in FakeMss.created)
+
+
+def _wait_for_samples(recorder: FrameRecorder, timeout_s: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while recorder.stats()["samples"] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stitch_monitors_places_images_on_the_virtual_screen():
+    left = Image.new("RGB", (100, 50), (255, 0, 0))
+    right = Image.new("RGB", (80, 60), (0, 0, 255))
+    canvas = _stitch_monitors([({"left": -100, "top": 10}, left), ({"left": 0, "top": 0}, right)])
+    assert canvas.size == (180, 60)
+    assert canvas.getpixel((0, 10)) == (255, 0, 0)
+    assert canvas.getpixel((100, 0)) == (0, 0, 255)
+    # どのモニターにも含まれない部分は黒
+    assert canvas.getpixel((0, 0)) == (0, 0, 0)
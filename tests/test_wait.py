@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from native_browser_control.core import driver as driver_module
+from native_browser_control.core.driver import WaitSignal, all_of, any_of, get_wait_telemetry, wait_for
+
+
+def _raises():
+    raise RuntimeError("boom")
+
+
+class TestComposition:
+    def test_any_of_ignores_errors_when_another_predicate_holds(self):
+        assert any_of(_raises, lambda: True)()
+
+    def test_any_of_raises_when_unsatisfied_with_an_error(self):
+        with pytest.raises(RuntimeError):
+            any_of(lambda: False, _raises)()
+        assert any_of(lambda: False, lambda: False)() is False
+
+    def test_all_of_short_circuits(self):
+        calls = []
+        predicate = all_of(lambda: calls.append("a") or False, lambda: calls.append("b") or True)
+        assert predicate() is False
+        assert calls == ["a"]
+
+    def test_all_of_raises_like_any_of(self):
+        with pytest.raises(RuntimeError):
+            all_of(lambda: True, _raises)()
+
+    def test_wait_for_counts_composed_errors(self):
+        outcome = wait_for(any_of(lambda: False, _raises), timeout_s=0.05, interval_s=0.01, label="test:errors")
+        assert not outcome
+        assert outcome.errors == outcome.attempts
+        assert outcome.last_error == "RuntimeError: boom"
+
+
+class TestWaitFor:
+    def test_backoff_doubles_until_capped(self, monkeypatch):
+        delays = []
+        monkeypatch.setattr(driver_module.time, "sleep", delays.append)
+        attempts = iter(range(6))
+        outcome = wait_for(
+            lambda: next(attempts) == 5,
+            timeout_s=60,
+            interval_s=0.01,
+            backoff=2.0,
+            max_interval_s=0.05,
+            label="test:backoff",
+        )
+        assert outcome.ok and outcome.attempts == 6
+        assert delays == pytest.approx([0.01, 0.02, 0.04, 0.05, 0.05])
+
+    def test_wake_resets_interval(self):
+        signal = WaitSignal()
+        state = {"ready": False}
+
+        def later():
+            state["ready"] = True
+            signal.notify()
+
+        timer = threading.Timer(0.05, later)
+        timer.start()
+        try:
+            outcome = wait_for(lambda: state["ready"], timeout_s=5, interval_s=1.0, wake=signal, label="test:wake")
+        finally:
+            timer.cancel()
+        assert outcome.ok
+        assert outcome.wakeups == 1
+        assert outcome.elapsed_s < 1.0
+
+    def test_telemetry_is_newest_first_and_filterable(self):
+        for _ in range(3):
+            wait_for(lambda: True, label="test:telemetry")
+        wait_for(lambda: True, label="test:other")
+        recent = get_wait_telemetry("test:telemetry", limit=2)
+        assert len(recent) == 2
+        assert all(item["label"] == "test:telemetry" and item["ok"] for item in recent)
+        assert get_wait_telemetry(limit=1)[0]["label"] == "test:other"